@@ -0,0 +1,321 @@
+"""Measures the throughput and the latency percentiles of the API routes under concurrent load.
+
+It seeds `--students` students with `--submissions` submissions each with set-based INSERT ... SELECT
+statements, starts the application with uvicorn in a separate process, and runs the scenarios one after another
+with the given concurrency:
+
+* upload_storm - students upload submission files to `POST /submissions/{upload_code}` at once
+* summary_polling - examiners page through `GET /students` after random students
+* download_url_burst - verifiers request `GET /verifications/{code}/download_url`, one in ten codes is unknown
+
+The requests come from `--clients` client IPs in the Fly-Client-IP header, so the rate limits of the routes
+apply per client as in production. The application runs with the `--rate-limit-backend` given, run the benchmark
+with `off`, `memory` and `postgres` to compare the overhead of the limiter on the routes. The report also
+includes the time of one token bucket check of each backend measured in this process.
+
+The application persists the files on the S3 stand-in at AWS_S3_ENDPOINT_URL, the MinIO container
+from docker-compose.yml or `moto_server -p 9000`. The seeded records and the uploaded files are removed
+afterwards. The report is printed as JSON, or written to `--output`, to compare the results between commits.
+
+Run it against a migrated database with `make benchmark_api_load`.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+
+from httpx import AsyncClient
+from sqlalchemy import text
+
+from src.database import repository
+from src.settings import Settings
+from src.web.rate_limiter import TokenBuckets
+from src.web.storage.s3 import S3
+
+# the client IPs are from the range reserved for benchmarks
+_CLIENT_IPS = "198.18.%"
+
+_SEED = [
+    """
+    INSERT INTO students
+        (nickname, first_name, last_name, email, upload_code, submissions_count, created_at, updated_at)
+    SELECT :prefix || g, 'Bench', 'Student', :prefix || g || '@example.com', 'U' || :prefix || g, :submissions,
+           now(), now()
+    FROM generate_series(1, :students) g
+    """,
+    """
+    INSERT INTO submissions (student_id, file_name, md5, size_bytes, verification_code, created_at, updated_at)
+    SELECT students.id, :prefix || '/' || students.id || '_' || g || '.bin', md5(''), 1024,
+           'V' || :prefix || students.id || '_' || g, now(), now()
+    FROM students, generate_series(1, :submissions) g
+    WHERE students.nickname LIKE :prefix || '%'
+    """,
+    """
+    UPDATE students SET last_submission_id = (SELECT max(id) FROM submissions WHERE student_id = students.id)
+    WHERE students.nickname LIKE :prefix || '%' AND submissions_count > 0
+    """,
+]
+
+
+def _seed(prefix: str, students: int, submissions: int):
+    with repository.SessionLocal() as session:
+        for statement in _SEED:
+            session.execute(text(statement), {"prefix": prefix, "students": students, "submissions": submissions})
+        session.commit()
+        session.execute(text("ANALYZE students, submissions"))
+
+        rows = session.execute(
+            text(
+                """
+                SELECT students.id, students.upload_code, submissions.verification_code
+                FROM students LEFT JOIN submissions ON submissions.id = students.last_submission_id
+                WHERE students.nickname LIKE :prefix || '%'
+                """
+            ),
+            {"prefix": prefix},
+        ).all()
+
+    return {
+        "student_ids": [row.id for row in rows],
+        "upload_codes": [row.upload_code for row in rows],
+        "verification_codes": [row.verification_code for row in rows if row.verification_code],
+    }
+
+
+async def _cleanup(prefix: str):
+    with repository.SessionLocal() as session:
+        student_ids = "SELECT id FROM students WHERE nickname LIKE :prefix || '%'"
+        file_names = session.execute(
+            text(f"SELECT file_name FROM submissions WHERE student_id IN ({student_ids})"), {"prefix": prefix}
+        ).scalars()
+        file_names = list(file_names)
+
+        s3 = S3(endpoint_url=Settings.aws_s3_endpoint_url)
+        await s3.remove_files(file_names)
+        s3.close()
+
+        session.execute(
+            text("DELETE FROM file_deletions WHERE file_name = ANY(:file_names)"), {"file_names": file_names}
+        )
+        session.execute(text(f"DELETE FROM submissions WHERE student_id IN ({student_ids})"), {"prefix": prefix})
+        session.execute(text("DELETE FROM students WHERE nickname LIKE :prefix || '%'"), {"prefix": prefix})
+        session.execute(
+            text("DELETE FROM rate_limit_buckets WHERE key LIKE '%' || :prefix || '%' OR key LIKE '%=' || :ips"),
+            {"prefix": prefix, "ips": _CLIENT_IPS},
+        )
+        session.commit()
+
+
+def _ensure_bucket():
+    s3 = S3(endpoint_url=Settings.aws_s3_endpoint_url)
+    s3_client = s3._s3_client
+    if Settings.aws_s3_bucket_name not in [bucket["Name"] for bucket in s3_client.list_buckets()["Buckets"]]:
+        s3_client.create_bucket(Bucket=Settings.aws_s3_bucket_name)
+    s3.close()
+
+
+def _start_server(port: int, workers: int, rate_limit_backend: str):
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "src.web.api:app", "--port", str(port), "--workers", str(workers)],
+        env={
+            **os.environ,
+            "ENV": "STAGE",
+            "RATE_LIMIT_BACKEND": rate_limit_backend,
+            "RATE_LIMIT_CLIENT_IP_HEADER": "Fly-Client-IP",
+        },
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    return server
+
+
+async def _wait_for_server(client: AsyncClient, timeout_seconds: float = 30):
+    deadline = time.monotonic() + timeout_seconds
+    while True:
+        try:
+            if (await client.get("/")).status_code == 200:
+                return
+        except Exception:
+            if time.monotonic() > deadline:
+                raise
+        await asyncio.sleep(0.2)
+
+
+def _percentile(quantiles, percent, unit=1000):
+    return round(quantiles[percent - 1] * unit, 2)
+
+
+def _rate_limiter_overhead(prefix: str, calls: int):
+    """Times the token bucket checks of each backend, each key is checked twice as under a load spread over clients."""
+
+    def _timed_calls(take):
+        durations = []
+        for i in range(calls):
+            started_at = time.perf_counter()
+            take(f"benchmark {prefix} {i % max(1, calls // 2)}")
+            durations.append(time.perf_counter() - started_at)
+        quantiles = statistics.quantiles(durations, n=100, method="inclusive")
+        return {"p50_us": _percentile(quantiles, 50, 10**6), "p99_us": _percentile(quantiles, 99, 10**6)}
+
+    buckets = TokenBuckets(Settings.rate_limit_buckets_max_size)
+    with repository.SessionLocal() as session:
+        return {
+            "memory": _timed_calls(lambda key: buckets.take(key, 10, 1)),
+            "postgres": _timed_calls(lambda key: repository.take_rate_limit_token(session, key, 10, 1)),
+        }
+
+
+def _client_headers(args):
+    client = random.randrange(args.clients)
+    return {"Fly-Client-IP": f"198.18.{client // 256}.{client % 256}"}
+
+
+async def _drive(requests, concurrency: int):
+    """Sends the requests with the given number of concurrent clients and summarizes the responses."""
+    requests = iter(requests)
+    latencies = []
+    statuses = {}
+
+    async def _client():
+        for request in requests:
+            started_at = time.perf_counter()
+            try:
+                status = str((await request()).status_code)
+            except Exception as e:
+                status = type(e).__name__
+            latencies.append(time.perf_counter() - started_at)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    started_at = time.perf_counter()
+    await asyncio.gather(*[_client() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - started_at
+
+    quantiles = statistics.quantiles(latencies, n=100, method="inclusive") if len(latencies) > 1 else latencies * 99
+    return {
+        "requests": len(latencies),
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "latency_ms": {
+            "p50": _percentile(quantiles, 50),
+            "p95": _percentile(quantiles, 95),
+            "p99": _percentile(quantiles, 99),
+            "max": round(max(latencies) * 1000, 2),
+        },
+        "statuses": statuses,
+    }
+
+
+def _upload_storm(client, seeded, args):
+    uploads_available = Settings.submissions_per_student_count_limit - args.submissions
+    upload_codes = [code for code in seeded["upload_codes"] for _ in range(uploads_available)][: args.uploads]
+    random.shuffle(upload_codes)
+    content = os.urandom(args.file_size_kb * 1024)
+
+    return [
+        lambda upload_code=upload_code, headers=_client_headers(args): client.post(
+            f"/submissions/{upload_code}", files={"file": ("answer.bin", content)}, headers=headers
+        )
+        for upload_code in upload_codes
+    ]
+
+
+def _summary_polling(client, seeded, args):
+    headers = {"Authorization": f"Bearer {Settings.auth_token}"}
+    return [
+        lambda after=after: client.get("/students", params={"limit": 100, "after": after}, headers=headers)
+        for after in random.choices(seeded["student_ids"], k=args.polls)
+    ]
+
+
+def _download_url_burst(client, seeded, args):
+    codes = [
+        code if random.random() < 0.9 else uuid.uuid4().hex[:9]
+        for code in random.choices(seeded["verification_codes"], k=args.downloads)
+    ]
+    return [
+        lambda code=code, headers=_client_headers(args): client.get(
+            f"/verifications/{code}/download_url", headers=headers
+        )
+        for code in codes
+    ]
+
+
+_SCENARIOS = {
+    "upload_storm": _upload_storm,
+    "summary_polling": _summary_polling,
+    "download_url_burst": _download_url_burst,
+}
+
+
+async def _benchmark(args):
+    prefix = f"b{uuid.uuid4().hex[:5]}"
+    _ensure_bucket()
+    seeded = _seed(prefix, args.students, args.submissions)
+    server = _start_server(args.port, args.workers, args.rate_limit_backend)
+
+    scenarios = {}
+    try:
+        async with AsyncClient(base_url=f"http://127.0.0.1:{args.port}", timeout=60) as client:
+            await _wait_for_server(client)
+            for name in args.scenarios:
+                requests = _SCENARIOS[name](client, seeded, args)
+                scenarios[name] = await _drive(requests, args.concurrency)
+        rate_limiter = _rate_limiter_overhead(prefix, args.rate_limiter_calls)
+    finally:
+        server.terminate()
+        server.wait()
+        await _cleanup(prefix)
+
+    try:
+        commit = subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {
+        "commit": commit,
+        "students": args.students,
+        "submissions_per_student": args.submissions,
+        "concurrency": args.concurrency,
+        "workers": args.workers,
+        "rate_limit_backend": args.rate_limit_backend,
+        "scenarios": scenarios,
+        "rate_limiter": rate_limiter,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--students", type=int, default=10000)
+    parser.add_argument("--submissions", type=int, default=2, help="per student, below the submissions limit")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--uploads", type=int, default=500)
+    parser.add_argument("--file-size-kb", type=int, default=64)
+    parser.add_argument("--polls", type=int, default=500)
+    parser.add_argument("--downloads", type=int, default=2000)
+    parser.add_argument("--clients", type=int, default=1000, help="client IPs the requests are spread over")
+    parser.add_argument("--rate-limit-backend", choices=["off", "memory", "postgres"], default="memory")
+    parser.add_argument("--rate-limiter-calls", type=int, default=2000, help="timed token bucket checks per backend")
+    parser.add_argument("--scenarios", nargs="+", choices=list(_SCENARIOS), default=list(_SCENARIOS))
+    parser.add_argument("--output", help="a file to write the JSON report to")
+    args = parser.parse_args()
+
+    if not 0 <= args.submissions < Settings.submissions_per_student_count_limit:
+        parser.error(f"--submissions must be below {Settings.submissions_per_student_count_limit}")
+
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    result = json.dumps(asyncio.run(_benchmark(args)), indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(result + "\n")
+    print(result)
@@ -0,0 +1,91 @@
+"""Compares concurrent-request throughput of the synchronous and asynchronous database session paths.
+
+It seeds a student with a submission, then sends the same batch of concurrent
+`GET /students/{nickname}` requests to the application twice: once with the synchronous
+psycopg2 session injected into the routes and once with the default asynchronous session.
+The route queries the student and the submissions on every request, unlike the routes
+by the upload code answered from the cache of students.
+
+Keep the concurrency below the size of the synchronous connection pool (15 by default),
+above it the synchronous path blocks the event loop while waiting for a pooled connection
+and stalls until the pool timeout.
+
+Run it against a migrated database with `make benchmark_db_sessions`.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import time
+import uuid
+
+from httpx import ASGITransport, AsyncClient
+
+from src.database import repository
+from src.settings import Settings
+from src.web.api import app, get_db
+
+
+def _sync_db():
+    with repository.SessionLocal() as session:
+        yield session
+
+
+async def _measure(nickname: str, requests: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://benchmark") as client:
+
+        async def _request():
+            async with semaphore:
+                response = await client.get(
+                    f"/students/{nickname}", headers={"Authorization": f"Bearer {Settings.auth_token}"}
+                )
+                response.raise_for_status()
+
+        started_at = time.perf_counter()
+        await asyncio.gather(*[_request() for _ in range(requests)])
+        elapsed = time.perf_counter() - started_at
+
+    return {"requests": requests, "seconds": round(elapsed, 3), "requests_per_second": round(requests / elapsed, 1)}
+
+
+async def _benchmark(requests: int, concurrency: int):
+    # all the requests come from one client, the rate limits would reject them
+    Settings.rate_limit_backend = "off"
+    nickname = f"bench{uuid.uuid4().hex[:7]}"
+
+    with repository.SessionLocal() as session:
+        student = repository.add_student(
+            session, nickname=nickname, first_name="Bench", last_name="Mark", email=f"{nickname}@example.com"
+        )
+        repository.add_submission(
+            session, student_id=student.id, file_name=f"{nickname}.pdf", md5="0" * 32, size_bytes=1
+        )
+        student_id = student.id
+
+    try:
+        app.dependency_overrides[get_db] = _sync_db
+        sync_result = await _measure(nickname, requests, concurrency)
+
+        app.dependency_overrides.pop(get_db)
+        async_result = await _measure(nickname, requests, concurrency)
+    finally:
+        with repository.SessionLocal() as session:
+            session.query(repository.Submission).filter(repository.Submission.student_id == student_id).delete()
+            session.query(repository.Student).filter(repository.Student.id == student_id).delete()
+            session.commit()
+
+    return {"concurrency": concurrency, "sync": sync_result, "async": async_result}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=10, help="below the synchronous pool size")
+    args = parser.parse_args()
+
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    print(json.dumps(asyncio.run(_benchmark(args.requests, args.concurrency)), indent=2))
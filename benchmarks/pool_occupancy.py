@@ -0,0 +1,124 @@
+"""Samples the occupancy of the database connection pool during concurrent submission uploads.
+
+It seeds students, replaces the storage with a stand-in that takes `--storage-latency-ms`
+to transfer a file, and posts one submission per student with the given concurrency.
+A background thread samples the pool every millisecond and the script reports the peak and mean number
+of checked out connections.
+
+Run it against a migrated database with `make benchmark_pool_occupancy`.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import threading
+import time
+import uuid
+
+from httpx import ASGITransport, AsyncClient
+
+from src.database import repository
+from src.settings import Settings
+from src.web.api import app, get_s3
+
+
+class _SlowStorage:
+    def __init__(self, latency_seconds: float):
+        self._latency_seconds = latency_seconds
+
+    async def upload_file(self, file_object):
+        size_bytes = len(file_object.file.read())
+        await asyncio.sleep(self._latency_seconds)
+        return {"size_bytes": size_bytes, "md5": "0" * 32, "file_name": f"{uuid.uuid4()}.bin"}
+
+    async def remove_file(self, file_name):
+        await asyncio.sleep(self._latency_seconds)
+        return {}
+
+    def retry_after_seconds(self):
+        return 0
+
+
+class _PoolSampler(threading.Thread):
+    def __init__(self):
+        super().__init__(daemon=True)
+        self._stop_event = threading.Event()
+        self.samples = []
+
+    def run(self):
+        while not self._stop_event.is_set():
+            self.samples.append(repository.pool_status()["checked_out"])
+            time.sleep(0.001)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+async def _benchmark(students: int, concurrency: int, latency_ms: int, file_size_kb: int):
+    # all the requests come from one client, the rate limits would reject them
+    Settings.rate_limit_backend = "off"
+    prefix = uuid.uuid4().hex[:6]
+    with repository.SessionLocal() as session:
+        upload_codes = []
+        for index in range(students):
+            nickname = f"p{prefix}{index}"
+            student = repository.add_student(
+                session, nickname=nickname, first_name="Pool", last_name="Sample", email=f"{nickname}@example.com"
+            )
+            upload_codes.append(student.upload_code)
+
+    app.dependency_overrides[get_s3] = lambda: _SlowStorage(latency_ms / 1000)
+    semaphore = asyncio.Semaphore(concurrency)
+    sampler = _PoolSampler()
+
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://benchmark") as client:
+
+            async def _upload(upload_code):
+                async with semaphore:
+                    response = await client.post(
+                        f"/submissions/{upload_code}", files={"file": ("answer.bin", b"0" * file_size_kb * 1024)}
+                    )
+                    response.raise_for_status()
+
+            sampler.start()
+            started_at = time.perf_counter()
+            await asyncio.gather(*[_upload(upload_code) for upload_code in upload_codes])
+            elapsed = time.perf_counter() - started_at
+            sampler.stop()
+    finally:
+        app.dependency_overrides.pop(get_s3)
+        with repository.SessionLocal() as session:
+            student_ids = session.query(repository.Student.id).filter(repository.Student.nickname.like(f"p{prefix}%"))
+            session.query(repository.Submission).filter(repository.Submission.student_id.in_(student_ids)).delete()
+            session.query(repository.Student).filter(repository.Student.nickname.like(f"p{prefix}%")).delete()
+            session.commit()
+
+    samples = sampler.samples or [0]
+    return {
+        "uploads": students,
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 3),
+        "storage_latency_ms": latency_ms,
+        "pool": {
+            "size": repository.pool_status()["size"],
+            "peak_checked_out": max(samples),
+            "mean_checked_out": round(sum(samples) / len(samples), 3),
+        },
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--students", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--storage-latency-ms", type=int, default=50)
+    parser.add_argument("--file-size-kb", type=int, default=4)
+    args = parser.parse_args()
+
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    result = asyncio.run(_benchmark(args.students, args.concurrency, args.storage_latency_ms, args.file_size_kb))
+    print(json.dumps(result, indent=2))
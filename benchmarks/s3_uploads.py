@@ -0,0 +1,82 @@
+"""Compares the throughput of concurrent uploads with the blocking boto3 calls and with the S3 storage class.
+
+It uploads the same number of files twice with the given concurrency: once calling
+the boto3 client inline on the event loop, as the storage class did before, and once awaiting
+S3.upload_file, which runs the calls in the storage's thread pool. Uploaded files are removed afterwards.
+
+Run it against the MinIO container from docker-compose.yml with `make benchmark_s3_uploads`.
+"""
+
+import argparse
+import asyncio
+from io import BytesIO
+import json
+import os
+import time
+import uuid
+
+from src.settings import Settings
+from src.web.storage.s3 import S3
+
+
+class _UploadedFile:
+    def __init__(self, size_bytes: int):
+        self.filename = "answer.bin"
+        self.file = BytesIO(os.urandom(size_bytes))
+
+
+async def _measure(upload, uploads: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def _upload():
+        async with semaphore:
+            return await upload()
+
+    started_at = time.perf_counter()
+    file_names = await asyncio.gather(*[_upload() for _ in range(uploads)])
+    elapsed = time.perf_counter() - started_at
+
+    result = {"uploads": uploads, "seconds": round(elapsed, 3), "uploads_per_second": round(uploads / elapsed, 1)}
+    return result, file_names
+
+
+async def _benchmark(uploads: int, concurrency: int, size_kb: int):
+    s3 = S3(endpoint_url=Settings.aws_s3_endpoint_url)
+    s3_client = s3._s3_client
+
+    if Settings.aws_s3_bucket_name not in [bucket["Name"] for bucket in s3_client.list_buckets()["Buckets"]]:
+        s3_client.create_bucket(Bucket=Settings.aws_s3_bucket_name)
+
+    async def _blocking_upload():
+        file_name = f"{uuid.uuid4()}.bin"
+        s3_client.put_object(Body=_UploadedFile(size_kb * 1024).file, Bucket=Settings.aws_s3_bucket_name, Key=file_name)
+        return file_name
+
+    async def _async_upload():
+        response = await s3.upload_file(_UploadedFile(size_kb * 1024))
+        return response["file_name"]
+
+    blocking_result, blocking_file_names = await _measure(_blocking_upload, uploads, concurrency)
+    async_result, async_file_names = await _measure(_async_upload, uploads, concurrency)
+
+    await asyncio.gather(*[s3.remove_file(file_name) for file_name in blocking_file_names + async_file_names])
+    s3.close()
+
+    return {
+        "concurrency": concurrency,
+        "file_size_kb": size_kb,
+        "max_pool_connections": Settings.aws_s3_max_pool_connections,
+        "blocking": blocking_result,
+        "async": async_result,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--uploads", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--file-size-kb", type=int, default=512)
+    args = parser.parse_args()
+
+    result = asyncio.run(_benchmark(args.uploads, args.concurrency, args.file_size_kb))
+    print(json.dumps(result, indent=2))
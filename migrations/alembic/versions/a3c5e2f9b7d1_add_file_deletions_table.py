@@ -0,0 +1,38 @@
+"""add file_deletions table
+
+Revision ID: a3c5e2f9b7d1
+Revises: 1f5f8108a1e8
+Create Date: 2026-10-17 09:12:41.503217
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "a3c5e2f9b7d1"
+down_revision: Union[str, None] = "1f5f8108a1e8"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "file_deletions",
+        sa.Column("id", sa.Integer, primary_key=True, autoincrement=True),
+        sa.Column("file_name", sa.String, nullable=False),
+        sa.Column("attempts", sa.Integer, nullable=False, server_default="0"),
+        sa.Column("next_attempt_at", sa.DateTime, nullable=False, server_default=sa.func.now()),
+        sa.Column("last_error", sa.String, nullable=True),
+        sa.Column("created_at", sa.DateTime, nullable=False),
+        sa.Column("updated_at", sa.DateTime, nullable=False),
+    )
+    op.create_index("file_deletions_next_attempt_at_index", "file_deletions", ["next_attempt_at"])
+
+
+def downgrade() -> None:
+    op.drop_index("file_deletions_next_attempt_at_index", "file_deletions")
+    op.drop_table("file_deletions")
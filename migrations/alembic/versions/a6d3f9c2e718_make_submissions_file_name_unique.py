@@ -0,0 +1,30 @@
+"""make submissions file_name unique
+
+Revision ID: a6d3f9c2e718
+Revises: e8f1b6c3d924
+Create Date: 2026-10-17 19:02:37.915204
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "a6d3f9c2e718"
+down_revision: Union[str, None] = "e8f1b6c3d924"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # a file completes one submission only, concurrent completions of the same upload can't both insert
+    # a submission; the constraint's index replaces the one of the upload completion check
+    op.drop_index("submissions_file_name_index", "submissions")
+    op.create_unique_constraint("submissions_file_name_unique", "submissions", ["file_name"])
+
+
+def downgrade() -> None:
+    op.drop_constraint("submissions_file_name_unique", "submissions", type_="unique")
+    op.create_index("submissions_file_name_index", "submissions", ["file_name"])
@@ -0,0 +1,38 @@
+"""add pooled_codes table
+
+Revision ID: b9e1c6f3a274
+Revises: f4a7d3b8e152
+Create Date: 2026-10-17 14:05:37.804219
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "b9e1c6f3a274"
+down_revision: Union[str, None] = "f4a7d3b8e152"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "pooled_codes",
+        sa.Column("id", sa.Integer, primary_key=True, autoincrement=True),
+        sa.Column("kind", sa.String, nullable=False),
+        sa.Column("code", sa.String, nullable=False),
+        sa.Column("created_at", sa.DateTime, nullable=False),
+        sa.Column("updated_at", sa.DateTime, nullable=False),
+        sa.UniqueConstraint("kind", "code", name="pooled_codes_kind_code_unique"),
+    )
+    # the codes of a kind are claimed in the order of generation
+    op.create_index("pooled_codes_kind_id_index", "pooled_codes", ["kind", "id"])
+
+
+def downgrade() -> None:
+    op.drop_index("pooled_codes_kind_id_index", "pooled_codes")
+    op.drop_table("pooled_codes")
@@ -0,0 +1,27 @@
+"""add file_deletions file_name index
+
+Revision ID: c4b8e2d7f093
+Revises: a6d3f9c2e718
+Create Date: 2026-10-17 19:41:08.527713
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "c4b8e2d7f093"
+down_revision: Union[str, None] = "a6d3f9c2e718"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # the orphaned files sweep skips the files queued for removal already
+    op.create_index("file_deletions_file_name_index", "file_deletions", ["file_name"])
+
+
+def downgrade() -> None:
+    op.drop_index("file_deletions_file_name_index", "file_deletions")
@@ -0,0 +1,36 @@
+"""add submissions expired_at and created_at index
+
+Revision ID: c81d4e6a2f30
+Revises: a3c5e2f9b7d1
+Create Date: 2026-10-17 10:03:18.270514
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "c81d4e6a2f30"
+down_revision: Union[str, None] = "a3c5e2f9b7d1"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("submissions", sa.Column("expired_at", sa.DateTime, nullable=True))
+    # the index covers only the submissions which are not expired yet,
+    # it's used to select them in batches ordered by creation time
+    op.create_index(
+        "submissions_created_at_index",
+        "submissions",
+        ["created_at", "id"],
+        postgresql_where=sa.text("expired_at IS NULL"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("submissions_created_at_index", "submissions")
+    op.drop_column("submissions", "expired_at")
@@ -0,0 +1,28 @@
+"""add errors occurrences
+
+Revision ID: d2c7e4a9b351
+Revises: b9e1c6f3a274
+Create Date: 2026-10-17 16:22:48.193650
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "d2c7e4a9b351"
+down_revision: Union[str, None] = "b9e1c6f3a274"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # identical errors are buffered and persisted once with the number of their occurrences
+    op.add_column("errors", sa.Column("occurrences", sa.Integer, nullable=False, server_default="1"))
+
+
+def downgrade() -> None:
+    op.drop_column("errors", "occurrences")
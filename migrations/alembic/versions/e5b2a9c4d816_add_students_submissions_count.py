@@ -0,0 +1,44 @@
+"""add students submissions_count and last_submission_id
+
+Revision ID: e5b2a9c4d816
+Revises: c81d4e6a2f30
+Create Date: 2026-10-17 11:20:52.118392
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "e5b2a9c4d816"
+down_revision: Union[str, None] = "c81d4e6a2f30"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("students", sa.Column("submissions_count", sa.Integer, nullable=False, server_default="0"))
+    op.add_column(
+        "students",
+        sa.Column(
+            "last_submission_id",
+            sa.Integer,
+            sa.ForeignKey("submissions.id", name="students_last_submission_id_fkey", ondelete="SET NULL"),
+            nullable=True,
+        ),
+    )
+    op.execute(
+        """
+        UPDATE students SET
+            submissions_count = (SELECT count(*) FROM submissions WHERE submissions.student_id = students.id),
+            last_submission_id = (SELECT max(id) FROM submissions WHERE submissions.student_id = students.id)
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("students", "last_submission_id")
+    op.drop_column("students", "submissions_count")
@@ -0,0 +1,38 @@
+"""add rate_limit_buckets table
+
+Revision ID: e8f1b6c3d924
+Revises: d2c7e4a9b351
+Create Date: 2026-10-17 18:05:12.640381
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "e8f1b6c3d924"
+down_revision: Union[str, None] = "d2c7e4a9b351"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # the buckets are updated on every limited request, an unlogged table skips the WAL
+    # and is truncated on a crash, which only resets the limits
+    op.create_table(
+        "rate_limit_buckets",
+        sa.Column("key", sa.String, primary_key=True),
+        sa.Column("tokens", sa.Float, nullable=False),
+        sa.Column("created_at", sa.DateTime, nullable=False),
+        sa.Column("updated_at", sa.DateTime, nullable=False),
+        prefixes=["UNLOGGED"],
+    )
+    op.create_index("rate_limit_buckets_updated_at_index", "rate_limit_buckets", ["updated_at"])
+
+
+def downgrade() -> None:
+    op.drop_index("rate_limit_buckets_updated_at_index", "rate_limit_buckets")
+    op.drop_table("rate_limit_buckets")
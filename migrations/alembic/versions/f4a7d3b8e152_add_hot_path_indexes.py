@@ -0,0 +1,36 @@
+"""add hot path indexes
+
+Revision ID: f4a7d3b8e152
+Revises: e5b2a9c4d816
+Create Date: 2026-10-17 12:41:06.512837
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "f4a7d3b8e152"
+down_revision: Union[str, None] = "e5b2a9c4d816"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # submissions of a student are loaded by the foreign key
+    op.create_index("submissions_student_id_index", "submissions", ["student_id"])
+    # removing a submission resets the pointer of the student to it
+    op.create_index("students_last_submission_id_index", "students", ["last_submission_id"])
+    # upload completion checks if the uploaded file is submitted already
+    op.create_index("submissions_file_name_index", "submissions", ["file_name"])
+    # the last errors are selected in the order of creation
+    op.create_index("errors_created_at_index", "errors", ["created_at"])
+
+
+def downgrade() -> None:
+    op.drop_index("errors_created_at_index", "errors")
+    op.drop_index("submissions_file_name_index", "submissions")
+    op.drop_index("students_last_submission_id_index", "students")
+    op.drop_index("submissions_student_id_index", "submissions")
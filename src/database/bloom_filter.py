@@ -0,0 +1,56 @@
+import hashlib
+import math
+
+
+class BloomFilter:
+    """A compact probabilistic set of strings.
+
+    A lookup of an added string always succeeds, a lookup of another string succeeds with the false positive rate
+    as long as the number of added strings doesn't exceed the capacity. The strings can't be removed,
+    the filter is rebuilt instead.
+
+    Args:
+        capacity (int): The expected number of strings.
+        false_positive_rate (float): The probability of a false positive lookup at the capacity.
+    """
+
+    def __init__(self, capacity: int, false_positive_rate: float):
+        self._capacity = capacity
+        self._false_positive_rate = false_positive_rate
+        self._size_bits = max(8, math.ceil(-capacity * math.log(false_positive_rate) / math.log(2) ** 2))
+        self._hash_count = max(1, round(self._size_bits / capacity * math.log(2)))
+        self._bits = bytearray((self._size_bits + 7) // 8)
+
+    def _positions(self, item: str):
+        # double hashing derives all the positions from the two halves of one digest
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        return [(first + index * second) % self._size_bits for index in range(self._hash_count)]
+
+    def add(self, item: str):
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item: str):
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+    def estimated_count(self):
+        """Estimates the number of distinct strings added by the number of set bits."""
+        set_bits = int.from_bytes(self._bits, "little").bit_count()
+        if set_bits >= self._size_bits:
+            return math.inf
+        return round(-self._size_bits / self._hash_count * math.log(1 - set_bits / self._size_bits))
+
+    def stats(self):
+        """Returns the capacity, the memory size, the number of hash functions, the estimated number of strings,
+        and the configured and the estimated current false positive rates of the filter."""
+        set_ratio = int.from_bytes(self._bits, "little").bit_count() / self._size_bits
+        return {
+            "capacity": self._capacity,
+            "size_bytes": len(self._bits),
+            "hash_count": self._hash_count,
+            "estimated_count": self.estimated_count(),
+            "false_positive_rate": self._false_positive_rate,
+            "estimated_false_positive_rate": round(set_ratio**self._hash_count, 6),
+        }
@@ -0,0 +1,68 @@
+from collections import OrderedDict
+import threading
+import time
+
+
+class TTLCache:
+    """A bounded in-process cache evicting the least recently used entries and the entries older than the TTL.
+
+    None values are cached as well with a separate, usually shorter, TTL to remember the keys that were not found.
+
+    Read-only properies:
+        hits (int): The number of lookups that found a cached value, including None.
+        misses (int): The number of lookups that found no cached value or an expired one.
+    """
+
+    # returned for the keys that are not cached, since None is a valid cached value
+    MISSING = object()
+
+    def __init__(self, max_size: int, ttl_seconds: float, none_ttl_seconds: float):
+        self._max_size = max_size
+        self._ttl_seconds = ttl_seconds
+        self._none_ttl_seconds = none_ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Returns the cached value, or TTLCache.MISSING if the key is not cached or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return self.MISSING
+
+    def put(self, key, value):
+        ttl_seconds = self._none_ttl_seconds if value is None else self._ttl_seconds
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl_seconds)
+            self._entries.move_to_end(key)
+            if len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """Returns the number of entries, hits, misses and the hit rate of the cache."""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
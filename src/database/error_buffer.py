@@ -0,0 +1,37 @@
+import threading
+
+
+class ErrorBuffer:
+    """A bounded in-process buffer counting the occurrences of identical error details until they are flushed.
+
+    Once the buffer holds the maximum number of distinct details, new ones are dropped and only counted,
+    so a storm of failures can't exhaust the memory.
+
+    Read-only properies:
+        dropped (int): The number of occurrences dropped since the last drain.
+    """
+
+    def __init__(self, max_size: int):
+        self._max_size = max_size
+        self._counts = {}
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    def add(self, detail: str, occurrences: int = 1):
+        with self._lock:
+            if detail in self._counts:
+                self._counts[detail] += occurrences
+            elif len(self._counts) < self._max_size:
+                self._counts[detail] = occurrences
+            else:
+                self.dropped += occurrences
+
+    def drain(self):
+        """Empties the buffer and returns the occurrences by detail and the number of dropped occurrences."""
+        with self._lock:
+            counts, self._counts = self._counts, {}
+            dropped, self.dropped = self.dropped, 0
+        return counts, dropped
+
+    def clear(self):
+        self.drain()
@@ -16,6 +16,9 @@ class Base(DeclarativeBase):
     """
 
     __abstract__ = True
+    # fetch the generated column values with RETURNING on insert,
+    # so they are available without a lazy load afterwards
+    __mapper_args__ = {"eager_defaults": True}
 
     created_at = Column(DateTime, default=func.now(), nullable=False)
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now(), nullable=False)
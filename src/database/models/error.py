@@ -4,9 +4,13 @@ from .base import Base
 
 
 class Error(Base):
-    """Model to store errors that occur when uploading to S3."""
+    """Model to store errors that occur when uploading to S3.
+
+    Identical errors buffered within a flush interval are stored once with the number of their occurrences.
+    """
 
     __tablename__ = "errors"
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     detail = Column(String, nullable=False)
+    occurrences = Column(Integer, nullable=False, default=1, server_default="1")
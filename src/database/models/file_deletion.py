@@ -0,0 +1,24 @@
+from sqlalchemy import Column, DateTime, Integer, String
+from sqlalchemy.sql import func
+
+from .base import Base
+
+
+class FileDeletion(Base):
+    """Model of a file pending removal from the storage.
+
+    The records are written in the same transaction that makes the file obsolete,
+    and are removed once the file deletions worker has deleted the file from the storage.
+
+    Automatically initialised properties:
+        attempts (int): The number of failed attempts to remove the file.
+        next_attempt_at (DateTime): The timestamp after which the file can be removed (again).
+    """
+
+    __tablename__ = "file_deletions"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    file_name = Column(String, nullable=False)
+    attempts = Column(Integer, default=0, nullable=False)
+    next_attempt_at = Column(DateTime, default=func.now(), nullable=False)
+    last_error = Column(String)
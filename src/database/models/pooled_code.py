@@ -0,0 +1,22 @@
+from sqlalchemy import Column, Integer, String, UniqueConstraint
+
+from .base import Base
+
+
+class PooledCode(Base):
+    """Model of a pre-generated code waiting to be assigned to a student or a submission.
+
+    The code pool worker fills the pool with codes of each kind that are not used yet,
+    and the records are removed when the codes are claimed for new students or submissions.
+
+    Properties:
+        kind (str): The name of the column the code is generated for, upload_code or verification_code.
+        code (str): The code.
+    """
+
+    __tablename__ = "pooled_codes"
+    __table_args__ = (UniqueConstraint("kind", "code", name="pooled_codes_kind_code_unique"),)
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    kind = Column(String, nullable=False)
+    code = Column(String, nullable=False)
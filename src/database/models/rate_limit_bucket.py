@@ -0,0 +1,21 @@
+from sqlalchemy import Column, Float, String
+
+from .base import Base
+
+
+class RateLimitBucket(Base):
+    """Model of a token bucket of the rate limits shared by the processes serving the API.
+
+    The table is unlogged, it's not written to the WAL, so the updates are cheaper, and the buckets are lost
+    on a crash, which only resets the limits. The updated_at column is the time of the last refill.
+
+    Properties:
+        key (str): The route and the key the requests are limited by, f.e. the client IP.
+        tokens (float): The number of tokens left at the time of the last refill.
+    """
+
+    __tablename__ = "rate_limit_buckets"
+    __table_args__ = {"prefixes": ["UNLOGGED"]}
+
+    key = Column(String, primary_key=True)
+    tokens = Column(Float, nullable=False)
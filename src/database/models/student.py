@@ -1,7 +1,7 @@
 import secrets
 import string
 
-from sqlalchemy import Column, Integer, String
+from sqlalchemy import Column, ForeignKey, Integer, String
 from sqlalchemy.orm import relationship
 
 from .base import Base
@@ -10,7 +10,7 @@ from src.settings import Settings
 _alphabet = string.ascii_uppercase + string.digits
 
 
-def _generate_upload_code():
+def generate_upload_code():
     return "".join(secrets.choice(_alphabet) for _ in range(0, Settings.upload_code_length))
 
 
@@ -21,10 +21,15 @@ class Student(Base):
         id (int): The unique identifier of the student.
         upload_code (str): The upload code generated for the student.
 
+    Properties maintained on adding a submission:
+        submissions_count (int): The number of submissions made by the student.
+        last_submission_id (int): The ID of the last submission made by the student, or None.
+
     Read-only properies:
         submissions (list): A list of submissions made by the student.
-        has_submission (bool): Indicates whether the student has made any submissions.
         last_submission (Submission): The last submission made by the student, or None if no submissions exist.
+        has_submission (bool): Indicates whether the student has made any submissions.
+        uploads_available (int): The number of submission uploads available to the student.
     """
 
     __tablename__ = "students"
@@ -34,17 +39,18 @@ class Student(Base):
     first_name = Column(String, nullable=False)
     last_name = Column(String, nullable=False)
     email = Column(String, nullable=False)
-    upload_code = Column(String, nullable=False, default=_generate_upload_code)
+    upload_code = Column(String, nullable=False, default=generate_upload_code)
+    submissions_count = Column(Integer, default=0, nullable=False)
+    # submissions refer to students as well, so the constraint is created after both tables
+    last_submission_id = Column(Integer, ForeignKey("submissions.id", ondelete="SET NULL", use_alter=True))
 
-    submissions = relationship("Submission", backref="student", viewonly=True)
+    submissions = relationship("Submission", backref="student", viewonly=True, foreign_keys="Submission.student_id")
+    last_submission = relationship("Submission", viewonly=True, foreign_keys=[last_submission_id])
 
     @property
     def has_submission(self):
-        return len(self.submissions) > 0
+        return self.last_submission_id is not None
 
     @property
-    def last_submission(self):
-        if self.submissions:
-            return sorted(self.submissions, key=lambda submission: submission.id, reverse=True)[0]
-        else:
-            return None
+    def uploads_available(self):
+        return Settings.submissions_per_student_count_limit - self.submissions_count
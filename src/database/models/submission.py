@@ -1,7 +1,7 @@
 import string
 import secrets
 
-from sqlalchemy import Column, Integer, ForeignKey, String
+from sqlalchemy import Column, DateTime, Integer, ForeignKey, String, UniqueConstraint
 
 from .base import Base
 from src.settings import Settings
@@ -9,7 +9,7 @@ from src.settings import Settings
 _alphabet = string.ascii_lowercase + string.digits
 
 
-def _generate_verification_code():
+def generate_verification_code():
     return "".join(secrets.choice(_alphabet) for _ in range(0, Settings.verification_code_length))
 
 
@@ -18,9 +18,14 @@ class Submission(Base):
 
     Automatically initialised properties:
         verification_code (str): The verification code for the submission.
+
+    Properties set by the submissions expiry worker:
+        expired_at (DateTime): The timestamp of when the submission file was removed from the storage,
+                               or None if the submission didn't expire yet.
     """
 
     __tablename__ = "submissions"
+    __table_args__ = (UniqueConstraint("file_name", name="submissions_file_name_unique"),)
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     file_name = Column(String, nullable=False)
@@ -28,6 +33,7 @@ class Submission(Base):
     size_bytes = Column(Integer, nullable=False)
 
     student_id = Column(Integer, ForeignKey("students.id"))
+    expired_at = Column(DateTime)
 
     # generated
-    verification_code = Column(String, nullable=False, default=_generate_verification_code)
+    verification_code = Column(String, nullable=False, default=generate_verification_code)
@@ -0,0 +1,66 @@
+import time
+
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool
+
+
+class PoolWaits:
+    """Accumulates the time spent waiting for connections checked out of a pool.
+
+    The wait includes opening a new connection when the pool has none idle.
+
+    Read-only properies:
+        count (int): The number of checkouts.
+        total_seconds (float): The total time of the checkouts.
+        max_seconds (float): The longest checkout.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def add(self, seconds: float):
+        self.count += 1
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+
+    def stats(self):
+        """Returns the number of checkouts, the total, the average and the longest checkout time in seconds."""
+        return {
+            "waits": self.count,
+            "wait_seconds_total": round(self.total_seconds, 6),
+            "wait_seconds_avg": round(self.total_seconds / self.count, 6) if self.count else 0.0,
+            "wait_seconds_max": round(self.max_seconds, 6),
+        }
+
+
+class _TimedPool:
+    """Records the checkout time of the connections into the waits of the pool."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.waits = PoolWaits()
+
+    def _do_get(self):
+        started_at = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            self.waits.add(time.perf_counter() - started_at)
+
+    def recreate(self):
+        # the waits survive the recreation of the pool on engine disposal
+        pool = super().recreate()
+        pool.waits = self.waits
+        return pool
+
+
+class TimedAsyncAdaptedQueuePool(_TimedPool, AsyncAdaptedQueuePool):
+    """The default pool of the asyncio engines recording the checkout time."""
+
+
+class TimedNullPool(_TimedPool, NullPool):
+    """A pool opening a connection per checkout recording the checkout time.
+
+    It's used behind PgBouncer, which pools the server connections itself.
+    """
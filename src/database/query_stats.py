@@ -0,0 +1,80 @@
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+import time
+
+from sqlalchemy import event
+
+from src.logger import logger
+from src.settings import Settings
+
+
+class QueryStats:
+    """The number and the duration of the queries run within a context, f.e. a web request.
+
+    Read-only properies:
+        count (int): The number of queries.
+        seconds (float): The total duration of the queries.
+        statements (Counter): The number of runs of each statement.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.statements = Counter()
+
+    def add(self, statement: str, seconds: float):
+        self.count += 1
+        self.seconds += seconds
+        self.statements[statement] += 1
+
+    def repeated_statements(self, threshold: int):
+        """Returns the statements run at least threshold times, a sign of loading records one by one (N+1)."""
+        return {statement: count for statement, count in self.statements.items() if count >= threshold}
+
+
+# The stats object is shared with the tasks and the greenlets started in the context, which update it in place
+_query_stats = ContextVar("query_stats", default=None)
+
+
+@contextmanager
+def tracked_queries():
+    """Collects the stats of the queries run in the current context and the ones started from it.
+
+    Yields:
+        QueryStats: The stats updated as the queries run.
+    """
+    stats = QueryStats()
+    token = _query_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _query_stats.reset(token)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started_at", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    seconds = time.perf_counter() - conn.info["query_started_at"].pop()
+
+    stats = _query_stats.get()
+    if stats is not None:
+        stats.add(statement, seconds)
+
+    if seconds >= Settings.slow_query_seconds:
+        logger.warning(f"Slow query took {seconds:.3f}s: {statement} with parameters: {parameters!r:.1000}")
+
+
+def _handle_error(exception_context):
+    # the failed query is not timed
+    if exception_context.connection is not None and exception_context.connection.info.get("query_started_at"):
+        exception_context.connection.info["query_started_at"].pop()
+
+
+def instrument_engine(engine):
+    """Times the queries of the engine for the stats of the current context and the slow queries log."""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
@@ -0,0 +1,38 @@
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+from src.settings import Settings
+
+
+@dataclass(frozen=True, slots=True)
+class SubmissionRecord:
+    """Immutable snapshot of a submission's metadata shown to the student."""
+
+    file_name: str
+    md5: str
+    size_bytes: int
+    verification_code: str
+    created_at: datetime
+
+
+@dataclass(frozen=True, slots=True)
+class StudentRecord:
+    """Immutable snapshot of a student's submission state looked up by the upload code.
+
+    Unlike the Student model, it's detached from the database session, so it can be cached and shared
+    between requests.
+    """
+
+    id: int
+    upload_code: str
+    submissions_count: int
+    last_submission: Optional[SubmissionRecord]
+
+    @property
+    def has_submission(self):
+        return self.last_submission is not None
+
+    @property
+    def uploads_available(self):
+        return Settings.submissions_per_student_count_limit - self.submissions_count
@@ -1,15 +1,196 @@
-from sqlalchemy import create_engine, desc, distinct
-from sqlalchemy.orm import Session, sessionmaker
-
+from datetime import timedelta
+import time
+import uuid
+
+from sqlalchemy import any_, create_engine, delete, desc, exists, func, insert, literal, select, tuple_, update
+from sqlalchemy.dialects.postgresql import ARRAY, insert as pg_insert
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, joinedload, sessionmaker
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.pool import NullPool
+
+from src.database.bloom_filter import BloomFilter
+from src.database.cache import TTLCache
+from src.database.error_buffer import ErrorBuffer
 from src.database.models.error import Error
-from src.database.models.submission import Submission
-from src.database.models.student import Student
+from src.database.models.file_deletion import FileDeletion
+from src.database.models.pooled_code import PooledCode
+from src.database.models.rate_limit_bucket import RateLimitBucket
+from src.database.models.submission import generate_verification_code, Submission
+from src.database.models.student import generate_upload_code, Student
+from src.database.pool import TimedAsyncAdaptedQueuePool, TimedNullPool
+from src.database.query_stats import instrument_engine
+from src.database.records import StudentRecord, SubmissionRecord
+from src.metrics import db_operation_duration
 from src.settings import Settings
 
-_engine = create_engine(Settings.database_url)
+
+def _pool_options():
+    # PgBouncer in the transaction mode pools the server connections and assigns one per transaction,
+    # so the connections are not kept open in the process.
+    if Settings.database_pgbouncer:
+        return {"poolclass": NullPool}
+    return {
+        "pool_size": Settings.database_pool_size,
+        "max_overflow": Settings.database_pool_max_overflow,
+        "pool_timeout": Settings.database_pool_timeout_seconds,
+        "pool_recycle": Settings.database_pool_recycle_seconds,
+        "pool_pre_ping": Settings.database_pool_pre_ping,
+    }
+
+
+def _async_engine_options():
+    if not Settings.database_pgbouncer:
+        return {**_pool_options(), "poolclass": TimedAsyncAdaptedQueuePool}
+
+    # The prepared statements are bound to the server connection, which changes between the transactions,
+    # so they are not cached and have unique names.
+    return {
+        "poolclass": TimedNullPool,
+        "connect_args": {
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid.uuid4()}__",
+        },
+    }
+
+
+# The synchronous engine is used by Alembic and the tests,
+# the asynchronous one serves the web requests without blocking the event loop.
+_engine = create_engine(Settings.database_url, **_pool_options())
+_async_engine = create_async_engine(
+    make_url(Settings.database_url).set(drivername="postgresql+asyncpg"), **_async_engine_options()
+)
+instrument_engine(_engine)
+instrument_engine(_async_engine.sync_engine)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=_engine)
 
+# Objects are not expired on commit because reloading their attributes lazily
+# is not possible outside of the AsyncSession.run_sync() call.
+AsyncSessionLocal = async_sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=_async_engine)
+
+# Students looked up by the upload code, including the codes not found. The records are replaced
+# on adding a submission, other processes serving the API see the change when the record expires.
+_students_by_upload_code = TTLCache(
+    Settings.students_cache_max_size,
+    Settings.students_cache_ttl_seconds,
+    Settings.students_cache_not_found_ttl_seconds,
+)
+
+# File names of the submissions looked up by the verification code. The entries are invalidated on expiry
+# of the submissions, other processes stop serving the expired submissions when the entries expire.
+_file_names_by_verification_code = TTLCache(
+    Settings.verification_codes_cache_max_size, Settings.verification_codes_cache_ttl_seconds, 0
+)
+
+# The verification codes of the submissions which are not expired, lookups of other codes are answered
+# without a query. It's None until the verification codes worker builds it.
+_live_verification_codes = None
+# The database time of the last successful refresh of the filter, the next refresh adds the codes created since
+_verification_codes_refreshed_at = None
+_verification_codes_lookups = {"rejected": 0, "passed": 0, "false_positives": 0}
+
+# Errors reported by the requests until the errors worker flushes them to the database
+_errors = ErrorBuffer(Settings.errors_buffer_max_size)
+
+# The generator and the column of each kind of pooled codes
+_POOLED_CODE_KINDS = {
+    "upload_code": (generate_upload_code, Student.upload_code),
+    "verification_code": (generate_verification_code, Submission.verification_code),
+}
+
+
+class SubmissionsCountLimitError(Exception):
+    """Raised when the student has reached the submission uploads limit."""
+
+    pass
+
+
+class SubmissionFileExistsError(Exception):
+    """Raised when the file completes another submission already."""
+
+    pass
+
+
+async def run(session: Session | AsyncSession, fn, *args, **kwargs):
+    """Runs a repository function with a synchronous or an asynchronous session.
+
+    Repository functions are written against the synchronous Session API. Given an AsyncSession,
+    the function is run via AsyncSession.run_sync(), so its database round trips are awaited
+    on the asyncio driver instead of blocking the event loop.
+
+    Args:
+        session (Session | AsyncSession): The database session.
+        fn: The repository function to call, it receives the synchronous session as the first argument.
+        *args: Positional arguments for the function.
+        **kwargs: Keyword arguments for the function.
+
+    Returns:
+        The result of the repository function.
+    """
+    started_at = time.perf_counter()
+    try:
+        if isinstance(session, AsyncSession):
+            return await session.run_sync(fn, *args, **kwargs)
+        return fn(session, *args, **kwargs)
+    finally:
+        db_operation_duration.observe(fn.__name__, value=time.perf_counter() - started_at)
+
+
+def end_transaction(session: Session):
+    """Ends the current transaction of the session.
+
+    The session returns its connection to the pool and checks out one again on the next query.
+    Loaded objects stay usable when the session doesn't expire them on commit.
+
+    Args:
+        session (Session): The database session.
+    """
+    session.commit()
+
+
+def clear_caches():
+    """Drops the records cached and the errors buffered in the process, f.e. after the database records
+    were removed directly."""
+    global _live_verification_codes, _verification_codes_refreshed_at
+
+    _errors.clear()
+    _students_by_upload_code.clear()
+    _file_names_by_verification_code.clear()
+    _live_verification_codes = None
+    _verification_codes_refreshed_at = None
+    for counter in _verification_codes_lookups:
+        _verification_codes_lookups[counter] = 0
+
+
+def students_cache_stats():
+    """Returns the number of cached students looked up by the upload code, hits, misses and the hit rate."""
+    return _students_by_upload_code.stats()
+
+
+def pool_status():
+    """Retrieves the occupancy of the connection pool serving the web requests and the checkout times.
+
+    Behind PgBouncer the connections are not pooled in the process, so only the checkout times are reported.
+
+    Returns:
+        dict: A dictionary containing the pool size, the number of checked out and checked in connections,
+              the current overflow, the number of checkouts, and the total, average and longest checkout time.
+    """
+    pool = _async_engine.pool
+    if isinstance(pool, NullPool):
+        return pool.waits.stats()
+    return {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": pool.overflow(),
+        **pool.waits.stats(),
+    }
+
 
 def add_student(session: Session, **attrs: dict):
     """Adds a new student to the database.
@@ -21,26 +202,139 @@ def add_student(session: Session, **attrs: dict):
     Returns:
         Student: The newly created student.
     """
-    new_student = Student(**attrs)
+    upload_code = _claim_codes(session, "upload_code", 1)[0]
+    new_student = Student(upload_code=upload_code, **attrs)
     session.add(new_student)
     session.commit()
+    _students_by_upload_code.invalidate(upload_code)
+    # a new student has no submissions, so there is no need to load the last one lazily
+    set_committed_value(new_student, "last_submission", None)
     return new_student
 
 
-def student_list_summary(session: Session):
-    """Retrieves summary information about all students and their submissions.
+def add_students(session: Session, students: list):
+    """Adds new students to the database in one transaction.
+
+    The students are inserted with multi-row INSERT statements which skip the students
+    conflicting with the existing ones or with each other by the nickname or the email.
+
+    Args:
+        session (Session): The database session.
+        students (list): A list of dictionaries with the attributes of the students.
+
+    Returns:
+        dict: The upload codes of the inserted students by their nicknames.
+    """
+    if not students:
+        return {}
+
+    upload_codes = _claim_codes(session, "upload_code", len(students))
+    students = [{**student, "upload_code": upload_code} for student, upload_code in zip(students, upload_codes)]
+
+    # executed with many parameter sets, the statement is sent in batches of multi-row VALUES
+    rows = session.execute(
+        pg_insert(Student).on_conflict_do_nothing().returning(Student.nickname, Student.upload_code),
+        students,
+        execution_options={"insertmanyvalues_page_size": Settings.students_bulk_insert_batch_size},
+    ).all()
+    session.commit()
+
+    for upload_code in upload_codes:
+        _students_by_upload_code.invalidate(upload_code)
+
+    return {row.nickname: row.upload_code for row in rows}
+
+
+def _student_summaries_select():
+    # each student is joined to the last submission by the pointer maintained on adding a submission
+    return (
+        select(
+            Student.id,
+            Student.nickname,
+            Student.first_name,
+            Student.last_name,
+            Submission.created_at,
+            Submission.verification_code,
+        )
+        .outerjoin(Submission, Submission.id == Student.last_submission_id)
+        .order_by(Student.id)
+    )
+
+
+def _student_summary(row):
+    return {
+        "nickname": row.nickname,
+        "first_name": row.first_name,
+        "last_name": row.last_name,
+        "has_submission": row.verification_code is not None,
+        "last_submission": (
+            {"created_at": row.created_at, "verification_code": row.verification_code}
+            if row.verification_code is not None
+            else None
+        ),
+    }
+
+
+def student_list_summary(session: Session, limit: int, after: int | None = None):
+    """Retrieves summary information about students and their last submissions page by page.
+
+    Students are ordered by ID and each of them is joined to the last submission with one query,
+    the next page starts after the ID of the last student of the previous page.
 
     Args:
         session (Session): The database session.
+        limit (int): The maximum number of students on the page.
+        after (int): The ID of the last student of the previous page, or None for the first page.
 
     Returns:
-        dict: A dictionary containing the total number of students, total number of submissions, and a list of students.
+        dict: A dictionary containing the total number of students, total number of students with submissions,
+              a list of students, and the ID to request the next page after, or None if it's the last page.
+    """
+    page = _student_summaries_select().limit(limit + 1)
+    if after is not None:
+        page = page.where(Student.id > after)
+
+    totals = session.execute(
+        select(
+            func.count().label("total_students"),
+            func.count().filter(Student.submissions_count > 0).label("total_submissions"),
+        )
+    ).one()
+    rows = session.execute(page).all()
+    session.commit()
+
+    students = [_student_summary(row) for row in rows[:limit]]
+    next_after = rows[limit - 1].id if len(rows) > limit else None
+
+    return {"totals": totals._asdict(), "students": students, "next_after": next_after}
+
+
+async def student_summaries_stream(session: Session | AsyncSession, batch_size: int):
+    """Streams summary information about all students and their last submissions.
+
+    The rows are fetched from a server-side cursor batch by batch, so the memory stays constant
+    regardless of the number of students. The transaction holds the connection until the stream
+    is exhausted or closed.
+
+    Args:
+        session (Session | AsyncSession): The database session.
+        batch_size (int): The number of rows fetched from the cursor at once.
+
+    Yields:
+        list: Summaries of the next batch of students ordered by ID.
     """
-    with session.begin():
-        total_students = session.query(Student).count()
-        total_submissions = session.query(distinct(Submission.student_id)).count()
-        students = session.query(Student).all()
-    return {"totals": {"total_students": total_students, "total_submissions": total_submissions}, "students": students}
+    statement = _student_summaries_select().execution_options(yield_per=batch_size)
+
+    try:
+        if isinstance(session, AsyncSession):
+            result = await session.stream(statement)
+            async for rows in result.partitions():
+                yield [_student_summary(row) for row in rows]
+        else:
+            for rows in session.execute(statement).partitions():
+                yield [_student_summary(row) for row in rows]
+    finally:
+        await run(session, end_transaction)
 
 
 def student_by_nickname(session: Session, nickname):
@@ -53,131 +347,620 @@ def student_by_nickname(session: Session, nickname):
     Returns:
         Student: The student with the specified nickname, or None if not found.
     """
-    student = session.query(Student).filter(Student.nickname == nickname).first()
+    student = (
+        session.query(Student).options(joinedload(Student.last_submission)).filter(Student.nickname == nickname).first()
+    )
     return student
 
 
 def student_by_upload_code(session: Session, upload_code: str):
-    """Retrieves a student from the database by their upload code.
+    """Retrieves a student's submission state by their upload code.
+
+    The records are cached in the process, and the upload codes not found are cached for a shorter time.
 
     Args:
         session (Session): The database session.
         upload_code (str): The upload code of the student.
 
     Returns:
-        Student: The student with the specified upload code, or None if not found.
+        StudentRecord: The student with the specified upload code, or None if not found.
     """
-    student = session.query(Student).filter(Student.upload_code == upload_code).first()
-    return student
+    record = _students_by_upload_code.get(upload_code)
+    if record is not TTLCache.MISSING:
+        return record
+
+    row = session.execute(
+        select(
+            Student.id,
+            Student.upload_code,
+            Student.submissions_count,
+            Submission.file_name,
+            Submission.md5,
+            Submission.size_bytes,
+            Submission.verification_code,
+            Submission.created_at,
+        )
+        .outerjoin(Submission, Submission.id == Student.last_submission_id)
+        .where(Student.upload_code == upload_code)
+    ).first()
+
+    record = None
+    if row:
+        last_submission = None
+        if row.verification_code is not None:
+            last_submission = SubmissionRecord(
+                row.file_name, row.md5, row.size_bytes, row.verification_code, row.created_at
+            )
+        record = StudentRecord(row.id, row.upload_code, row.submissions_count, last_submission)
+
+    _students_by_upload_code.put(upload_code, record)
+    return record
 
 
-def is_student_submission_uploads_limit_reached(session: Session, student_id: int):
-    """Checks if the student has reached the submission uploads limit.
+def add_submission(session: Session, **attrs: dict):
+    """Adds a new submission to the database.
+
+    The submission is counted against the student's submission uploads limit with one conditional update,
+    which locks the student's row and returns the previous submission the student points to.
+    The previous submission file is queued for removal from the storage in the same transaction.
 
     Args:
         session (Session): The database session.
-        student_id (int): The ID of the student.
+        **attrs (dict): Submission attributes.
 
     Returns:
-        bool: True if the student has reached the submission uploads limit, False otherwise.
+        Submission: The newly created submission.
+
+    Raises:
+        SubmissionsCountLimitError: If the student has reached the submission uploads limit,
+                                    then the submission is not added.
+        SubmissionFileExistsError: If a submission with the file exists, f.e. added by a concurrent request,
+                                   then the submission is not added.
     """
-    submissions_count = session.query(Submission).filter(Submission.student_id == student_id).count()
-    return submissions_count >= Settings.submissions_per_student_count_limit
+    student_id = attrs.get("student_id")
+
+    try:
+        # the update locks the student's row, so concurrent submissions are counted one by one
+        counted = session.execute(
+            update(Student)
+            .where(Student.id == student_id, Student.submissions_count < Settings.submissions_per_student_count_limit)
+            .values(submissions_count=Student.submissions_count + 1)
+            .returning(Student.upload_code, Student.submissions_count, Student.last_submission_id)
+            .execution_options(synchronize_session=False)
+        ).first()
+
+        if not counted:
+            raise SubmissionsCountLimitError()
+
+        new_submission = Submission(verification_code=_claim_codes(session, "verification_code", 1)[0], **attrs)
+        session.add(new_submission)
+        # the unique constraint makes a concurrent insert of the same file wait for the first one to commit
+        try:
+            session.flush()
+        except IntegrityError as e:
+            if "submissions_file_name_unique" in str(e.orig):
+                raise SubmissionFileExistsError()
+            raise
+
+        new_submission_id = new_submission.id
+        submission_record = SubmissionRecord(
+            new_submission.file_name,
+            new_submission.md5,
+            new_submission.size_bytes,
+            new_submission.verification_code,
+            new_submission.created_at,
+        )
+        session.execute(
+            update(Student)
+            .where(Student.id == student_id)
+            .values(last_submission_id=new_submission_id)
+            .execution_options(synchronize_session=False)
+        )
+
+        if counted.last_submission_id:
+            session.execute(
+                insert(FileDeletion).from_select(
+                    ["file_name"], select(Submission.file_name).where(Submission.id == counted.last_submission_id)
+                )
+            )
+
+        session.commit()
+    except Exception:
+        # the count, the claimed verification code and the queued file deletion are undone together,
+        # and the session is usable for the caller's next query
+        session.rollback()
+        raise
+
+    if _live_verification_codes is not None:
+        _live_verification_codes.add(submission_record.verification_code)
+    _students_by_upload_code.put(
+        counted.upload_code,
+        StudentRecord(student_id, counted.upload_code, counted.submissions_count, submission_record),
+    )
+
+    # keep the student loaded in the session up to date without reloading it
+    student = session.identity_map.get(session.identity_key(Student, student_id))
+    if student is not None:
+        set_committed_value(student, "submissions_count", counted.submissions_count)
+        set_committed_value(student, "last_submission_id", new_submission_id)
+        set_committed_value(student, "last_submission", new_submission)
+
+    return new_submission
 
 
-def student_submission_uploads_available(session: Session, student_id: int):
-    """Retrieves the number of submission uploads available to the student.
+def queue_file_deletion(session: Session, file_name: str):
+    """Queues a file for removal from the storage.
 
     Args:
         session (Session): The database session.
-        student_id (int): The ID of the student.
+        file_name (str): The file name on the storage service.
+    """
+    session.add(FileDeletion(file_name=file_name))
+    session.commit()
+
+
+def queue_orphaned_files(session: Session, file_names: list):
+    """Queues the files of the storage which no submission refers to for removal.
+
+    The files queued already are skipped, so the files can be checked again until they are removed.
+
+    Args:
+        session (Session): The database session.
+        file_names (list): The names of the files on the storage service.
+
+    Returns:
+        list: The names of the queued files.
+    """
+    # the name differs from the columns of the tables, so the subqueries are correlated with it
+    listed = func.unnest(literal(file_names, ARRAY(FileDeletion.file_name.type))).column_valued("listed_file_name")
+    orphaned = select(listed).where(
+        ~exists().where(Submission.file_name == listed),
+        ~exists().where(FileDeletion.file_name == listed),
+    )
+    queued = session.execute(
+        insert(FileDeletion).from_select(["file_name"], orphaned).returning(FileDeletion.file_name)
+    ).scalars()
+    queued = list(queued)
+    session.commit()
+    return queued
+
+
+def is_file_submitted(session: Session, file_name: str):
+    """Checks if a submission with the file exists.
+
+    Args:
+        session (Session): The database session.
+        file_name (str): The file name on the storage service.
 
     Returns:
-        int: The number of submission uploads available.
+        bool: True if a submission with the file exists, False otherwise.
     """
-    submissions_count = session.query(Submission).filter(Submission.student_id == student_id).count()
-    return Settings.submissions_per_student_count_limit - submissions_count
+    return session.query(exists().where(Submission.file_name == file_name)).scalar()
 
 
-def previous_submission_file_name(session: Session, student_id: int):
-    """Retrieves the file name on the storage service of the second most recent submission made by the student.
+def submission_by_verification_code(session: Session, verification_code: str):
+    """Retrieves a submission from the database by its verification code.
 
     Args:
         session (Session): The database session.
-        student_id (int): The ID of the student.
+        verification_code (str): The verification code of the submission.
 
     Returns:
-        str: The file name on the storage service of the second most recent submission, or None if not found.
+        Submission: The submission with the specified verification code, or None if not found or expired.
     """
-    recent_submissions = (
+    # the codes missing in the filter are not queried
+    if _live_verification_codes is not None:
+        if verification_code not in _live_verification_codes:
+            _verification_codes_lookups["rejected"] += 1
+            return None
+        _verification_codes_lookups["passed"] += 1
+
+    submission = (
         session.query(Submission)
-        .filter(Submission.student_id == student_id)
-        .order_by(desc(Submission.id))
-        .limit(2)
-        .all()
+        .filter(Submission.verification_code == verification_code, Submission.expired_at.is_(None))
+        .first()
     )
-    second_submission = recent_submissions[1] if len(recent_submissions) > 1 else None
 
-    if not second_submission:
+    if submission is None and _live_verification_codes is not None:
+        _verification_codes_lookups["false_positives"] += 1
+    return submission
+
+
+def submission_file_name_by_verification_code(session: Session, verification_code: str):
+    """Retrieves the file name of a submission by its verification code, through the process cache.
+
+    Args:
+        session (Session): The database session.
+        verification_code (str): The verification code of the submission.
+
+    Returns:
+        str: The file name of the submission, or None if not found or expired.
+    """
+    file_name = _file_names_by_verification_code.get(verification_code)
+    if file_name is not TTLCache.MISSING:
+        return file_name
+
+    submission = submission_by_verification_code(session, verification_code)
+    if submission is None:
         return None
 
-    return second_submission.file_name
+    file_name = submission.file_name
+    _file_names_by_verification_code.put(verification_code, file_name)
+    return file_name
 
 
-def add_submission(session: Session, **attrs: dict):
-    """Adds a new submission to the database.
+def build_verification_codes_filter(session: Session):
+    """Builds the filter of the verification codes of the submissions which are not expired.
+
+    The codes are streamed from a server-side cursor into a new filter, which replaces the current one,
+    so the codes of the expired submissions are pruned. The codes of the submissions added meanwhile
+    are added with refresh_verification_codes_filter() afterwards.
 
     Args:
         session (Session): The database session.
-        **attrs (dict): Submission attributes.
+    """
+    global _live_verification_codes, _verification_codes_refreshed_at
+
+    live_verification_codes = BloomFilter(
+        Settings.verification_codes_filter_capacity, Settings.verification_codes_filter_false_positive_rate
+    )
+    built_at = session.execute(select(func.now())).scalar()
+    codes = session.execute(
+        select(Submission.verification_code)
+        .where(Submission.expired_at.is_(None))
+        .execution_options(yield_per=Settings.verification_codes_filter_batch_size)
+    ).scalars()
+    for code in codes:
+        live_verification_codes.add(code)
+    session.commit()
+
+    _live_verification_codes = live_verification_codes
+    _verification_codes_refreshed_at = built_at
+    refresh_verification_codes_filter(session)
+
+
+def refresh_verification_codes_filter(session: Session):
+    """Adds the verification codes of the submissions created since the last refresh to the filter.
+
+    The submissions added by other processes become available for verification this way.
+    The codes are read from the time of the last successful refresh, so the codes created while
+    the refreshes failed are not missed, and the filter never rejects a live code.
+
+    Args:
+        session (Session): The database session.
+    """
+    global _verification_codes_refreshed_at
+
+    if _live_verification_codes is None:
+        return
+
+    refreshed_at = session.execute(select(func.now())).scalar()
+    created_after = (_verification_codes_refreshed_at or refreshed_at) - timedelta(
+        seconds=Settings.verification_codes_filter_window_seconds
+    )
+    codes = session.execute(
+        select(Submission.verification_code).where(
+            Submission.expired_at.is_(None), Submission.created_at > created_after
+        )
+    ).scalars()
+    for code in codes:
+        _live_verification_codes.add(code)
+    session.commit()
+
+    _verification_codes_refreshed_at = refreshed_at
+
+
+def verification_codes_filter_stats():
+    """Returns the size and the false positive rates of the verification codes filter, and the lookups counters.
 
     Returns:
-        Submission: The newly created submission.
+        dict: The filter stats with the numbers of rejected, passed and false positive lookups,
+              or None if the filter is not built yet.
     """
-    new_submission = Submission(**attrs)
-    session.add(new_submission)
+    if _live_verification_codes is None:
+        return None
+    return {**_live_verification_codes.stats(), **_verification_codes_lookups}
+
+
+def expired_submissions(session: Session, after: tuple | None, limit: int):
+    """Retrieves a batch of submissions older than the submission expiration time which are not marked as expired.
+
+    The batches are paginated with the (created_at, id) key of the last submission of the previous batch.
+
+    Args:
+        session (Session): The database session.
+        after (tuple | None): The (created_at, id) key to start after, or None to start from the oldest submission.
+        limit (int): The maximum number of submissions to retrieve.
+
+    Returns:
+        list: A list of rows with the id, file_name, and created_at of the submissions.
+    """
+    query = session.query(Submission.id, Submission.file_name, Submission.created_at).filter(
+        Submission.expired_at.is_(None),
+        Submission.created_at < func.now() - timedelta(seconds=Settings.submission_expire_seconds),
+    )
+    if after:
+        query = query.filter(tuple_(Submission.created_at, Submission.id) > tuple_(*after))
+
+    rows = query.order_by(Submission.created_at, Submission.id).limit(limit).all()
     session.commit()
-    return new_submission
+    return rows
 
 
-def submission_by_verification_code(session: Session, verification_code: str):
-    """Retrieves a submission from the database by its verification code.
+def mark_submissions_expired(session: Session, submission_ids: list):
+    """Marks the submissions as expired.
 
     Args:
         session (Session): The database session.
-        verification_code (str): The verification code of the submission.
+        submission_ids (list): The IDs of the submissions.
+    """
+    verification_codes = session.execute(
+        update(Submission)
+        .where(Submission.id.in_(submission_ids))
+        .values(expired_at=func.now())
+        .returning(Submission.verification_code)
+    ).scalars()
+    for verification_code in verification_codes:
+        _file_names_by_verification_code.invalidate(verification_code)
+    session.commit()
+
+
+def claim_file_deletions(session: Session, limit: int):
+    """Retrieves files due for removal from the storage and locks them until the end of the transaction.
+
+    Records locked by another transaction are skipped, so several workers can remove files concurrently.
+
+    Args:
+        session (Session): The database session.
+        limit (int): The maximum number of files to retrieve.
 
     Returns:
-        Submission: The submission with the specified verification code, or None if not found.
+        list: A list of FileDeletion objects.
     """
-    submission = session.query(Submission).filter(Submission.verification_code == verification_code).first()
-    return submission
+    return (
+        session.query(FileDeletion)
+        .filter(FileDeletion.next_attempt_at <= func.now())
+        .order_by(FileDeletion.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+        .all()
+    )
+
+
+def settle_file_deletions(session: Session, file_deletions: list, errors: dict):
+    """Removes the records of deleted files and postpones the next attempt for the files that failed to be removed.
+
+    The next attempt is postponed exponentially by the number of failed attempts.
+
+    Args:
+        session (Session): The database session.
+        file_deletions (list): The FileDeletion objects claimed for removal.
+        errors (dict): The error details by the names of the files that failed to be removed.
+    """
+    for file_deletion in file_deletions:
+        error = errors.get(file_deletion.file_name)
+        if error is None:
+            session.delete(file_deletion)
+            continue
+
+        backoff_seconds = min(
+            Settings.file_deletions_retry_backoff_seconds * 2**file_deletion.attempts,
+            Settings.file_deletions_retry_backoff_max_seconds,
+        )
+        file_deletion.attempts += 1
+        file_deletion.next_attempt_at = func.now() + timedelta(seconds=backoff_seconds)
+        file_deletion.last_error = error
 
+    session.commit()
+
+
+def _claim_codes(session: Session, kind: str, count: int):
+    # Pooled codes locked by concurrent transactions are skipped, and the claimed ones return
+    # to the pool if the transaction is rolled back. The missing codes are generated when the pool runs out,
+    # and checked against the used and the pooled ones as the pool is refilled.
+    claimed = (
+        select(PooledCode.id)
+        .where(PooledCode.kind == kind)
+        .order_by(PooledCode.id)
+        .limit(count)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+    codes = session.execute(delete(PooledCode).where(PooledCode.id.in_(claimed)).returning(PooledCode.code)).scalars()
+
+    codes = list(codes)
+    while len(codes) < count:
+        candidate, unused = _code_candidates(kind, count - len(codes))
+        generated = session.execute(
+            select(candidate).where(unused, ~exists().where(PooledCode.kind == kind, PooledCode.code == candidate))
+        ).scalars()
+        codes = list(dict.fromkeys([*codes, *generated]))
+
+    return codes
+
+
+def _code_candidates(kind: str, count: int):
+    # The generated codes are sent as an array and unnested to a column, which is anti-joined
+    # with the column the codes are unique in, so the used ones are skipped in one round trip.
+    generate, column = _POOLED_CODE_KINDS[kind]
+    candidates = func.unnest(literal([generate() for _ in range(count)], ARRAY(PooledCode.code.type)))
+    candidate = candidates.column_valued("candidate_code")
+    return candidate, ~exists().where(column == candidate)
 
-def last_errors(session: Session, count: int):
-    """Retrieves the last N errors from the database.
+
+def refill_code_pool(session: Session, kind: str, batch_size: int):
+    """Adds a batch of generated codes of the kind to the pool unless the pool is full.
+
+    The codes that are used already or pooled already are skipped, so the pool holds only unique unused codes.
+
+    Args:
+        session (Session): The database session.
+        kind (str): The kind of the codes, upload_code or verification_code.
+        batch_size (int): The number of codes to generate.
+
+    Returns:
+        bool: True if the pool is still not full, False otherwise.
+    """
+    pooled_count = session.query(func.count()).filter(PooledCode.kind == kind).scalar()
+    if pooled_count >= Settings.code_pool_size:
+        session.commit()
+        return False
+
+    candidate, unused = _code_candidates(kind, batch_size)
+    added_count = session.execute(
+        pg_insert(PooledCode)
+        .from_select(["kind", "code"], select(literal(kind), candidate).where(unused))
+        .on_conflict_do_nothing()
+    ).rowcount
+    session.commit()
+
+    return pooled_count + added_count < Settings.code_pool_size
+
+
+def last_errors(session: Session, count: int, before: int = None):
+    """Retrieves the last N errors from the database, newest first.
 
     Args:
         session (Session): The database session.
         count (int): The number of errors to retrieve.
+        before (int | None): The ID of the last error of the previous page, the newer errors are skipped.
 
     Returns:
         list: A list of Error objects representing the last N errors.
     """
-    return session.query(Error).order_by(desc(Error.created_at)).limit(count).all()
+    query = session.query(Error)
+    if before is not None:
+        query = query.filter(Error.id < before)
+    return query.order_by(desc(Error.id)).limit(count).all()
 
 
-def add_error(session: Session, detail: str):
-    """Adds a new error to the database.
+def report_error(detail: str):
+    """Buffers an error in the process to be persisted by flush_errors() without a database round trip.
 
     Args:
-        session (Session): The database session.
         detail (str): The error detail.
+    """
+    _errors.add(detail)
+
+
+def flush_errors(session: Session):
+    """Persists the buffered errors with a multi-row insert, one row per distinct detail with its occurrences.
+
+    The errors are put back to the buffer if the insert fails.
+
+    Args:
+        session (Session): The database session.
 
     Returns:
-        Error: The newly created error.
+        int: The number of inserted rows.
     """
-    new_error = Error(detail=detail)
-    session.add(new_error)
+    counts, dropped = _errors.drain()
+    if dropped:
+        counts[f"{dropped} errors dropped, the errors buffer is full"] = 1
+    if not counts:
+        return 0
+
+    try:
+        session.execute(
+            insert(Error),
+            [{"detail": detail, "occurrences": occurrences} for detail, occurrences in counts.items()],
+        )
+        session.commit()
+    except Exception:
+        session.rollback()
+        for detail, occurrences in counts.items():
+            _errors.add(detail, occurrences)
+        raise
+
+    return len(counts)
+
+
+def remove_old_errors(session: Session, created_before: timedelta, limit: int):
+    """Removes a batch of errors older than the retention period.
+
+    Args:
+        session (Session): The database session.
+        created_before (timedelta): The retention period.
+        limit (int): The maximum number of errors to remove.
+
+    Returns:
+        int: The number of removed errors.
+    """
+    old_ids = (
+        select(Error.id).where(Error.created_at < func.now() - created_before).order_by(Error.created_at).limit(limit)
+    )
+    # the IDs are collected into an array first, so the rows are removed by the primary key
+    # instead of a join of the batch with the whole table
+    removed_count = session.execute(
+        delete(Error).where(Error.id == any_(func.array(old_ids.scalar_subquery())))
+    ).rowcount
+    session.commit()
+    return removed_count
+
+
+def take_rate_limit_token(session: Session, key: str, capacity: float, refill_per_second: float):
+    """Takes a token from the rate limit bucket of the key shared by the processes serving the API.
+
+    The bucket is refilled and the token is taken atomically by an upsert, the conflicting requests
+    of other processes wait for the row lock. The time is read from the database clock,
+    so the clocks of the machines don't need to agree.
+
+    Args:
+        session (Session): The database session.
+        key (str): The key of the bucket, f.e. the route and the client IP.
+        capacity (float): The maximum number of tokens, the burst allowed after a pause.
+        refill_per_second (float): The number of tokens added per second, the sustained rate.
+
+    Returns:
+        float: 0 if the token is taken, otherwise the time until the next token.
+    """
+    elapsed_seconds = func.extract("epoch", func.clock_timestamp() - RateLimitBucket.updated_at)
+    tokens = func.least(capacity, RateLimitBucket.tokens + elapsed_seconds * refill_per_second)
+
+    # the row is left as is when there is no token, so the statement returns nothing
+    taken = session.execute(
+        pg_insert(RateLimitBucket)
+        .values(key=key, tokens=capacity - 1, created_at=func.clock_timestamp(), updated_at=func.clock_timestamp())
+        .on_conflict_do_update(
+            index_elements=[RateLimitBucket.key],
+            set_={"tokens": tokens - 1, "updated_at": func.clock_timestamp()},
+            where=tokens >= 1,
+        )
+        .returning(RateLimitBucket.tokens)
+    ).first()
+
+    retry_after_seconds = 0
+    if taken is None:
+        tokens_left = session.execute(select(tokens).where(RateLimitBucket.key == key)).scalar()
+        # a token refilled, or the bucket removed, meanwhile lets the request through as if it came a moment later
+        if tokens_left is not None:
+            retry_after_seconds = max(0, 1 - tokens_left) / refill_per_second
+    session.commit()
+
+    return retry_after_seconds
+
+
+def remove_idle_rate_limit_buckets(session: Session, idle_for: timedelta, limit: int):
+    """Removes a batch of rate limit buckets not used for a while.
+
+    A bucket idle longer than it takes to refill is full, the same as a missing one.
+
+    Args:
+        session (Session): The database session.
+        idle_for (timedelta): The time since the last use of the bucket.
+        limit (int): The maximum number of buckets to remove.
+
+    Returns:
+        int: The number of removed buckets.
+    """
+    idle_keys = (
+        select(RateLimitBucket.key)
+        .where(RateLimitBucket.updated_at < func.now() - idle_for)
+        .order_by(RateLimitBucket.updated_at)
+        .limit(limit)
+    )
+    removed_count = session.execute(
+        delete(RateLimitBucket).where(RateLimitBucket.key == any_(func.array(idle_keys.scalar_subquery())))
+    ).rowcount
     session.commit()
-    return new_error
+    return removed_count
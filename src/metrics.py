@@ -0,0 +1,211 @@
+"""An in-process registry of metrics rendered in the Prometheus text format.
+
+The metrics are updated from the event loop thread only, the repository functions and the S3 calls
+are timed by the coroutines awaiting them, so the registry needs no locks. A sample is a dictionary
+lookup and an addition.
+"""
+
+from bisect import bisect_left
+import functools
+import time
+
+# seconds, from a cached lookup to a slow S3 call
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# bytes, up to the maximum submission size
+SIZE_BUCKETS = (1024, 10 * 1024, 100 * 1024, 512 * 1024, 1024 * 1024, 2 * 1024 * 1024, 3 * 1024 * 1024)
+
+
+def _labels_text(labelnames, labelvalues, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, labelvalues)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number_text(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    type = None
+
+    def __init__(self, name: str, description: str, labelnames=()):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+
+    def clear(self):
+        self._values.clear()
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.type}"]
+        for labelvalues, value in self._values.items():
+            lines.append(f"{self.name}{_labels_text(self.labelnames, labelvalues)} {_number_text(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    """A number of events, increasing only."""
+
+    type = "counter"
+
+    def inc(self, *labelvalues, amount=1):
+        self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def value(self, *labelvalues):
+        return self._values.get(labelvalues, 0)
+
+
+class Gauge(_Metric):
+    """A current value, f.e. the number of requests in flight."""
+
+    type = "gauge"
+
+    def inc(self, *labelvalues, amount=1):
+        self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def dec(self, *labelvalues, amount=1):
+        self._values[labelvalues] = self._values.get(labelvalues, 0) - amount
+
+    def set(self, *labelvalues, value):
+        self._values[labelvalues] = value
+
+    def value(self, *labelvalues):
+        return self._values.get(labelvalues, 0)
+
+
+class GaugeFunction(_Metric):
+    """Gauges read from a function on rendering, f.e. the connection pool occupancy.
+
+    The function returns a dictionary of the values by the tuples of the label values.
+    """
+
+    type = "gauge"
+
+    def __init__(self, name: str, description: str, labelnames: tuple, function):
+        super().__init__(name, description, labelnames)
+        self._function = function
+
+    def render(self):
+        self._values = self._function() or {}
+        return super().render()
+
+
+class Histogram(_Metric):
+    """A distribution of observed values by buckets, with their sum and count."""
+
+    type = "histogram"
+
+    def __init__(self, name: str, description: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, description, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, *labelvalues, value):
+        series = self._values.get(labelvalues)
+        if series is None:
+            # the counts of the buckets, the last one is +Inf, then the sum
+            series = self._values[labelvalues] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def count(self, *labelvalues):
+        series = self._values.get(labelvalues)
+        return sum(series[:-1]) if series else 0
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.type}"]
+        for labelvalues, series in self._values.items():
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), series[:-1]):
+                cumulative += count
+                labels = _labels_text(self.labelnames, labelvalues, f'le="{_number_text(bound)}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _labels_text(self.labelnames, labelvalues)
+            lines.append(f"{self.name}_sum{labels} {_number_text(series[-1])}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    """Holds the metrics and renders them in the Prometheus text exposition format."""
+
+    def __init__(self):
+        self._metrics = {}
+
+    def _register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, description: str, labelnames=()):
+        return self._register(Counter(name, description, labelnames))
+
+    def gauge(self, name: str, description: str, labelnames=()):
+        return self._register(Gauge(name, description, labelnames))
+
+    def gauge_function(self, name: str, description: str, labelnames: tuple, function):
+        return self._register(GaugeFunction(name, description, labelnames, function))
+
+    def histogram(self, name: str, description: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(name, description, labelnames, buckets))
+
+    def clear(self):
+        """Resets the values of all the metrics."""
+        for metric in self._metrics.values():
+            metric.clear()
+
+    def render(self):
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_requests = registry.counter(
+    "http_requests_total", "Number of handled HTTP requests.", ("method", "route", "status")
+)
+http_request_duration = registry.histogram(
+    "http_request_duration_seconds",
+    "Time until the response starts, by route and status.",
+    ("method", "route", "status"),
+)
+http_requests_in_flight = registry.gauge(
+    "http_requests_in_flight", "Number of HTTP requests being handled.", ("method", "route")
+)
+db_operation_duration = registry.histogram(
+    "db_operation_duration_seconds", "Duration of the repository functions.", ("function",)
+)
+s3_operation_duration = registry.histogram(
+    "s3_operation_duration_seconds", "Duration of the S3 storage methods.", ("method",)
+)
+http_requests_rate_limited = registry.counter(
+    "http_requests_rate_limited_total", "Number of requests rejected by the rate limits.", ("method", "route", "key")
+)
+submission_size = registry.histogram("submission_size_bytes", "Size of the submitted files.", buckets=SIZE_BUCKETS)
+
+
+def timed(histogram: Histogram, *labelvalues):
+    """Decorates a coroutine function to observe its duration in the histogram, including failed calls."""
+
+    def _decorator(fn):
+        @functools.wraps(fn)
+        async def _timed(*args, **kwargs):
+            started_at = time.perf_counter()
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                histogram.observe(*labelvalues, value=time.perf_counter() - started_at)
+
+        return _timed
+
+    return _decorator
@@ -14,23 +14,106 @@ class Settings:
     # Loaded from environment variables
 
     auth_token: str = os.environ["AUTH_TOKEN"]
+    aws_s3_breaker_failure_threshold: int = int(os.getenv("AWS_S3_BREAKER_FAILURE_THRESHOLD", 5))
+    aws_s3_breaker_reset_timeout_seconds: float = float(os.getenv("AWS_S3_BREAKER_RESET_TIMEOUT_SECONDS", 30))
     aws_s3_bucket_name: str = os.environ["AWS_S3_BUCKET_NAME"]
+    aws_s3_call_deadline_seconds: float = float(os.getenv("AWS_S3_CALL_DEADLINE_SECONDS", 30))
     aws_s3_endpoint_url: str = os.environ["AWS_S3_ENDPOINT_URL"]
+    aws_s3_max_pool_connections: int = int(os.getenv("AWS_S3_MAX_POOL_CONNECTIONS", 10))
+    aws_s3_connect_timeout_seconds: float = float(os.getenv("AWS_S3_CONNECT_TIMEOUT_SECONDS", 5))
+    aws_s3_read_timeout_seconds: float = float(os.getenv("AWS_S3_READ_TIMEOUT_SECONDS", 20))
+    aws_s3_tcp_keepalive: bool = os.getenv("AWS_S3_TCP_KEEPALIVE", "true") == "true"
+    aws_s3_warm_up_connections: int = int(os.getenv("AWS_S3_WARM_UP_CONNECTIONS", 2))
     database_url: str = os.environ["DATABASE_URL"]
+    database_pgbouncer: bool = os.getenv("DATABASE_PGBOUNCER", "false") == "true"
+    database_pool_max_overflow: int = int(os.getenv("DATABASE_POOL_MAX_OVERFLOW", 10))
+    database_pool_pre_ping: bool = os.getenv("DATABASE_POOL_PRE_PING", "true") == "true"
+    database_pool_recycle_seconds: int = int(os.getenv("DATABASE_POOL_RECYCLE_SECONDS", 30 * 60))
+    database_pool_size: int = int(os.getenv("DATABASE_POOL_SIZE", 5))
+    database_pool_timeout_seconds: float = float(os.getenv("DATABASE_POOL_TIMEOUT_SECONDS", 30))
     port: int = int(os.getenv("PORT", 8000))
+    profiles_dir: str = os.getenv("PROFILES_DIR", "/tmp/profiles")
+    profiling_enabled: bool = os.getenv("PROFILING_ENABLED", "false") == "true"
+    rate_limit_backend: str = os.getenv("RATE_LIMIT_BACKEND", "memory")  # memory, postgres or off
+    # the header with the client IP set by the proxy, f.e. Fly-Client-IP, the peer address is used if empty
+    rate_limit_client_ip_header: str = os.getenv("RATE_LIMIT_CLIENT_IP_HEADER", "")
+    # the clients behind one NAT, f.e. an exam hall, share the limits by IP
+    rate_limit_submissions_per_ip_burst: int = int(os.getenv("RATE_LIMIT_SUBMISSIONS_PER_IP_BURST", 120))
+    rate_limit_submissions_per_ip_per_minute: float = float(os.getenv("RATE_LIMIT_SUBMISSIONS_PER_IP_PER_MINUTE", 120))
+    rate_limit_verifications_per_ip_burst: int = int(os.getenv("RATE_LIMIT_VERIFICATIONS_PER_IP_BURST", 60))
+    rate_limit_verifications_per_ip_per_minute: float = float(
+        os.getenv("RATE_LIMIT_VERIFICATIONS_PER_IP_PER_MINUTE", 60)
+    )
+    verification_codes_filter_capacity: int = int(os.getenv("VERIFICATION_CODES_FILTER_CAPACITY", 100000))
+    verification_codes_filter_false_positive_rate: float = float(
+        os.getenv("VERIFICATION_CODES_FILTER_FALSE_POSITIVE_RATE", 0.001)
+    )
 
     # Hardcoded
 
+    aws_s3_max_attempts: int = 3
+    aws_s3_retry_backoff_seconds: float = 0.2  # doubled on each attempt, with a random jitter
+    aws_s3_retry_budget_max_tokens: float = 10
+    aws_s3_retry_budget_ratio: float = 0.1  # retries per call across the process
     aws_s3_signature_version: str = "s3v4"
+    code_pool_batch_size: int = 1000
+    code_pool_interval_seconds: int = 60
+    code_pool_size: int = 10000  # per kind of codes
     download_url_expires_seconds: int = 10 * 60  # 10 min
+    download_url_min_expires_seconds: int = 2 * 60  # cached URLs expiring sooner are signed again
+    download_urls_cache_max_size: int = 10000
+    errors_buffer_max_size: int = 1000  # distinct error details per flush interval
+    errors_flush_interval_seconds: int = 5
+    errors_page_default_limit: int = 100
+    errors_page_max_limit: int = 1000
+    errors_retention_batch_size: int = 1000
+    errors_retention_seconds: int = 30 * 24 * 60 * 60  # 30 days
+    file_deletions_batch_size: int = 1000  # maximum number of keys in one S3 DeleteObjects request
+    file_deletions_interval_seconds: int = 5
+    file_deletions_retry_backoff_seconds: int = 10
+    file_deletions_retry_backoff_max_seconds: int = 60 * 60  # 1 hour
     first_name_max_length: int = 254
     last_name_max_length: int = 254
     nickname_max_length: int = 12
+    orphaned_files_batch_size: int = 1000  # maximum number of keys in one S3 ListObjectsV2 response
+    orphaned_files_interval_seconds: int = 60 * 60  # 1 hour
+    orphaned_files_min_age_seconds: int = 24 * 60 * 60  # 1 day, the uploads are completed well before
+    profiler_interval_seconds: float = 0.005
+    profiles_max_count: int = 100
+    rate_limit_buckets_cleanup_batch_size: int = 1000
+    rate_limit_buckets_cleanup_interval_seconds: int = 60
+    # added to the time the slowest bucket takes to refill, after which the idle buckets are removed
+    rate_limit_buckets_idle_margin_seconds: int = 60
+    rate_limit_buckets_max_size: int = 100000  # in the process, the least recently used are dropped
+    rate_limit_submission_status_per_upload_code_burst: int = 30
+    rate_limit_submission_status_per_upload_code_per_minute: float = 30  # a refresh every 2 seconds
+    rate_limit_submissions_per_upload_code_burst: int = 10
+    rate_limit_submissions_per_upload_code_per_minute: float = 6
+    repeated_query_threshold: int = 10  # runs of one statement per request reported as N+1 loading
+    slow_query_seconds: float = 0.5
+    students_bulk_insert_batch_size: int = 1000
+    students_bulk_max_count: int = 10000
+    students_cache_max_size: int = 10000
+    students_cache_not_found_ttl_seconds: int = 2
+    students_cache_ttl_seconds: int = 10
+    students_export_batch_size: int = 1000
+    students_page_default_limit: int = 100
+    students_page_max_limit: int = 1000
     submission_expire_seconds: int = 3 * 24 * 60 * 60  # 3 days
     submission_max_size_bytes: int = 3 * 1024 * 1024  # 3 MB
+    submissions_expiry_batch_size: int = 500
+    submissions_expiry_interval_seconds: int = 10 * 60  # 10 min
     submissions_per_student_count_limit: int = 5
     upload_code_length: int = 8
+    upload_url_expires_seconds: int = 10 * 60  # 10 min
     verification_code_length: int = 9
+    verification_codes_cache_max_size: int = 10000
+    verification_codes_cache_ttl_seconds: int = 60
+    verification_codes_filter_batch_size: int = 10000
+    verification_codes_filter_rebuild_interval_seconds: int = 10 * 60  # 10 min, as the submissions expiry
+    verification_codes_filter_refresh_interval_seconds: int = 5
+    # the submissions created before a refresh and committed after it are added by the next one
+    verification_codes_filter_window_seconds: int = 60
 
     # From pyproject.toml
 
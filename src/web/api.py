@@ -1,54 +1,255 @@
-from fastapi import Depends, FastAPI, HTTPException, Request, Response, status, UploadFile
-from fastapi.responses import PlainTextResponse
+from collections import Counter
+from contextlib import asynccontextmanager
+import csv
+import io
+import math
+import time
+from typing import Literal, Optional
+
+from fastapi import Depends, FastAPI, HTTPException, Query, Request, Response, status, UploadFile
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from pydantic import ValidationError
+from starlette.routing import Match
 
+from src.database.query_stats import tracked_queries
 from src.database.repository import (
-    add_error,
     add_submission,
     add_student,
-    is_student_submission_uploads_limit_reached,
-    previous_submission_file_name,
-    SessionLocal,
-    submission_by_verification_code,
+    add_students,
+    AsyncSessionLocal,
+    end_transaction,
+    flush_errors,
+    is_file_submitted,
+    last_errors,
+    pool_status,
+    queue_file_deletion,
+    report_error,
+    run,
+    submission_file_name_by_verification_code,
     student_by_nickname,
     student_by_upload_code,
     student_list_summary,
-    student_submission_uploads_available,
+    student_summaries_stream,
+    students_cache_stats,
+    SubmissionFileExistsError,
+    SubmissionsCountLimitError,
+    take_rate_limit_token,
+    verification_codes_filter_stats,
 )
 from src.logger import logger
+from src.metrics import (
+    http_request_duration,
+    http_requests,
+    http_requests_in_flight,
+    http_requests_rate_limited,
+    registry,
+    submission_size,
+)
 from src.settings import Settings
+from src.web.schemas.errors_list import ErrorsList
 from src.web.schemas.upload_completion import UploadCompletion
+from src.web.schemas.upload_form import UploadedFile, UploadForm
 from src.web.schemas.student import Student, StudentCreate
+from src.web.schemas.students_enrollment import StudentsEnrollment
 from src.web.schemas.students_submissions_list import StudentsSubmissionsList
-from src.web.storage.s3 import s3_shared_instance
-
-app = FastAPI(title=Settings.app_name, description=Settings.app_description, version=Settings.app_version)
+from src.web.profiler import ProfilingMiddleware
+from src.web.rate_limiter import token_buckets
+from src.web.storage.circuit_breaker import CircuitOpenError
+from src.web.storage.measured_stream import UploadSizeError
+from src.web.storage.s3 import new_file_name, s3_shared_instance
+from src.workers.code_pool import code_pool_job
+from src.workers.errors import errors_job
+from src.workers.file_deletions import file_deletions_job
+from src.workers.orphaned_files import orphaned_files_job
+from src.workers.rate_limits import rate_limit_buckets_job
+from src.workers.scheduler import start_periodic_job, stop_jobs
+from src.workers.submissions_expiry import submissions_expiry_job
+from src.workers.verification_codes import verification_codes_filter_job
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    jobs = [
+        start_periodic_job("code_pool", code_pool_job(), Settings.code_pool_interval_seconds),
+        start_periodic_job("errors", errors_job(), Settings.errors_flush_interval_seconds),
+        start_periodic_job(
+            "verification_codes_filter",
+            verification_codes_filter_job(),
+            Settings.verification_codes_filter_refresh_interval_seconds,
+        ),
+    ]
+
+    if Settings.rate_limit_backend == "postgres":
+        jobs.append(
+            start_periodic_job(
+                "rate_limit_buckets", rate_limit_buckets_job(), Settings.rate_limit_buckets_cleanup_interval_seconds
+            )
+        )
+
+    if s3_shared_instance:
+        await s3_shared_instance.warm_up()
+        jobs.append(
+            start_periodic_job(
+                "file_deletions", file_deletions_job(s3_shared_instance), Settings.file_deletions_interval_seconds
+            )
+        )
+        jobs.append(
+            start_periodic_job(
+                "orphaned_files", orphaned_files_job(s3_shared_instance), Settings.orphaned_files_interval_seconds
+            )
+        )
+        jobs.append(
+            start_periodic_job(
+                "submissions_expiry",
+                submissions_expiry_job(s3_shared_instance),
+                Settings.submissions_expiry_interval_seconds,
+            )
+        )
+
+    yield
+
+    await stop_jobs(jobs)
+
+    # the errors buffered since the last flush are not lost on shutdown
+    async with AsyncSessionLocal() as session:
+        await run(session, flush_errors)
+
+    if s3_shared_instance:
+        s3_shared_instance.close()
+
+
+app = FastAPI(
+    title=Settings.app_name, description=Settings.app_description, version=Settings.app_version, lifespan=lifespan
+)
 
 
 @app.middleware("http")
-async def db_session_middleware(request: Request, call_next):
+async def internal_error_middleware(request: Request, call_next):
     # in case of exception during the request,
-    # this middleware will close the database session
-    # to avoid leaving dangling connections
-    # and then return a 500 response.
-    # It returns response instead to raising an HTTPException to
-    # make server continue to work without restart.
-    with SessionLocal() as session:
-        response = Response("Internal server error", status_code=500)
-        request.state.db = session
-        try:
-            response = await call_next(request)
-        except Exception as e:
-            logger.error(str(e))
-        finally:
-            return response
+    # this middleware returns a 500 response instead of raising an HTTPException
+    # to make server continue to work without restart.
+    response = Response("Internal server error", status_code=500)
+    try:
+        response = await call_next(request)
+    except Exception as e:
+        logger.error(str(e))
+    finally:
+        return response
+
+
+@app.middleware("http")
+async def query_stats_middleware(request: Request, call_next):
+    # The queries run until the response starts are reported in the Server-Timing header,
+    # the statements repeated many times within one request are logged as N+1 loading.
+    with tracked_queries() as stats:
+        response = await call_next(request)
+
+    response.headers.append("Server-Timing", f'db;dur={stats.seconds * 1000:.3f};desc="{stats.count} queries"')
+    for statement, count in stats.repeated_statements(Settings.repeated_query_threshold).items():
+        logger.warning(f"Repeated query ran {count} times in {request.method} {request.url.path}: {statement}")
+    return response
+
+
+def _route_path(scope):
+    # the path template of the matching route keeps the number of label values bounded
+    for route in app.router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+    return "unmatched"
+
+
+@app.middleware("http")
+async def metrics_middleware(request: Request, call_next):
+    method = request.method
+    route = _route_path(request.scope)
+    started_at = time.perf_counter()
+    http_requests_in_flight.inc(method, route)
+    status_code = "500"
+    try:
+        response = await call_next(request)
+        status_code = str(response.status_code)
+        return response
+    finally:
+        http_requests_in_flight.dec(method, route)
+        http_requests.inc(method, route, status_code)
+        http_request_duration.observe(method, route, status_code, value=time.perf_counter() - started_at)
+
+
+# The outermost middleware, so the profiles include the other ones
+if Settings.profiling_enabled:
+    app.add_middleware(ProfilingMiddleware)
+
+
+# Metrics read on rendering
+
+registry.gauge_function(
+    "db_pool_connections",
+    "Connections of the pool serving the web requests by state.",
+    ("state",),
+    lambda: {
+        (state,): value
+        for state, value in pool_status().items()
+        if state in ["size", "checked_out", "checked_in", "overflow"]
+    },
+)
+registry.gauge_function(
+    "db_pool_checkout_wait_seconds",
+    "Time of the connection checkouts from the pool serving the web requests.",
+    ("stat",),
+    lambda: {(stat,): pool_status()[f"wait_seconds_{stat}"] for stat in ["total", "avg", "max"]},
+)
+registry.gauge_function(
+    "db_pool_checkouts",
+    "Number of the connection checkouts from the pool serving the web requests.",
+    (),
+    lambda: {(): pool_status()["waits"]},
+)
+registry.gauge_function(
+    "s3_circuit_breaker_retry_after_seconds",
+    "Time until the storage is probed again while the circuit breaker is open, 0 otherwise.",
+    (),
+    lambda: {(): s3_shared_instance.retry_after_seconds()} if s3_shared_instance else {},
+)
+registry.gauge_function(
+    "students_cache",
+    "Entries, hits and misses of the cache of students by upload code.",
+    ("stat",),
+    lambda: {(stat,): value for stat, value in students_cache_stats().items() if stat != "hit_rate"},
+)
+registry.gauge_function(
+    "verification_codes_filter",
+    "Size in bytes, estimated number of codes and estimated false positive rate of the verification codes filter.",
+    ("stat",),
+    lambda: {
+        (stat,): value
+        for stat, value in (verification_codes_filter_stats() or {}).items()
+        if stat in ["size_bytes", "estimated_count", "estimated_false_positive_rate"]
+    },
+)
+registry.gauge_function(
+    "verification_codes_filter_lookups",
+    "Lookups of verification codes by the result of the filter.",
+    ("result",),
+    lambda: {
+        (result,): value
+        for result, value in (verification_codes_filter_stats() or {}).items()
+        if result in ["rejected", "passed", "false_positives"]
+    },
+)
 
 
 # Dependencies
 
 
-def get_db(request: Request):
-    return request.state.db
+async def get_db():
+    # The session is created only for routes that depend on it.
+    # It checks out a connection from the pool on the first query
+    # and returns it on commit, rollback, or close at the end of the request
+    # to avoid leaving dangling connections.
+    async with AsyncSessionLocal() as session:
+        yield session
 
 
 def get_s3():
@@ -60,6 +261,74 @@ def verify_token(credentials: HTTPAuthorizationCredentials = Depends(HTTPBearer(
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid authorization header")
 
 
+def _client_ip(request: Request):
+    # behind a proxy the peer is the proxy, the client IP is in the header the proxy sets
+    if Settings.rate_limit_client_ip_header:
+        client_ip = request.headers.get(Settings.rate_limit_client_ip_header)
+        if client_ip:
+            return client_ip
+    return request.client.host if request.client else "unknown"
+
+
+def rate_limited(*limits: tuple):
+    """Returns a dependency rejecting the requests over the rate limits of the route with 429 Too Many Requests.
+
+    Each limit is a token bucket per method, route and key. The buckets are kept in the process, or shared
+    in the database with the postgres backend when the API is served by several machines.
+
+    Args:
+        *limits (tuple): The (key, burst, per_minute) tuples, where the key is "ip" to limit by the client IP,
+            or the name of the path parameter to limit by, f.e. "upload_code". The keys are checked in order.
+    """
+
+    async def _rate_limited(request: Request, session=Depends(get_db)):
+        if Settings.rate_limit_backend == "off":
+            return
+
+        method = request.method
+        route = request.scope["route"].path
+        for key, burst, per_minute in limits:
+            value = _client_ip(request) if key == "ip" else request.path_params[key]
+            bucket_key = f"{method} {route} {key}={value}"
+            if Settings.rate_limit_backend == "postgres":
+                retry_after_seconds = await run(session, take_rate_limit_token, bucket_key, burst, per_minute / 60)
+            else:
+                retry_after_seconds = token_buckets.take(bucket_key, burst, per_minute / 60)
+
+            if retry_after_seconds > 0:
+                http_requests_rate_limited.inc(method, route, key)
+                raise HTTPException(
+                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                    detail="Too Many Requests",
+                    headers={"Retry-After": str(math.ceil(retry_after_seconds))},
+                )
+
+    return _rate_limited
+
+
+# the client IP is limited first, so requests with made up upload codes don't add buckets past its limit
+submissions_rate_limit = rate_limited(
+    ("ip", Settings.rate_limit_submissions_per_ip_burst, Settings.rate_limit_submissions_per_ip_per_minute),
+    (
+        "upload_code",
+        Settings.rate_limit_submissions_per_upload_code_burst,
+        Settings.rate_limit_submissions_per_upload_code_per_minute,
+    ),
+)
+# the status is refreshed by the students during the exam, so its bucket is separate and larger
+submission_status_rate_limit = rate_limited(
+    ("ip", Settings.rate_limit_submissions_per_ip_burst, Settings.rate_limit_submissions_per_ip_per_minute),
+    (
+        "upload_code",
+        Settings.rate_limit_submission_status_per_upload_code_burst,
+        Settings.rate_limit_submission_status_per_upload_code_per_minute,
+    ),
+)
+verifications_rate_limit = rate_limited(
+    ("ip", Settings.rate_limit_verifications_per_ip_burst, Settings.rate_limit_verifications_per_ip_per_minute),
+)
+
+
 # Routes
 
 
@@ -68,6 +337,34 @@ async def pong():
     return "pong"
 
 
+@app.get(
+    "/metrics",
+    dependencies=[Depends(verify_token)],
+    description="Returns the metrics of the process in the Prometheus text format.",
+    responses={401: {"description": "Unauthorized"}},
+    response_class=PlainTextResponse,
+)
+async def metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get(
+    "/errors",
+    dependencies=[Depends(verify_token)],
+    description="Returns the last storage errors with the number of their occurrences, a page of errors "
+    "before the given one, newest first.",
+    responses={401: {"description": "Unauthorized"}},
+    response_model=ErrorsList,
+)
+async def errors_list(
+    limit: int = Query(Settings.errors_page_default_limit, ge=1, le=Settings.errors_page_max_limit),
+    before: Optional[int] = None,
+    session=Depends(get_db),
+):
+    errors = await run(session, last_errors, limit, before)
+    return {"errors": errors, "next_before": errors[-1].id if len(errors) == limit else None}
+
+
 @app.get(
     "/auth/token",
     description="Returns the bearer token to be used as a value in Authorization header to access protected routes.",
@@ -79,12 +376,80 @@ async def bearer_token():
 @app.get(
     "/students",
     dependencies=[Depends(verify_token)],
-    description="Returns a summary of students and submissions.",
+    description="Returns a summary of students and submissions, a page of students after the given one.",
     responses={401: {"description": "Unauthorized"}},
     response_model=StudentsSubmissionsList,
 )
-async def students_summary(session=Depends(get_db)):
-    return student_list_summary(session)
+async def students_summary(
+    limit: int = Query(Settings.students_page_default_limit, ge=1, le=Settings.students_page_max_limit),
+    after: Optional[int] = None,
+    session=Depends(get_db),
+):
+    return await run(session, student_list_summary, limit, after)
+
+
+_StudentSummary = StudentsSubmissionsList.StudentSummary
+_STUDENT_SUMMARY_CSV_FIELDS = [
+    *[name for name in _StudentSummary.model_fields if name != "last_submission"],
+    *[f"last_submission_{name}" for name in _StudentSummary.StudentSubmissionSummary.model_fields],
+]
+
+
+def _student_summaries_ndjson(summaries):
+    return "".join(_StudentSummary.model_validate(summary).model_dump_json() + "\n" for summary in summaries)
+
+
+def _student_summaries_csv(summaries, with_header=False):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if with_header:
+        writer.writerow(_STUDENT_SUMMARY_CSV_FIELDS)
+
+    for summary in summaries:
+        fields = _StudentSummary.model_validate(summary).model_dump(mode="json")
+        last_submission = fields.pop("last_submission") or {}
+        writer.writerow(
+            [
+                *fields.values(),
+                *[last_submission.get(name) for name in _StudentSummary.StudentSubmissionSummary.model_fields],
+            ]
+        )
+
+    return buffer.getvalue()
+
+
+async def _student_summaries_export(format):
+    # The stream opens its own session, since the one of get_db is closed before the body is sent.
+    # The session lives as long as the stream and returns the connection when it ends or is cancelled.
+    async with AsyncSessionLocal() as session:
+        # the header is sent before the query runs, so the first byte arrives immediately
+        if format == "csv":
+            yield _student_summaries_csv([], with_header=True)
+
+        async for summaries in student_summaries_stream(session, Settings.students_export_batch_size):
+            if format == "csv":
+                yield _student_summaries_csv(summaries)
+            else:
+                yield _student_summaries_ndjson(summaries)
+
+
+@app.get(
+    "/students/export",
+    dependencies=[Depends(verify_token)],
+    description="Streams summaries of all students and their last submissions as NDJSON or CSV.",
+    responses={
+        200: {"content": {"application/x-ndjson": {}, "text/csv": {}}},
+        401: {"description": "Unauthorized"},
+    },
+    response_class=StreamingResponse,
+)
+async def students_export(format: Literal["ndjson", "csv"] = "ndjson"):
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        _student_summaries_export(format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="students.{format}"'},
+    )
 
 
 @app.get(
@@ -95,7 +460,7 @@ async def students_summary(session=Depends(get_db)):
     response_model=Student,
 )
 async def student(nickname: str, session=Depends(get_db)):
-    student = student_by_nickname(session, nickname)
+    student = await run(session, student_by_nickname, nickname)
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
     return student
@@ -114,22 +479,206 @@ async def student(nickname: str, session=Depends(get_db)):
 )
 async def create_student(student: StudentCreate, session=Depends(get_db)):
     try:
-        student = add_student(session, **student.model_dump())
+        student = await run(session, add_student, **student.model_dump())
         return student
     except Exception as e:
         orig_error = getattr(e, "orig", None)
         raise HTTPException(status_code=422, detail=str(orig_error))
 
 
+async def _enrollment_rows(request: Request):
+    """Reads the students to enroll from a JSON array or from a CSV file uploaded in the file field of a form."""
+    if request.headers.get("content-type", "").startswith("multipart/form-data"):
+        file = (await request.form()).get("file")
+        if file is None or isinstance(file, str):
+            raise HTTPException(status_code=422, detail="A CSV file is expected in the file field")
+
+        try:
+            content = (await file.read()).decode("utf-8-sig")
+        except UnicodeDecodeError:
+            raise HTTPException(status_code=422, detail="The CSV file must be encoded in UTF-8")
+        return list(csv.DictReader(io.StringIO(content)))
+
+    try:
+        rows = await request.json()
+    except ValueError:
+        rows = None
+
+    if not isinstance(rows, list):
+        raise HTTPException(status_code=422, detail="A JSON array of students or a CSV file is expected")
+    return rows
+
+
+@app.post(
+    "/students/bulk",
+    dependencies=[Depends(verify_token)],
+    description="Creates students from a JSON array or a CSV file with nickname, first_name, last_name, "
+    "and email columns. Returns the result for each student: created with the upload code, duplicate, or invalid.",
+    responses={
+        401: {"description": "Unauthorized"},
+        413: {"description": "Too many students"},
+        422: {"description": "Invalid JSON array or CSV file"},
+    },
+    response_model=StudentsEnrollment,
+)
+async def create_students_bulk(request: Request, session=Depends(get_db)):
+    rows = await _enrollment_rows(request)
+    if len(rows) > Settings.students_bulk_max_count:
+        raise HTTPException(status_code=413, detail=f"Up to {Settings.students_bulk_max_count} students are accepted")
+
+    results = []
+    students = {}
+    for index, row in enumerate(rows, start=1):
+        try:
+            student = StudentCreate.model_validate(row)
+        except ValidationError as e:
+            # the nickname is echoed only if it's a string, the result would fail the response validation otherwise
+            nickname = row.get("nickname") if isinstance(row, dict) else None
+            results.append(
+                {
+                    "row": index,
+                    "status": "invalid",
+                    "nickname": nickname if isinstance(nickname, str) else None,
+                    "errors": [f"{'.'.join(map(str, error['loc']))}: {error['msg']}" for error in e.errors()],
+                }
+            )
+            continue
+
+        results.append({"row": index, "nickname": student.nickname})
+        # the first student with the nickname is inserted, the following ones are duplicates
+        students.setdefault(student.nickname, student.model_dump())
+
+    upload_codes = await run(session, add_students, list(students.values()))
+
+    for result in results:
+        if "status" in result:
+            continue
+
+        upload_code = upload_codes.pop(result["nickname"], None)
+        if upload_code:
+            result.update(status="created", upload_code=upload_code)
+        else:
+            result.update(status="duplicate")
+
+    totals = Counter(result["status"] for result in results)
+    return {
+        "totals": {"created": totals["created"], "duplicate": totals["duplicate"], "invalid": totals["invalid"]},
+        "rows": results,
+    }
+
+
+class _NotFoundError(ValueError):
+    pass
+
+
+class _CountLimitError(ValueError):
+    pass
+
+
+@asynccontextmanager
+async def _submission_errors_as_http_exceptions():
+    try:
+        yield
+    except UploadSizeError:
+        raise HTTPException(status_code=413, detail="Upload size limit exceeded")
+    except _NotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except _CountLimitError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except CircuitOpenError as e:
+        raise HTTPException(
+            status_code=503,
+            detail="Submission Storage Unavailable",
+            headers={"Retry-After": str(math.ceil(e.retry_after_seconds))},
+        )
+    # all exceptions which are not from our packages are from s3
+    except Exception as e:
+        report_error(str(e))
+        raise HTTPException(status_code=500, detail="Submission Storage Error")
+
+
+def _ensure_storage_available(s3):
+    """Fails fast while the storage's circuit breaker is open, before the submission is processed.
+
+    Raises:
+        CircuitOpenError: If the storage is unavailable.
+    """
+    retry_after_seconds = s3.retry_after_seconds()
+    if retry_after_seconds > 0:
+        raise CircuitOpenError(retry_after_seconds)
+
+
+async def _student_accepting_submissions(session, upload_code):
+    """Returns the student with the upload code if they can make one more submission.
+
+    Raises:
+        _NotFoundError: If there is no student with the upload code.
+        _CountLimitError: If the student has reached the submission uploads limit.
+    """
+    student = await run(session, student_by_upload_code, upload_code)
+    if not student:
+        raise _NotFoundError("No student found with the provided upload_code")
+
+    if student.uploads_available <= 0:
+        raise _CountLimitError("Submissions count limit exceeded")
+
+    return student
+
+
+async def _complete_submission(session, student, file_attrs):
+    """Creates a submission record for the file persisted on S3.
+
+    The previous submission file is removed from S3 by the file deletions worker,
+    as well as the persisted file if the submission fails to be added, f.e. the student has reached
+    the submission uploads limit meanwhile.
+
+    Returns:
+        dict: The upload completion status.
+    """
+    attrs = {
+        "student_id": student.id,
+        "file_name": file_attrs["file_name"],
+        "md5": file_attrs["md5"],
+        "size_bytes": file_attrs["size_bytes"],
+    }
+
+    submission_size.observe(value=attrs["size_bytes"])
+
+    # Create submission record counting it against the uploads limit
+    try:
+        submission = await run(session, add_submission, **attrs)
+    except SubmissionsCountLimitError:
+        await run(session, queue_file_deletion, attrs["file_name"])
+        raise _CountLimitError("Submissions count limit exceeded")
+    except SubmissionFileExistsError:
+        # the file is kept for the submission completed with it by a concurrent request
+        raise _NotFoundError("No uploaded file found with the provided file_name")
+    except Exception:
+        # the persisted file would be left on S3 without a submission
+        await run(session, queue_file_deletion, attrs["file_name"])
+        raise
+
+    # the record of the student is replaced in the cache on adding the submission
+    student = await run(session, student_by_upload_code, student.upload_code)
+
+    return {
+        "has_submission": True,
+        "last_submission": submission,
+        "uploads_available": student.uploads_available,
+    }
+
+
 @app.post(
     "/submissions/{upload_code}",
     description="Creates a submission.",
+    dependencies=[Depends(submissions_rate_limit)],
     responses={
         404: {"description": "Not found"},
         413: {"description": "Payload too large"},
         422: {"description": "Submissions count limit exceeded"},
         429: {"description": "Too Many Requests"},
         500: {"description": "Submission Storage Error"},
+        503: {"description": "Submission Storage Unavailable"},
     },
     response_model=UploadCompletion,
     status_code=status.HTTP_201_CREATED,
@@ -140,103 +689,96 @@ async def create_submission(
     session=Depends(get_db),
     s3=Depends(get_s3),
 ):
-    class UploadSizeError(ValueError):
-        pass
-
-    class NotFoundError(ValueError):
-        pass
+    async with _submission_errors_as_http_exceptions():
+        _ensure_storage_available(s3)
 
-    class CountLimitError(ValueError):
-        pass
+        # The size of the spooled file is known after parsing the request, it's checked again while uploading
+        if file.size is not None and file.size > Settings.submission_max_size_bytes:
+            raise UploadSizeError()
 
-    try:
         # Check if we can acceps submissions for the student
-        student = student_by_upload_code(session, upload_code)
-        if not student:
-            raise NotFoundError("No student found with the provided upload_code")
+        student = await _student_accepting_submissions(session, upload_code)
 
-        if is_student_submission_uploads_limit_reached(session, student.id):
-            raise CountLimitError("Submissions count limit exceeded")
+        # Return the connection to the pool while the file is read and transferred to S3
+        await run(session, end_transaction)
 
-        # Read the file in chunks to avoid loading large files into memory
-        await _read_file_in_chunks(file, UploadSizeError)
-
-        # Upload to S3
-        resp = s3.upload_file(file)
+        # Upload to S3 reading the file once
+        resp = await s3.upload_file(file)
         await file.close()  # this removes the temporary file
 
-        resp["md5"] = resp["md5"].replace('"', "")
-
-        attrs = {
-            "student_id": student.id,
-            "file_name": resp["file_name"],
-            "md5": resp["md5"],
-            "size_bytes": resp["size_bytes"],
-        }
-
-        # Create submission record
-        submission = add_submission(session, **attrs)
-
-        # Remove previous submission file from S3
-        prev_submission_file_name = previous_submission_file_name(session, student.id)
-        if prev_submission_file_name:
-            s3.remove_file(prev_submission_file_name)
-
-        uploads_available = student_submission_uploads_available(session, student.id)
-
-        return {
-            "has_submission": True,
-            "last_submission": submission,
-            "uploads_available": uploads_available,
-        }
-    except UploadSizeError:
-        raise HTTPException(status_code=413, detail="Upload size limit exceeded")
-    except NotFoundError as e:
-        raise HTTPException(status_code=404, detail=str(e))
-    except CountLimitError as e:
-        raise HTTPException(status_code=422, detail=str(e))
-    # all exceptions which are not from our packages are from s3
-    except Exception as e:
-        add_error(session, str(e))
-        raise HTTPException(status_code=500, detail="Submission Storage Error")
-
+        return await _complete_submission(session, student, resp)
 
-async def _read_file_in_chunks(file, exception_cls):
-    """Read a file in chunks and return its contents.
 
-    It raises an exception of the specified class at the moment
-    when the size of the contents of the read file exceeds the maximum allowed size.
-
-    Args:
-        file: The file-like object to be read.
-        exception_cls: The exception class to raise if the file size exceeds the maximum allowed size.
+@app.post(
+    "/submissions/{upload_code}/upload_url",
+    description="""
+    Returns a form to upload a submission file directly to the storage with a multipart/form-data POST request
+    to the url. The request should contain the fields of the form followed by the file field.
+    When the upload succeeds, the submission is created with the upload_completion route.
+    """,
+    dependencies=[Depends(submissions_rate_limit)],
+    responses={
+        404: {"description": "Not found"},
+        422: {"description": "Submissions count limit exceeded"},
+        429: {"description": "Too Many Requests"},
+        500: {"description": "Submission Storage Error"},
+    },
+    response_model=UploadForm,
+)
+async def create_submission_upload_url(
+    upload_code: str,
+    filename: str,
+    session=Depends(get_db),
+    s3=Depends(get_s3),
+):
+    async with _submission_errors_as_http_exceptions():
+        student = await _student_accepting_submissions(session, upload_code)
+        file_name = new_file_name(filename, prefix=f"{student.id}/")
+        return await s3.generate_upload_form(file_name)
 
-    Returns:
-        The contents of the file as bytes.
 
-    Raises:
-        exception_cls: If the file size exceeds the maximum allowed size.
-    """
-    CHUNK_SIZE = 64 * 1024  # 64KB
-    MAX_SIZE = Settings.submission_max_size_bytes
+@app.post(
+    "/submissions/{upload_code}/upload_completion",
+    description="Creates a submission for the file uploaded directly to the storage with the form from upload_url.",
+    dependencies=[Depends(submissions_rate_limit)],
+    responses={
+        404: {"description": "Not found"},
+        413: {"description": "Payload too large"},
+        422: {"description": "Submissions count limit exceeded"},
+        429: {"description": "Too Many Requests"},
+        500: {"description": "Submission Storage Error"},
+        503: {"description": "Submission Storage Unavailable"},
+    },
+    response_model=UploadCompletion,
+    status_code=status.HTTP_201_CREATED,
+)
+async def complete_submission_upload(
+    upload_code: str,
+    uploaded_file: UploadedFile,
+    session=Depends(get_db),
+    s3=Depends(get_s3),
+):
+    async with _submission_errors_as_http_exceptions():
+        _ensure_storage_available(s3)
+        student = await _student_accepting_submissions(session, upload_code)
 
-    size = 0
-    contents = b""
+        # Files uploaded with the form are named after the student's id,
+        # and each of them can complete only one submission
+        file_name = uploaded_file.file_name
+        if not file_name.startswith(f"{student.id}/") or await run(session, is_file_submitted, file_name):
+            raise _NotFoundError("No uploaded file found with the provided file_name")
 
-    while True:
-        chunk = await file.read(CHUNK_SIZE)
-        if not chunk:
-            logger.info(f'File "{file.filename}" has been submitted, size: {size}')
+        await run(session, end_transaction)
 
-            # seek to the beginning of the file so it can be read again by boto3
-            await file.seek(0)
-            return contents
+        file_attrs = await s3.file_attributes(file_name)
+        if not file_attrs:
+            raise _NotFoundError("No uploaded file found with the provided file_name")
 
-        size += len(chunk)
-        if size > MAX_SIZE:
-            raise exception_cls()
+        if file_attrs["size_bytes"] > Settings.submission_max_size_bytes:
+            await s3.remove_file(file_name)
+            raise UploadSizeError()
 
-        contents += chunk
+        return await _complete_submission(session, student, file_attrs)
 
 
 @app.get(
@@ -245,29 +787,33 @@ async def _read_file_in_chunks(file, exception_cls):
     Returns the last submission's metadata by the upload code and number of uploads left
     for the appropriate student.
     """,
-    responses={404: {"description": "Not found"}},
+    dependencies=[Depends(submission_status_rate_limit)],
+    responses={404: {"description": "Not found"}, 429: {"description": "Too Many Requests"}},
     response_model=UploadCompletion,
 )
 async def get_submission_metadata(upload_code: str, session=Depends(get_db)):
-    student = student_by_upload_code(session, upload_code)
+    student = await run(session, student_by_upload_code, upload_code)
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
-    uploads_available = student_submission_uploads_available(session, student.id)
-
     return {
-        "has_submission": student.last_submission is not None,
+        "has_submission": student.has_submission,
         "last_submission": student.last_submission,
-        "uploads_available": uploads_available,
+        "uploads_available": student.uploads_available,
     }
 
 
 @app.get(
     "/verifications/{verification_code}/download_url",
     description="Returns URL to download the submission for verification.",
-    responses={401: {"description": "Unauthorized"}, 404: {"description": "Not found"}},
+    dependencies=[Depends(verifications_rate_limit)],
+    responses={
+        401: {"description": "Unauthorized"},
+        404: {"description": "Not found"},
+        429: {"description": "Too Many Requests"},
+    },
 )
 async def get_verification_download_url(verification_code: str, session=Depends(get_db), s3=Depends(get_s3)):
-    submission = submission_by_verification_code(session, verification_code)
-    if not submission:
+    file_name = await run(session, submission_file_name_by_verification_code, verification_code)
+    if not file_name:
         raise HTTPException(status_code=404, detail="Submission not found")
-    return s3.generate_download_url(submission.file_name)
+    return await s3.generate_download_url(file_name)
@@ -0,0 +1,124 @@
+import asyncio
+from collections import Counter
+import os
+import re
+import secrets
+import sys
+import threading
+import time
+import uuid
+
+from src.logger import logger
+from src.settings import Settings
+
+PROFILE_HEADER = b"x-profile"
+
+
+class StackSampler:
+    """A sampling profiler of the stacks of a thread and of the S3 thread pool.
+
+    A background thread takes the frames of the running threads from sys._current_frames()
+    at the interval, so the profiled code is not instrumented. The event loop thread runs other requests
+    concurrently, so their frames can appear in the samples as well.
+
+    Args:
+        thread_id (int): The identifier of the thread to sample, usually the event loop thread.
+        interval_seconds (float): The time between the samples.
+    """
+
+    def __init__(self, thread_id: int, interval_seconds: float):
+        self._thread_id = thread_id
+        self._interval_seconds = interval_seconds
+        self._stacks = Counter()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        """Stops the sampling and returns the number of samples by the collapsed stack."""
+        self._stopped.set()
+        self._thread.join()
+        return self._stacks
+
+    def _run(self):
+        while not self._stopped.wait(self._interval_seconds):
+            thread_names = {
+                thread.ident: thread.name
+                for thread in threading.enumerate()
+                if thread.ident == self._thread_id or thread.name.startswith("s3")
+            }
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id in thread_names:
+                    self._stacks[_collapsed_stack(thread_names[thread_id], frame)] += 1
+
+
+def _collapsed_stack(root, frame):
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_qualname} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    names.append(root)
+    return ";".join(reversed(names))
+
+
+def write_profile(directory: str, name: str, stacks: Counter, max_count: int):
+    """Writes the stacks in the collapsed format of flamegraph.pl and speedscope, one stack and its count per line.
+
+    The oldest profiles above the maximum count are removed from the directory.
+    """
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, name), "w") as file:
+        file.writelines(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+    profiles = sorted(
+        (entry for entry in os.scandir(directory) if entry.name.endswith(".collapsed")),
+        key=lambda entry: entry.stat().st_mtime,
+    )
+    for entry in profiles[: max(0, len(profiles) - max_count)]:
+        os.remove(entry.path)
+
+
+class ProfilingMiddleware:
+    """Profiles the requests that have the X-Profile header with the authorization token.
+
+    The profile is written to the profiles directory, and its file name is returned in the X-Profile
+    response header. One request is profiled at a time, the header is ignored while a profile is running.
+    The middleware is added only when profiling is enabled, so it costs nothing otherwise.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._profiling = False
+
+    def _requested(self, scope):
+        for name, value in scope["headers"]:
+            if name == PROFILE_HEADER:
+                return secrets.compare_digest(value, Settings.auth_token.encode())
+        return False
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self._profiling or not self._requested(scope):
+            await self.app(scope, receive, send)
+            return
+
+        route = re.sub(r"[^A-Za-z0-9-]+", "_", scope["path"]).strip("_") or "root"
+        name = f"{time.strftime('%Y%m%dT%H%M%S')}_{scope['method']}_{route[:64]}_{uuid.uuid4().hex[:8]}.collapsed"
+
+        async def _send(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", []), (PROFILE_HEADER, name.encode())]
+            await send(message)
+
+        self._profiling = True
+        sampler = StackSampler(threading.get_ident(), Settings.profiler_interval_seconds)
+        sampler.start()
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            stacks = sampler.stop()
+            self._profiling = False
+            await asyncio.to_thread(write_profile, Settings.profiles_dir, name, stacks, Settings.profiles_max_count)
+            logger.info(f"Profiled {scope['method']} {scope['path']}: {sum(stacks.values())} samples in {name}")
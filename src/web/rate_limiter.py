@@ -0,0 +1,65 @@
+from collections import OrderedDict
+import threading
+import time
+
+from src.settings import Settings
+
+
+class TokenBuckets:
+    """Token buckets of the rate limits kept in the process, one per key.
+
+    A bucket holds up to the capacity of tokens and is refilled continuously at the rate. Each request takes
+    a token and is rejected when there is none. The bucket is refilled lazily on the next request,
+    so a request costs a dictionary lookup and a few arithmetic operations.
+
+    The least recently used buckets are dropped above the maximum size. The dropped bucket starts full
+    on the next request, so a burst of new keys can only loosen the limit for the idle ones.
+
+    Args:
+        max_size (int): The maximum number of buckets.
+    """
+
+    def __init__(self, max_size: int):
+        self._max_size = max_size
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, capacity: float, refill_per_second: float):
+        """Takes a token from the bucket of the key.
+
+        Args:
+            key: The key of the bucket, f.e. the route and the client IP.
+            capacity (float): The maximum number of tokens, the burst allowed after a pause.
+            refill_per_second (float): The number of tokens added per second, the sustained rate.
+
+        Returns:
+            float: 0 if the token is taken, otherwise the time until the next token.
+        """
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                tokens = capacity
+            else:
+                tokens = min(capacity, bucket[0] + (now - bucket[1]) * refill_per_second)
+                self._buckets.move_to_end(key)
+
+            if tokens < 1:
+                self._buckets[key] = (tokens, now)
+                return (1 - tokens) / refill_per_second
+
+            self._buckets[key] = (tokens - 1, now)
+            if len(self._buckets) > self._max_size:
+                self._buckets.popitem(last=False)
+            return 0
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+# The buckets of the process, used unless the rate limits are shared in the database
+token_buckets = TokenBuckets(Settings.rate_limit_buckets_max_size)
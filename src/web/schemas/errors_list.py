@@ -0,0 +1,21 @@
+from datetime import datetime
+from typing import Optional
+
+from pydantic import BaseModel
+
+
+class ErrorsList(BaseModel):
+    """Schema for a page of the last errors, newest first.
+
+    The next page is requested before the `next_before` value, which is None on the last page.
+    """
+
+    class Error(BaseModel):
+        id: int
+        detail: str
+        occurrences: int
+        created_at: datetime
+        model_config = {"from_attributes": True}
+
+    errors: list[Error]
+    next_before: Optional[int] = None
@@ -0,0 +1,26 @@
+from typing import Literal, Optional
+
+from pydantic import BaseModel
+
+
+class StudentsEnrollment(BaseModel):
+    """Schema for the results of enrolling students in bulk.
+
+    Represents the number of created, duplicate and invalid students, and the result for each row of the input
+    in the same order. The rows are numbered from 1 not counting the header of a CSV file.
+    """
+
+    class Totals(BaseModel):
+        created: int
+        duplicate: int
+        invalid: int
+
+    class RowResult(BaseModel):
+        row: int
+        status: Literal["created", "duplicate", "invalid"]
+        nickname: Optional[str] = None
+        upload_code: Optional[str] = None
+        errors: Optional[list[str]] = None
+
+    totals: Totals
+    rows: list[RowResult]
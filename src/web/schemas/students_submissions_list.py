@@ -7,7 +7,9 @@ from pydantic import BaseModel
 class StudentsSubmissionsList(BaseModel):
     """Schema for the list of students and their submissions.
 
-    Represents statistics about total number of students and submissions, and a list of students with their submissions.
+    Represents statistics about total number of students and submissions, and a page of students
+    with their last submissions. The next page is requested after the `next_after` value,
+    which is None on the last page.
     """
 
     class Totals(BaseModel):
@@ -28,4 +30,5 @@ class StudentsSubmissionsList(BaseModel):
 
     totals: Totals
     students: list[StudentSummary]
+    next_after: Optional[int] = None
     model_config = {"from_attributes": True}
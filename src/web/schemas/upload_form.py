@@ -0,0 +1,20 @@
+from pydantic import BaseModel
+
+
+class UploadForm(BaseModel):
+    """Schema for a form to upload a submission file directly to the storage.
+
+    The file is uploaded with a multipart/form-data POST request to the url,
+    the request contains the fields followed by the file field.
+    """
+
+    url: str
+    fields: dict[str, str]
+    file_name: str
+    expires_seconds: int
+
+
+class UploadedFile(BaseModel):
+    """Schema for a submission file uploaded directly to the storage."""
+
+    file_name: str
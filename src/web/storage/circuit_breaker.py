@@ -0,0 +1,121 @@
+import threading
+import time
+
+
+class CircuitOpenError(Exception):
+    """Raised when the calls to a failing service are rejected without trying it.
+
+    Attributes:
+        retry_after_seconds (float): The time until the service is probed again.
+    """
+
+    def __init__(self, retry_after_seconds: float):
+        super().__init__(f"The storage is unavailable, retry after {retry_after_seconds:.0f} seconds")
+        self.retry_after_seconds = retry_after_seconds
+
+
+class CircuitBreaker:
+    """Stops calling a service after consecutive failures and probes it again after the reset timeout.
+
+    The breaker is closed while the calls succeed. After the threshold of consecutive failures it opens
+    and rejects the calls with CircuitOpenError. After the reset timeout it's half-open and lets one probe
+    call through, the probe's success closes the breaker, and its failure opens it again.
+
+    Args:
+        failure_threshold (int): The number of consecutive failures opening the breaker.
+        reset_timeout_seconds (float): The time the breaker stays open before a probe.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int, reset_timeout_seconds: float):
+        self._failure_threshold = failure_threshold
+        self._reset_timeout_seconds = reset_timeout_seconds
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+
+    @property
+    def state(self):
+        if self._opened_at is None:
+            return self.CLOSED
+        if self._probing or time.monotonic() - self._opened_at >= self._reset_timeout_seconds:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def retry_after_seconds(self):
+        """Returns the time until the next probe, 0 if the calls are let through."""
+        if self._opened_at is None:
+            return 0
+        return max(0, self._opened_at + self._reset_timeout_seconds - time.monotonic())
+
+    def before_call(self):
+        """Lets the call through or raises CircuitOpenError.
+
+        Returns:
+            bool: True if the call is the probe of the half-open breaker, which must end with record_success(),
+                  record_failure() or release_probe().
+
+        Raises:
+            CircuitOpenError: If the breaker is open, or half-open with a probe in progress.
+        """
+        with self._lock:
+            if self._opened_at is None:
+                return False
+
+            retry_after_seconds = self.retry_after_seconds()
+            if retry_after_seconds > 0 or self._probing:
+                raise CircuitOpenError(retry_after_seconds or self._reset_timeout_seconds)
+            self._probing = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def release_probe(self):
+        """Lets another probe through after the probe ended without a result, f.e. it was cancelled."""
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= self._failure_threshold:
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+
+class RetryBudget:
+    """Limits the retries to a share of the calls across all the callers.
+
+    Each call deposits the ratio of a token and each retry withdraws a whole one, so when a service fails
+    the retries add at most the ratio of the load instead of multiplying it. The balance is capped.
+
+    Args:
+        ratio (float): The share of the calls which can be retried.
+        max_tokens (float): The maximum balance, also the initial one.
+    """
+
+    def __init__(self, ratio: float, max_tokens: float):
+        self._ratio = ratio
+        self._max_tokens = max_tokens
+        self._lock = threading.Lock()
+        self.tokens = max_tokens
+
+    def deposit(self):
+        with self._lock:
+            self.tokens = min(self._max_tokens, self.tokens + self._ratio)
+
+    def withdraw(self):
+        """Returns True if a retry is allowed and takes a token for it."""
+        with self._lock:
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
@@ -0,0 +1,62 @@
+import hashlib
+
+
+class UploadSizeError(ValueError):
+    """Raised when the size of the uploaded file exceeds the maximum allowed size."""
+
+    pass
+
+
+class MeasuredStream:
+    """A read-only file-like wrapper that computes the MD5 digest and the size of a file while it is being read.
+
+    It lets a storage client consume the file in a single pass, and raises UploadSizeError at the moment
+    when the size of the read contents exceeds the maximum allowed size, which aborts the transfer.
+
+    The client may seek back and read the contents again, f.e. to sign the payload or to retry a request,
+    the bytes that were measured already are not counted twice.
+
+    Read-only properies:
+        size_bytes (int): The number of bytes read from the file so far.
+        md5 (str): The hex MD5 digest of the bytes read from the file so far.
+    """
+
+    def __init__(self, file, max_size_bytes: int):
+        self._file = file
+        self._max_size_bytes = max_size_bytes
+        self._md5 = hashlib.md5()
+        self._size_bytes = 0
+
+    @property
+    def size_bytes(self):
+        return self._size_bytes
+
+    @property
+    def md5(self):
+        return self._md5.hexdigest()
+
+    def read(self, size=-1):
+        position = self._file.tell()
+        if position > self._size_bytes:
+            raise ValueError("Can't skip the bytes that were not measured yet")
+
+        chunk = self._file.read(size)
+        end = position + len(chunk)
+
+        if end > self._size_bytes:
+            if end > self._max_size_bytes:
+                raise UploadSizeError()
+
+            self._md5.update(memoryview(chunk)[self._size_bytes - position :])
+            self._size_bytes = end
+
+        return chunk
+
+    def seek(self, offset, whence=0):
+        return self._file.seek(offset, whence)
+
+    def tell(self):
+        return self._file.tell()
+
+    def seekable(self):
+        return True
@@ -1,56 +1,247 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import functools
+import random
+
 import boto3
-from boto3.s3.transfer import TransferConfig
 from botocore.config import Config
+from botocore.exceptions import ClientError, ConnectionError as BotoConnectionError, HTTPClientError
 import os
+import time
 import uuid
 
+from src.database.cache import TTLCache
 from src.logger import logger
+from src.metrics import s3_operation_duration, timed
 from src.settings import Settings
+from src.web.storage.circuit_breaker import CircuitBreaker, RetryBudget
+from src.web.storage.measured_stream import MeasuredStream
 
 
 class S3:
     """A class to operate files on an AWS S3 like storage.
 
     This class provides methods to upload, remove, and generate download URLs for files on S3.
+
+    The boto3 client is blocking, so its network calls run in a dedicated thread pool sized to the client's
+    connection pool. The methods can be awaited from the event loop and concurrent calls overlap.
+
+    Download URLs are cached by the file name while they are valid longer than the minimum time,
+    and evicted when the file is removed.
+
+    The calls uploading and removing files go through a circuit breaker, which rejects them
+    with CircuitOpenError while the storage is failing. They are retried after transient failures
+    within a retry budget shared by all calls and within a deadline per call.
     """
 
     def __init__(self, endpoint_url):
         self._s3_client = boto3.client(
-            "s3", endpoint_url=endpoint_url, config=Config(signature_version=Settings.aws_s3_signature_version)
+            "s3",
+            endpoint_url=endpoint_url,
+            config=Config(
+                signature_version=Settings.aws_s3_signature_version,
+                max_pool_connections=Settings.aws_s3_max_pool_connections,
+                connect_timeout=Settings.aws_s3_connect_timeout_seconds,
+                read_timeout=Settings.aws_s3_read_timeout_seconds,
+                tcp_keepalive=Settings.aws_s3_tcp_keepalive,
+                # the calls are retried by _guarded_call() within the retry budget
+                retries={"total_max_attempts": 1},
+            ),
         )
+        self._executor = ThreadPoolExecutor(max_workers=Settings.aws_s3_max_pool_connections, thread_name_prefix="s3")
+        self._download_urls = TTLCache(
+            Settings.download_urls_cache_max_size,
+            Settings.download_url_expires_seconds - Settings.download_url_min_expires_seconds,
+            0,
+        )
+        self._breaker = CircuitBreaker(
+            Settings.aws_s3_breaker_failure_threshold, Settings.aws_s3_breaker_reset_timeout_seconds
+        )
+        self._retry_budget = RetryBudget(Settings.aws_s3_retry_budget_ratio, Settings.aws_s3_retry_budget_max_tokens)
+
+    async def _call(self, fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+
+    async def _guarded_call(self, fn, *args, rewind=None, **kwargs):
+        """Calls the storage through the circuit breaker, retrying transient failures before the deadline.
+
+        Args:
+            fn: The boto3 client method.
+            rewind: The function to call before a retry, f.e. to seek the uploaded stream to the beginning.
+
+        Raises:
+            CircuitOpenError: If the breaker is open.
+        """
+        probe = self._breaker.before_call()
+        try:
+            return await self._attempts(fn, *args, rewind=rewind, **kwargs)
+        finally:
+            # a cancelled call, f.e. on a client disconnect, records neither a success nor a failure,
+            # so its probe is released to keep the breaker from staying half-open
+            if probe:
+                self._breaker.release_probe()
+
+    async def _attempts(self, fn, *args, rewind=None, **kwargs):
+        self._retry_budget.deposit()
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + Settings.aws_s3_call_deadline_seconds
+        for attempt in range(1, Settings.aws_s3_max_attempts + 1):
+            try:
+                # the thread keeps running after the deadline until the boto3 timeouts, the caller doesn't wait for it
+                result = await asyncio.wait_for(self._call(fn, *args, **kwargs), timeout=deadline - loop.time())
+            except Exception as e:
+                if not _is_transient(e):
+                    # the storage is available and rejects the request
+                    self._breaker.record_success()
+                    raise
+
+                backoff_seconds = random.uniform(0, Settings.aws_s3_retry_backoff_seconds * 2 ** (attempt - 1))
+                if (
+                    attempt == Settings.aws_s3_max_attempts
+                    or loop.time() + backoff_seconds >= deadline
+                    or not self._retry_budget.withdraw()
+                ):
+                    self._breaker.record_failure()
+                    raise
+
+                logger.warning(f"S3 call {fn.__name__} failed, attempt {attempt}: {e!r}")
+                await asyncio.sleep(backoff_seconds)
+                if rewind:
+                    rewind()
+            else:
+                self._breaker.record_success()
+                return result
 
-    def upload_file(self, file_object):
+    def retry_after_seconds(self):
+        """Returns the time until the storage is probed again while the circuit breaker is open, 0 otherwise."""
+        return self._breaker.retry_after_seconds()
+
+    @timed(s3_operation_duration, "warm_up")
+    async def warm_up(self):
+        """Opens connections to the S3 bucket ahead of the first requests.
+
+        It's called on the application startup, failures are logged and don't prevent the startup.
+        """
+        calls = [
+            self._call(self._s3_client.head_bucket, Bucket=Settings.aws_s3_bucket_name)
+            for _ in range(Settings.aws_s3_warm_up_connections)
+        ]
+        results = await asyncio.gather(*calls, return_exceptions=True)
+
+        errors = [result for result in results if isinstance(result, Exception)]
+        if errors:
+            logger.warning(f"S3 connections warm up failed: {errors[0]}")
+        else:
+            logger.info(f"S3 connections warmed up: {len(results)}")
+
+    def close(self):
+        """Waits for the running S3 calls and stops the thread pool."""
+        self._executor.shutdown(wait=True)
+
+    @timed(s3_operation_duration, "upload_file")
+    async def upload_file(self, file_object):
         """Uploads a file to the S3 bucket and returns the file attributes.
 
+        The file is read once, its MD5 digest and size are computed locally while it's being sent,
+        so no metadata request to S3 is needed afterwards.
+
         Args:
             file_object: The [file-like object](https://docs.python.org/3/glossary.html#term-file-like-object)
                          to be uploaded.
 
         Returns:
             dict: A dictionary containing the file size_bytes, md5, and file_name.
+
+        Raises:
+            UploadSizeError: If the file size exceeds the maximum allowed submission size.
         """
-        file_extension = os.path.splitext(file_object.filename)[1]
-        file_name = f"{uuid.uuid4()}{file_extension}"
+        file_name = new_file_name(file_object.filename)
+
+        stream = MeasuredStream(file_object.file, Settings.submission_max_size_bytes)
+
+        # A single PutObject request, the file never exceeds the maximum submission size,
+        # so there is no need for the multipart upload.
+        await self._guarded_call(
+            self._s3_client.put_object,
+            Body=stream,
+            Bucket=Settings.aws_s3_bucket_name,
+            Key=file_name,
+            rewind=lambda: stream.seek(0),
+        )
+
+        logger.info(
+            f'File "{file_object.filename}" has been persisted on S3 as "{file_name}", size: {stream.size_bytes}.'
+        )
+
+        return {"size_bytes": stream.size_bytes, "md5": stream.md5, "file_name": file_name}
+
+    @timed(s3_operation_duration, "generate_upload_form")
+    async def generate_upload_form(self, file_name):
+        """Generates a pre-signed POST form for uploading a file directly to the S3 bucket.
+
+        The form accepts files up to the maximum submission size.
 
-        # Set the threshold for multipart upload to be larger than the max submission size
-        # to force one part upload, so we have md5 and size_bytes of the whole file in response
-        # from S3 instead of similar values for multiple parts.
-        config = TransferConfig(multipart_threshold=Settings.submission_max_size_bytes * 10)
+        Args:
+            file_name (str): The name of the file on S3.
 
-        self._s3_client.upload_fileobj(
-            Fileobj=file_object.file, Bucket=Settings.aws_s3_bucket_name, Key=file_name, Config=config
+        Returns:
+            dict: A dictionary containing the form url and fields, the file_name, and the expiration time in seconds.
+        """
+        form = self._s3_client.generate_presigned_post(
+            Bucket=Settings.aws_s3_bucket_name,
+            Key=file_name,
+            Conditions=[["content-length-range", 1, Settings.submission_max_size_bytes]],
+            ExpiresIn=Settings.upload_url_expires_seconds,
         )
+        return {
+            "url": form["url"],
+            "fields": form["fields"],
+            "file_name": file_name,
+            "expires_seconds": Settings.upload_url_expires_seconds,
+        }
+
+    @timed(s3_operation_duration, "file_attributes")
+    async def file_attributes(self, file_name):
+        """Retrieves the attributes of a file in the S3 bucket.
+
+        Args:
+            file_name (str): The name of the file.
+
+        Returns:
+            dict: A dictionary containing the file size_bytes, md5, and file_name, or None if the file doesn't exist.
+        """
+        try:
+            response = await self._call(self._s3_client.head_object, Bucket=Settings.aws_s3_bucket_name, Key=file_name)
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ["404", "NoSuchKey"]:
+                return None
+            raise
 
-        response = self._s3_client.head_object(Bucket=Settings.aws_s3_bucket_name, Key=file_name)
+        # ETag of a file uploaded in one part is its MD5 digest wrapped in quotes
+        return {"size_bytes": response["ContentLength"], "md5": response["ETag"].strip('"'), "file_name": file_name}
 
-        logger.info(f'File "{file_object.filename}" has been persisted on S3 as "{file_name}".')
+    @timed(s3_operation_duration, "list_files")
+    async def list_files(self, after, limit):
+        """Lists the files in the S3 bucket in the order of their names, a page at a time.
 
-        size_bytes = response["ContentLength"]
-        md5 = response["ETag"]
+        Args:
+            after (str | None): The name of the last file of the previous page.
+            limit (int): The maximum number of files, up to 1000.
 
-        return {"size_bytes": size_bytes, "md5": md5, "file_name": file_name}
+        Returns:
+            list: Dictionaries containing the file_name and the modified_at time of each file.
+        """
+        response = await self._call(
+            self._s3_client.list_objects_v2, Bucket=Settings.aws_s3_bucket_name, StartAfter=after or "", MaxKeys=limit
+        )
+        return [
+            {"file_name": item["Key"], "modified_at": item["LastModified"]} for item in response.get("Contents", [])
+        ]
 
-    def remove_file(self, file_name):
+    @timed(s3_operation_duration, "remove_file")
+    async def remove_file(self, file_name):
         """Removes a file from the S3 bucket.
 
         Args:
@@ -59,25 +250,91 @@ class S3:
         Returns:
             dict: A dictionary containing the response from the S3 service.
         """
-        return self._s3_client.delete_object(Bucket=Settings.aws_s3_bucket_name, Key=file_name)
+        self._download_urls.invalidate(file_name)
+        return await self._guarded_call(
+            self._s3_client.delete_object, Bucket=Settings.aws_s3_bucket_name, Key=file_name
+        )
+
+    @timed(s3_operation_duration, "remove_files")
+    async def remove_files(self, file_names):
+        """Removes files from the S3 bucket with DeleteObjects requests of up to 1000 keys.
+
+        Args:
+            file_names (list): The names of the files to be removed.
+
+        Returns:
+            dict: The error details by the names of the files that failed to be removed.
+        """
+        errors = {}
 
-    def generate_download_url(self, file_name):
+        for file_name in file_names:
+            self._download_urls.invalidate(file_name)
+
+        for index in range(0, len(file_names), 1000):
+            objects = [{"Key": file_name} for file_name in file_names[index : index + 1000]]
+            response = await self._guarded_call(
+                self._s3_client.delete_objects,
+                Bucket=Settings.aws_s3_bucket_name,
+                Delete={"Objects": objects, "Quiet": True},
+            )
+            for error in response.get("Errors", []):
+                errors[error["Key"]] = f"{error.get('Code')}: {error.get('Message')}"
+
+        return errors
+
+    @timed(s3_operation_duration, "generate_download_url")
+    async def generate_download_url(self, file_name):
         """Generates a pre-signed URL for downloading a file from the S3 bucket.
 
+        The URL is signed locally without a network call, so it's done on the event loop.
+        A URL signed earlier is returned with its remaining expiration time while it's above the minimum.
+
         Args:
             file_name: The name of the file to generate the download URL for.
 
         Returns:
             dict: A dictionary containing the download URL and the expiration time in seconds.
         """
+        cached = self._download_urls.get(file_name)
+        if cached is not TTLCache.MISSING:
+            url, expires_at = cached
+            return {"download_url": url, "expires_seconds": int(expires_at - time.monotonic())}
+
+        expires_at = time.monotonic() + Settings.download_url_expires_seconds
         url = self._s3_client.generate_presigned_url(
             "get_object",
             Params={"Bucket": Settings.aws_s3_bucket_name, "Key": file_name},
             ExpiresIn=Settings.download_url_expires_seconds,
         )
+        self._download_urls.put(file_name, (url, expires_at))
         return {"download_url": url, "expires_seconds": Settings.download_url_expires_seconds}
 
 
+def _is_transient(error):
+    if isinstance(error, (BotoConnectionError, HTTPClientError, asyncio.TimeoutError)):
+        return True
+    if isinstance(error, ClientError):
+        response = error.response
+        return response.get("ResponseMetadata", {}).get("HTTPStatusCode", 0) >= 500 or response.get("Error", {}).get(
+            "Code"
+        ) in ["SlowDown", "RequestTimeout", "Throttling"]
+    return False
+
+
+def new_file_name(filename, prefix=""):
+    """Returns a unique name for a file on S3 keeping the extension of the uploaded file.
+
+    Args:
+        filename (str): The name of the uploaded file.
+        prefix (str): The prefix of the name on S3.
+
+    Returns:
+        str: The file name on S3.
+    """
+    file_extension = os.path.splitext(filename)[1]
+    return f"{prefix}{uuid.uuid4()}{file_extension}"
+
+
 def _init_s3_shared_instance():
     if os.environ["ENV"] in ["PROD", "STAGE"]:
         return S3(endpoint_url=Settings.aws_s3_endpoint_url)
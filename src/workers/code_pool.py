@@ -0,0 +1,31 @@
+from src.database.repository import AsyncSessionLocal, refill_code_pool, run
+from src.settings import Settings
+
+_KINDS = ["upload_code", "verification_code"]
+
+
+async def refill_code_pool_batch(session):
+    """Adds a batch of generated codes of each kind to the code pool unless it's full.
+
+    Args:
+        session: The database session.
+
+    Returns:
+        bool: True if the pool of any kind of codes is still not full, False otherwise.
+    """
+    has_pending_work = False
+    for kind in _KINDS:
+        if await run(session, refill_code_pool, kind, Settings.code_pool_batch_size):
+            has_pending_work = True
+
+    return has_pending_work
+
+
+def code_pool_job():
+    """Returns a job for the scheduler keeping the code pool full."""
+
+    async def _job():
+        async with AsyncSessionLocal() as session:
+            return await refill_code_pool_batch(session)
+
+    return _job
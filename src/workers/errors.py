@@ -0,0 +1,38 @@
+from datetime import timedelta
+
+from src.database.repository import AsyncSessionLocal, flush_errors, remove_old_errors, run
+from src.logger import logger
+from src.settings import Settings
+
+
+async def flush_errors_batch(session):
+    """Persists the errors buffered in the process and removes a batch of errors older than the retention period.
+
+    Args:
+        session: The database session.
+
+    Returns:
+        bool: True if the removed batch was full and more old errors may be pending, False otherwise.
+    """
+    flushed_count = await run(session, flush_errors)
+    removed_count = await run(
+        session,
+        remove_old_errors,
+        timedelta(seconds=Settings.errors_retention_seconds),
+        Settings.errors_retention_batch_size,
+    )
+
+    if flushed_count or removed_count:
+        logger.info(f"Flushed errors: {flushed_count}, removed old errors: {removed_count}")
+
+    return removed_count == Settings.errors_retention_batch_size
+
+
+def errors_job():
+    """Returns a job for the scheduler flushing the buffered errors and applying the retention."""
+
+    async def _job():
+        async with AsyncSessionLocal() as session:
+            return await flush_errors_batch(session)
+
+    return _job
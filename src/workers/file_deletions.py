@@ -0,0 +1,43 @@
+from src.database.repository import AsyncSessionLocal, claim_file_deletions, run, settle_file_deletions
+from src.logger import logger
+from src.settings import Settings
+
+
+async def remove_file_deletions_batch(session, s3):
+    """Removes a batch of files queued for deletion from the storage.
+
+    The claimed records stay locked while the files are removed with DeleteObjects requests.
+    Files that failed to be removed are retried later with a backoff.
+
+    Args:
+        session: The database session.
+        s3: The storage to remove the files from.
+
+    Returns:
+        bool: True if the batch was full and more files may be pending, False otherwise.
+    """
+    file_deletions = await run(session, claim_file_deletions, Settings.file_deletions_batch_size)
+    if not file_deletions:
+        return False
+
+    file_names = [file_deletion.file_name for file_deletion in file_deletions]
+    try:
+        errors = await s3.remove_files(file_names)
+    except Exception as e:
+        errors = {file_name: str(e) for file_name in file_names}
+
+    await run(session, settle_file_deletions, file_deletions, errors)
+
+    logger.info(f"Removed files from S3: {len(file_names) - len(errors)}, failed: {len(errors)}")
+
+    return len(file_deletions) == Settings.file_deletions_batch_size
+
+
+def file_deletions_job(s3):
+    """Returns a job for the scheduler removing the queued files from the storage."""
+
+    async def _job():
+        async with AsyncSessionLocal() as session:
+            return await remove_file_deletions_batch(session, s3)
+
+    return _job
@@ -0,0 +1,56 @@
+from datetime import datetime, timedelta, timezone
+import re
+
+from src.database.repository import AsyncSessionLocal, queue_orphaned_files, run
+from src.logger import logger
+from src.settings import Settings
+
+# files uploaded directly to the storage with the upload form are named after the student's id
+_FORM_UPLOAD_NAME = re.compile(r"^\d+/")
+
+
+async def queue_orphaned_files_batch(session, s3, after=None):
+    """Queues for removal the files uploaded with the upload form whose completion was never requested.
+
+    A page of files is listed from the storage, and the files older than the minimum age
+    which no submission refers to are queued for the file deletions worker.
+
+    Args:
+        session: The database session.
+        s3: The storage to list the files from.
+        after (str | None): The name of the last file of the previous page.
+
+    Returns:
+        str | None: The name of the last file in the page if the page was full, None otherwise.
+    """
+    files = await s3.list_files(after, Settings.orphaned_files_batch_size)
+    if not files:
+        return None
+
+    modified_before = datetime.now(timezone.utc) - timedelta(seconds=Settings.orphaned_files_min_age_seconds)
+    file_names = [
+        file["file_name"]
+        for file in files
+        if _FORM_UPLOAD_NAME.match(file["file_name"]) and file["modified_at"] < modified_before
+    ]
+    if file_names:
+        queued = await run(session, queue_orphaned_files, file_names)
+        if queued:
+            logger.info(f"Queued orphaned files for removal: {len(queued)}")
+
+    if len(files) < Settings.orphaned_files_batch_size:
+        return None
+    return files[-1]["file_name"]
+
+
+def orphaned_files_job(s3):
+    """Returns a job for the scheduler sweeping the storage for orphaned files page by page."""
+    after = None
+
+    async def _job():
+        nonlocal after
+        async with AsyncSessionLocal() as session:
+            after = await queue_orphaned_files_batch(session, s3, after)
+        return after is not None
+
+    return _job
@@ -0,0 +1,62 @@
+from datetime import timedelta
+
+from src.database.repository import AsyncSessionLocal, remove_idle_rate_limit_buckets, run
+from src.logger import logger
+from src.settings import Settings
+
+
+def rate_limit_buckets_idle_seconds():
+    """Returns the time after which an unused bucket of any of the rate limits is full again.
+
+    The per IP limits are configured in the environment, so the time is computed from the configured limits.
+    A bucket removed before it's full would start full on the next request and loosen the limit.
+
+    Returns:
+        float: The time the slowest bucket takes to refill from empty, with a margin, in seconds.
+    """
+    limits = [
+        (Settings.rate_limit_submissions_per_ip_burst, Settings.rate_limit_submissions_per_ip_per_minute),
+        (Settings.rate_limit_verifications_per_ip_burst, Settings.rate_limit_verifications_per_ip_per_minute),
+        (
+            Settings.rate_limit_submission_status_per_upload_code_burst,
+            Settings.rate_limit_submission_status_per_upload_code_per_minute,
+        ),
+        (
+            Settings.rate_limit_submissions_per_upload_code_burst,
+            Settings.rate_limit_submissions_per_upload_code_per_minute,
+        ),
+    ]
+    refill_seconds = max(burst / per_minute * 60 for burst, per_minute in limits)
+    return refill_seconds + Settings.rate_limit_buckets_idle_margin_seconds
+
+
+async def remove_idle_rate_limit_buckets_batch(session):
+    """Removes a batch of the rate limit buckets shared in the database which are full again.
+
+    Args:
+        session: The database session.
+
+    Returns:
+        bool: True if the batch was full and more idle buckets may be pending, False otherwise.
+    """
+    removed_count = await run(
+        session,
+        remove_idle_rate_limit_buckets,
+        timedelta(seconds=rate_limit_buckets_idle_seconds()),
+        Settings.rate_limit_buckets_cleanup_batch_size,
+    )
+
+    if removed_count:
+        logger.info(f"Removed idle rate limit buckets: {removed_count}")
+
+    return removed_count == Settings.rate_limit_buckets_cleanup_batch_size
+
+
+def rate_limit_buckets_job():
+    """Returns a job for the scheduler removing the idle rate limit buckets."""
+
+    async def _job():
+        async with AsyncSessionLocal() as session:
+            return await remove_idle_rate_limit_buckets_batch(session)
+
+    return _job
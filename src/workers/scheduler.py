@@ -0,0 +1,44 @@
+import asyncio
+
+from src.logger import logger
+
+
+async def _run_periodically(name, job, interval_seconds):
+    while True:
+        try:
+            has_pending_work = await job()
+        except Exception as e:
+            logger.error(f"Background job {name} failed: {e}")
+            has_pending_work = False
+
+        if not has_pending_work:
+            await asyncio.sleep(interval_seconds)
+
+
+def start_periodic_job(name, job, interval_seconds):
+    """Starts a background task running the job periodically on the event loop.
+
+    The job is an async function returning True when there is more work pending,
+    then it's run again right away, otherwise after the interval. Exceptions raised by the job
+    are logged and don't stop the task.
+
+    Args:
+        name (str): The name of the job for logging.
+        job: The async function to run.
+        interval_seconds (float): The interval between runs.
+
+    Returns:
+        asyncio.Task: The task to cancel on shutdown.
+    """
+    return asyncio.create_task(_run_periodically(name, job, interval_seconds), name=name)
+
+
+async def stop_jobs(tasks):
+    """Cancels the background tasks and waits for them to finish.
+
+    Args:
+        tasks (list): The tasks returned by start_periodic_job.
+    """
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,50 @@
+from src.database.repository import AsyncSessionLocal, expired_submissions, mark_submissions_expired, run
+from src.logger import logger
+from src.settings import Settings
+
+
+async def expire_submissions_batch(session, s3, after=None):
+    """Removes the files of a batch of expired submissions from the storage and marks the submissions as expired.
+
+    Each batch is read and marked in short transactions, and no transaction is open
+    while the files are removed, so a large backlog is processed without long transactions.
+    Submissions which files failed to be removed are not marked and are retried on the next sweep.
+
+    Args:
+        session: The database session.
+        s3: The storage to remove the files from.
+        after (tuple | None): The (created_at, id) key of the last submission of the previous batch.
+
+    Returns:
+        tuple | None: The key of the last submission in the batch if the batch was full, None otherwise.
+    """
+    submissions = await run(session, expired_submissions, after, Settings.submissions_expiry_batch_size)
+    if not submissions:
+        return None
+
+    errors = await s3.remove_files([submission.file_name for submission in submissions])
+
+    expired_ids = [submission.id for submission in submissions if submission.file_name not in errors]
+    if expired_ids:
+        await run(session, mark_submissions_expired, expired_ids)
+
+    logger.info(f"Expired submissions: {len(expired_ids)}, failed to remove files: {len(errors)}")
+
+    if len(submissions) < Settings.submissions_expiry_batch_size:
+        return None
+
+    last_submission = submissions[-1]
+    return (last_submission.created_at, last_submission.id)
+
+
+def submissions_expiry_job(s3):
+    """Returns a job for the scheduler sweeping the expired submissions batch by batch."""
+    after = None
+
+    async def _job():
+        nonlocal after
+        async with AsyncSessionLocal() as session:
+            after = await expire_submissions_batch(session, s3, after)
+        return after is not None
+
+    return _job
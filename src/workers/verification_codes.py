@@ -0,0 +1,57 @@
+import time
+
+from src.database.repository import (
+    AsyncSessionLocal,
+    build_verification_codes_filter,
+    refresh_verification_codes_filter,
+    run,
+    verification_codes_filter_stats,
+)
+from src.logger import logger
+from src.settings import Settings
+
+
+async def maintain_verification_codes_filter(session, built_at=None):
+    """Builds the filter of the live verification codes or refreshes it with the recently added codes.
+
+    The filter is rebuilt after the rebuild interval to prune the codes of the expired submissions,
+    and when it holds more codes than its capacity, which raises the false positive rate.
+
+    Args:
+        session: The database session.
+        built_at (float | None): The monotonic time of the last build, None if the filter is not built yet.
+
+    Returns:
+        float: The monotonic time of the last build.
+    """
+    stats = verification_codes_filter_stats()
+    if (
+        stats is not None
+        and built_at is not None
+        and time.monotonic() - built_at < Settings.verification_codes_filter_rebuild_interval_seconds
+        and stats["estimated_count"] <= stats["capacity"]
+    ):
+        await run(session, refresh_verification_codes_filter)
+        return built_at
+
+    await run(session, build_verification_codes_filter)
+
+    stats = verification_codes_filter_stats()
+    logger.info(
+        f"Built verification codes filter: {stats['estimated_count']} codes, {stats['size_bytes']} bytes, "
+        f"false positive rate: {stats['estimated_false_positive_rate']}"
+    )
+    return time.monotonic()
+
+
+def verification_codes_filter_job():
+    """Returns a job for the scheduler building the filter of the live verification codes and keeping it fresh."""
+    built_at = None
+
+    async def _job():
+        nonlocal built_at
+        async with AsyncSessionLocal() as session:
+            built_at = await maintain_verification_codes_filter(session, built_at)
+        return False
+
+    return _job
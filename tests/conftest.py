@@ -1,8 +1,12 @@
+from contextlib import contextmanager
 import json
 import pytest
 
+import anyio
 from faker import Faker
+from fastapi.testclient import TestClient
 from pydantic import ValidationError
+from sqlalchemy import event
 from unittest.mock import Mock
 
 from src.database.models.base import Base
@@ -10,6 +14,7 @@ from src.database import repository
 from src.settings import Settings
 from src.web import schemas
 from src.web.api import app, get_db, get_s3
+from src.web.rate_limiter import token_buckets
 from src.web.storage.s3 import S3
 
 fake = Faker()
@@ -48,6 +53,57 @@ def db_session():
     session.commit()
     session.close()
 
+    repository.clear_caches()
+    token_buckets.clear()
+
+
+@pytest.fixture(scope="function")
+def async_client(db_session):
+    """Returns a test client serving the requests with the asynchronous session of get_db, as in production.
+
+    The requests run on one event loop, since the connections of the asynchronous pool are bound to it,
+    and the pool is disposed of on the same loop at the end of the test.
+    """
+    del app.dependency_overrides[get_db]
+    client = TestClient(app)
+
+    with anyio.from_thread.start_blocking_portal() as portal:
+        client.portal = portal
+        try:
+            yield client
+        finally:
+            portal.call(repository._async_engine.dispose)
+            client.portal = None
+
+
+@pytest.fixture(scope="function")
+def query_budget():
+    """Returns a context manager asserting that at most max_count queries run within it.
+
+    Usage:
+        with query_budget(3) as statements:
+            client.get("/students")
+    """
+
+    @contextmanager
+    def _query_budget(max_count: int):
+        statements = []
+
+        def _capture(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(repository._engine, "before_cursor_execute", _capture)
+        try:
+            yield statements
+        finally:
+            event.remove(repository._engine, "before_cursor_execute", _capture)
+
+        assert len(statements) <= max_count, f"{len(statements)} queries run over budget of {max_count}:\n" + (
+            "\n".join(statements)
+        )
+
+    return _query_budget
+
 
 @pytest.fixture(scope="function")
 def build_models_student(db_session, build_json_student):
@@ -100,7 +156,11 @@ def s3():
     s3_mock = Mock(spec=S3)
     mock_upload_file_success_json(s3_mock)
     mock_remove_file_success(s3_mock)
+    mock_remove_files_success(s3_mock)
     mock_generate_download_url_success(s3_mock)
+    mock_generate_upload_form_success(s3_mock)
+    mock_file_attributes_success(s3_mock)
+    s3_mock.retry_after_seconds.return_value = 0
 
     app.dependency_overrides[get_s3] = lambda: s3_mock
 
@@ -111,8 +171,7 @@ def s3():
 
 
 def mock_upload_file_success_json(s3_mock, attrs={}):
-    md5 = f'"{fake.md5()}"'  # md5 is wrapped in quotes in the response from S3
-    upd_attrs = {"size_bytes": 1000, "md5": md5, "file_name": f"{fake.word()}.pdf", **attrs}
+    upd_attrs = {"size_bytes": 1000, "md5": fake.md5(), "file_name": f"{fake.word()}.pdf", **attrs}
 
     s3_mock.upload_file.return_value = upd_attrs
 
@@ -130,12 +189,51 @@ def mock_remove_file_success(s3_mock, attrs={}):
     return s3_mock
 
 
+def mock_remove_files_success(s3_mock):
+    s3_mock.remove_files.side_effect = None
+    s3_mock.remove_files.return_value = {}
+    return s3_mock
+
+
+def mock_remove_files_failure(s3_mock, side_effect):
+    s3_mock.remove_files.side_effect = side_effect
+    return s3_mock
+
+
 def mock_generate_download_url_success(s3_mock, attrs={}):
     upd_attrs = {"download_url": fake.uri(), "expires_seconds": Settings.download_url_expires_seconds, **attrs}
     s3_mock.generate_download_url.return_value = upd_attrs
     return s3_mock
 
 
+def mock_generate_upload_form_success(s3_mock, attrs={}):
+    def _generate_upload_form(file_name):
+        return {
+            "url": fake.uri(),
+            "fields": {"key": file_name, "policy": fake.sha256()},
+            "file_name": file_name,
+            "expires_seconds": Settings.upload_url_expires_seconds,
+            **attrs,
+        }
+
+    s3_mock.generate_upload_form.side_effect = _generate_upload_form
+    return s3_mock
+
+
+def mock_file_attributes_success(s3_mock, attrs={}):
+    def _file_attributes(file_name):
+        return {"size_bytes": 1000, "md5": fake.md5(), "file_name": file_name, **attrs}
+
+    s3_mock.file_attributes.side_effect = _file_attributes
+    return s3_mock
+
+
+def mock_file_attributes_not_found(s3_mock):
+    s3_mock.file_attributes.side_effect = None
+    s3_mock.file_attributes.return_value = None
+    return s3_mock
+
+
 # assertions
 
 
@@ -1,17 +1,27 @@
-from io import BytesIO
+import csv
+from io import BytesIO, StringIO
+import json
 import re
 
 from fastapi.testclient import TestClient
+import pytest
 
-from src.database.repository import last_errors
+from src.database import repository
+from src.database.models.file_deletion import FileDeletion
+from src.database.repository import flush_errors, last_errors, report_error
+from src.metrics import http_requests_rate_limited
 from src.settings import Settings
+from src.web import api
 from src.web.api import app
+from src.web.storage.circuit_breaker import CircuitOpenError
 from tests.conftest import (
     dump_schemas_student,
     dump_schemas_submission,
     mock_upload_file_success_json,
     mock_upload_file_failure,
     mock_generate_download_url_success,
+    mock_file_attributes_not_found,
+    mock_file_attributes_success,
 )
 
 client = TestClient(app)
@@ -25,6 +35,56 @@ def test_pass_get_pong():
     assert response.text == "pong"
 
 
+# Metrics route
+
+
+def test_pass_get_metrics(auth_header, build_models_student):
+    student = build_models_student()
+    client.get(f"/submissions/{student.upload_code}")
+    client.get("/submissions/UNKNOWN")
+
+    response = client.get("/metrics", headers=auth_header())
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert 'http_requests_total{method="GET",route="/submissions/{upload_code}",status="200"}' in response.text
+    assert 'http_requests_total{method="GET",route="/submissions/{upload_code}",status="404"}' in response.text
+    assert 'db_operation_duration_seconds_count{function="student_by_upload_code"}' in response.text
+    assert 'http_requests_in_flight{method="GET",route="/metrics"} 1' in response.text
+    assert 'db_pool_connections{state="size"}' in response.text
+
+
+def test_fail_get_metrics_given_invalid_auth_token(auth_header):
+    response = client.get("/metrics", headers=auth_header("invalid_token"))
+    assert response.status_code == 401
+
+
+# Errors route
+
+
+def test_pass_get_errors_page_by_page(auth_header, db_session):
+    for detail in ["error1", "error2", "error1", "error3"]:
+        report_error(detail)
+    flush_errors(db_session)
+
+    response = client.get("/errors", params={"limit": 2}, headers=auth_header())
+
+    assert response.status_code == 200
+    json = response.json()
+    assert [(error["detail"], error["occurrences"]) for error in json["errors"]] == [("error3", 1), ("error2", 1)]
+
+    response = client.get("/errors", params={"limit": 2, "before": json["next_before"]}, headers=auth_header())
+
+    json = response.json()
+    assert [(error["detail"], error["occurrences"]) for error in json["errors"]] == [("error1", 2)]
+    assert json["next_before"] is None
+
+
+def test_fail_get_errors_given_invalid_auth_token(auth_header):
+    response = client.get("/errors", headers=auth_header("invalid_token"))
+    assert response.status_code == 401
+
+
 # Auth route
 
 
@@ -81,6 +141,129 @@ def test_pass_get_students(auth_header, build_models_student, build_models_submi
     ]
 
 
+def test_pass_get_students_given_pages(auth_header, build_models_student, build_models_submission):
+    students = [build_models_student() for _ in range(5)]
+    build_models_submission({"student_id": students[3].id})
+
+    response = client.get("/students", params={"limit": 2}, headers=auth_header())
+
+    assert response.status_code == 200
+    json = response.json()
+    assert json["totals"] == {"total_students": 5, "total_submissions": 1}
+    assert [student["nickname"] for student in json["students"]] == [students[0].nickname, students[1].nickname]
+    assert json["next_after"] == students[1].id
+
+    response = client.get("/students", params={"limit": 2, "after": json["next_after"]}, headers=auth_header())
+    json = response.json()
+    assert [student["nickname"] for student in json["students"]] == [students[2].nickname, students[3].nickname]
+    assert json["students"][1]["has_submission"] is True
+
+    response = client.get("/students", params={"limit": 2, "after": json["next_after"]}, headers=auth_header())
+    json = response.json()
+    assert [student["nickname"] for student in json["students"]] == [students[4].nickname]
+    assert json["next_after"] is None
+
+
+def test_fail_get_students_given_limit_above_maximum(auth_header):
+    response = client.get("/students", params={"limit": Settings.students_page_max_limit + 1}, headers=auth_header())
+    assert response.status_code == 422
+
+
+# the export streams from its own asynchronous session, the one of the tests is not used
+
+
+def test_pass_get_students_export(async_client, auth_header, build_models_student, build_models_submission):
+    student1 = build_models_student()
+    student2 = build_models_student()
+    submission = build_models_submission({"student_id": student2.id})
+
+    response = async_client.get("/students/export", headers=auth_header())
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert [json.loads(line) for line in response.text.splitlines()] == [
+        {
+            "nickname": student1.nickname,
+            "first_name": student1.first_name,
+            "last_name": student1.last_name,
+            "has_submission": False,
+            "last_submission": None,
+        },
+        {
+            "nickname": student2.nickname,
+            "first_name": student2.first_name,
+            "last_name": student2.last_name,
+            "has_submission": True,
+            "last_submission": {
+                "verification_code": submission.verification_code,
+                "created_at": submission.created_at.isoformat(),
+            },
+        },
+    ]
+
+
+def test_pass_get_students_export_given_csv_format(
+    async_client, auth_header, build_models_student, build_models_submission
+):
+    student1 = build_models_student()
+    student2 = build_models_student()
+    submission = build_models_submission({"student_id": student2.id})
+
+    response = async_client.get("/students/export", params={"format": "csv"}, headers=auth_header())
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    assert list(csv.reader(StringIO(response.text))) == [
+        [
+            "nickname",
+            "first_name",
+            "last_name",
+            "has_submission",
+            "last_submission_created_at",
+            "last_submission_verification_code",
+        ],
+        [student1.nickname, student1.first_name, student1.last_name, "False", "", ""],
+        [
+            student2.nickname,
+            student2.first_name,
+            student2.last_name,
+            "True",
+            submission.created_at.isoformat(),
+            submission.verification_code,
+        ],
+    ]
+
+
+def test_fail_get_students_export_given_invalid_auth_token(auth_header):
+    response = client.get("/students/export", headers=auth_header("invalid_token"))
+    assert response.status_code == 401
+
+
+@pytest.mark.parametrize("students_count", [1, 20])
+def test_pass_get_students_within_query_budget(
+    auth_header, query_budget, build_models_student, build_models_submission, students_count
+):
+    for _ in range(students_count):
+        student = build_models_student()
+        build_models_submission({"student_id": student.id})
+        build_models_submission({"student_id": student.id})
+
+    with query_budget(3):
+        response = client.get("/students", headers=auth_header())
+
+    assert response.status_code == 200
+    assert re.fullmatch(r'db;dur=[\d.]+;desc="2 queries"', response.headers["Server-Timing"])
+
+
+def test_pass_get_student_by_nickname_within_query_budget(auth_header, query_budget, build_models_student):
+    nickname = build_models_student().nickname
+
+    with query_budget(1):
+        response = client.get(f"/students/{nickname}", headers=auth_header())
+
+    assert response.status_code == 200
+
+
 def test_fail_get_students_given_invalid_auth_token(auth_header):
     response = client.get("/students", headers=auth_header("invalid_token"))
     assert response.status_code == 401
@@ -167,6 +350,96 @@ def test_fail_post_students_given_duplicate_nickname(auth_header, build_models_s
     assert "duplicate key" in response.json()["detail"]
 
 
+def test_pass_post_students_bulk(auth_header, build_models_student, build_json_student):
+    existing_student = build_models_student()
+    student1 = build_json_student()
+    student2 = build_json_student()
+
+    response = client.post(
+        "/students/bulk",
+        headers=auth_header(),
+        json=[
+            student1,
+            build_json_student({"nickname": existing_student.nickname}),
+            build_json_student({"nickname": "not-alpha"}),
+            student2,
+            build_json_student({"nickname": student1["nickname"]}),
+        ],
+    )
+
+    assert response.status_code == 200
+    json = response.json()
+
+    assert json["totals"] == {"created": 2, "duplicate": 2, "invalid": 1}
+    assert [(row["row"], row["status"]) for row in json["rows"]] == [
+        (1, "created"),
+        (2, "duplicate"),
+        (3, "invalid"),
+        (4, "created"),
+        (5, "duplicate"),
+    ]
+    assert re.match(r"^[A-Z0-9]{8}$", json["rows"][0]["upload_code"])
+    assert json["rows"][2]["errors"] == ["nickname: Value error, nickname must contain only alphanumeric characters"]
+
+    response = client.get(f"/students/{student2['nickname']}", headers=auth_header())
+    assert response.json()["upload_code"] == json["rows"][3]["upload_code"]
+
+
+def test_pass_post_students_bulk_given_csv_file(auth_header, build_json_student):
+    students = [build_json_student(), build_json_student({"email": "invalid"})]
+    file = StringIO()
+    writer = csv.DictWriter(file, fieldnames=["nickname", "first_name", "last_name", "email"])
+    writer.writeheader()
+    writer.writerows(students)
+
+    response = client.post(
+        "/students/bulk", headers=auth_header(), files={"file": ("students.csv", file.getvalue(), "text/csv")}
+    )
+
+    assert response.status_code == 200
+    json = response.json()
+
+    assert json["totals"] == {"created": 1, "duplicate": 0, "invalid": 1}
+    assert json["rows"][0]["nickname"] == students[0]["nickname"]
+    assert json["rows"][1]["status"] == "invalid"
+
+
+def test_pass_post_students_bulk_given_non_string_nicknames(auth_header, build_json_student):
+    response = client.post(
+        "/students/bulk",
+        headers=auth_header(),
+        json=[build_json_student({"nickname": 123}), build_json_student({"nickname": ["x"]}), "not a student"],
+    )
+
+    assert response.status_code == 200
+    json = response.json()
+
+    assert json["totals"] == {"created": 0, "duplicate": 0, "invalid": 3}
+    assert [(row["status"], row["nickname"]) for row in json["rows"]] == [
+        ("invalid", None),
+        ("invalid", None),
+        ("invalid", None),
+    ]
+
+
+def test_fail_post_students_bulk_given_not_an_array(auth_header, build_json_student):
+    response = client.post("/students/bulk", headers=auth_header(), json=build_json_student())
+    assert response.status_code == 422
+
+
+def test_fail_post_students_bulk_given_too_many_students(monkeypatch, auth_header, build_json_student):
+    monkeypatch.setattr(Settings, "students_bulk_max_count", 1)
+
+    response = client.post("/students/bulk", headers=auth_header(), json=[build_json_student(), build_json_student()])
+
+    assert response.status_code == 413
+
+
+def test_fail_post_students_bulk_given_invalid_auth_token(auth_header, build_json_student):
+    response = client.post("/students/bulk", headers=auth_header("invalid_token"), json=[build_json_student()])
+    assert response.status_code == 401
+
+
 # Submission route
 
 
@@ -213,7 +486,7 @@ def test_pass_post_submissions(build_models_student, s3):
     assert submission.verification_code == last_submission["verification_code"]
 
 
-def test_pass_post_submissions_given_it_removes_the_previous_one(build_models_student, s3):
+def test_pass_post_submissions_given_it_removes_the_previous_one(db_session, build_models_student, s3):
     student = build_models_student()
 
     file = BytesIO(b"some file data")
@@ -239,9 +512,11 @@ def test_pass_post_submissions_given_it_removes_the_previous_one(build_models_st
 
     assert response.status_code == 201
 
-    # assert that it removed the frist uploaded file from s3
+    # assert that it queued the frist uploaded file for removal from s3
 
-    assert s3.remove_file.call_args[0][0] == "first_uploaded_file.txt"
+    file_deletions = db_session.query(FileDeletion).all()
+    assert [file_deletion.file_name for file_deletion in file_deletions] == ["first_uploaded_file.txt"]
+    assert not s3.remove_file.called
 
 
 def test_fail_post_submissions_given_nonexisting_upload_code(s3):
@@ -277,9 +552,9 @@ def test_fail_post_submissions_given_more_than_5_submissions_per_student(build_m
     file = BytesIO(b"some file data")
     file.name = "some_filename.txt"
 
-    mock_upload_file_success_json(s3, {"file_name": file.name})
-
-    for _ in range(5):
+    for index in range(5):
+        # each upload is stored under a new file name
+        mock_upload_file_success_json(s3, {"file_name": f"{index}_{file.name}"})
         response = client.post(
             f"/submissions/{student.upload_code}",
             files={"file": (file.name, file, "application/octet-stream")},
@@ -314,6 +589,7 @@ def test_fail_post_submissions_given_s3_network_error(db_session, build_models_s
 
     # It should collect the error for further analysis
 
+    flush_errors(db_session)
     errors = last_errors(db_session, 1)
     assert len(errors) == 1
 
@@ -321,6 +597,245 @@ def test_fail_post_submissions_given_s3_network_error(db_session, build_models_s
     assert last_error.detail == "failed to connect to s3"
 
 
+def test_fail_post_submissions_given_s3_circuit_open(db_session, build_models_student, s3):
+    student = build_models_student()
+    s3.retry_after_seconds.return_value = 12.5
+
+    response = client.post(
+        f"/submissions/{student.upload_code}",
+        files={"file": ("some_filename.txt", BytesIO(b"some file data"), "application/octet-stream")},
+    )
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "13"
+    assert s3.upload_file.call_count == 0
+
+
+def test_fail_post_submissions_given_s3_circuit_opened_during_upload(db_session, build_models_student, s3):
+    student = build_models_student()
+    mock_upload_file_failure(s3, CircuitOpenError(30))
+
+    response = client.post(
+        f"/submissions/{student.upload_code}",
+        files={"file": ("some_filename.txt", BytesIO(b"some file data"), "application/octet-stream")},
+    )
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "30"
+    flush_errors(db_session)
+    assert last_errors(db_session, 1) == []
+
+
+# Submission route - direct upload to the storage
+
+
+def test_pass_post_submissions_upload_url(build_models_student, s3):
+    student = build_models_student()
+
+    response = client.post(f"/submissions/{student.upload_code}/upload_url", params={"filename": "answers.pdf"})
+
+    assert response.status_code == 200
+    json = response.json()
+
+    assert re.match(rf"^{student.id}/[a-f0-9-]{{36}}\.pdf$", json["file_name"])
+    assert json["fields"]["key"] == json["file_name"]
+    assert json["expires_seconds"] == Settings.upload_url_expires_seconds
+
+    assert s3.generate_upload_form.call_args[0][0] == json["file_name"]
+
+
+def test_fail_post_submissions_upload_url_given_nonexisting_upload_code():
+    response = client.post("/submissions/nonexisting_upload_code/upload_url", params={"filename": "answers.pdf"})
+    assert response.status_code == 404
+
+
+def test_fail_post_submissions_upload_url_given_more_than_5_submissions_per_student(
+    build_models_student, build_models_submission
+):
+    student = build_models_student()
+    for _ in range(5):
+        build_models_submission({"student_id": student.id})
+
+    response = client.post(f"/submissions/{student.upload_code}/upload_url", params={"filename": "answers.pdf"})
+
+    assert response.status_code == 422
+    assert "Submissions count limit exceeded" in response.json()["detail"]
+
+
+@pytest.mark.parametrize("backend", ["memory", "postgres"])
+def test_fail_post_submissions_upload_url_given_rate_limit_exceeded_for_upload_code(
+    build_models_student, monkeypatch, backend
+):
+    monkeypatch.setattr(Settings, "rate_limit_backend", backend)
+    student = build_models_student()
+    other_student = build_models_student()
+
+    for _ in range(Settings.rate_limit_submissions_per_upload_code_burst):
+        response = client.post(f"/submissions/{student.upload_code}/upload_url", params={"filename": "answers.pdf"})
+        assert response.status_code == 200
+
+    response = client.post(f"/submissions/{student.upload_code}/upload_url", params={"filename": "answers.pdf"})
+
+    assert response.status_code == 429
+    # a token is added every 10 seconds
+    assert response.headers["Retry-After"] == "10"
+
+    response = client.post(f"/submissions/{other_student.upload_code}/upload_url", params={"filename": "answers.pdf"})
+    assert response.status_code == 200
+
+
+def test_pass_post_submissions_upload_url_given_rate_limit_backend_off(build_models_student, monkeypatch):
+    monkeypatch.setattr(Settings, "rate_limit_backend", "off")
+    student = build_models_student()
+
+    for _ in range(Settings.rate_limit_submissions_per_upload_code_burst + 1):
+        response = client.post(f"/submissions/{student.upload_code}/upload_url", params={"filename": "answers.pdf"})
+        assert response.status_code == 200
+
+
+def test_pass_get_submissions_has_larger_rate_limit_than_uploads(build_models_student):
+    student = build_models_student()
+
+    for _ in range(Settings.rate_limit_submission_status_per_upload_code_burst):
+        assert client.get(f"/submissions/{student.upload_code}").status_code == 200
+
+    response = client.get(f"/submissions/{student.upload_code}")
+    assert response.status_code == 429
+
+    # the uploads have a separate bucket
+    response = client.post(f"/submissions/{student.upload_code}/upload_url", params={"filename": "answers.pdf"})
+    assert response.status_code == 200
+
+
+def test_pass_post_submissions_upload_completion(build_models_student, s3):
+    student = build_models_student()
+    file_name = f"{student.id}/uploaded_file.pdf"
+
+    mock_file_attributes_success(s3, {"size_bytes": 2000})
+
+    response = client.post(f"/submissions/{student.upload_code}/upload_completion", json={"file_name": file_name})
+
+    assert response.status_code == 201
+    json = response.json()
+
+    assert json["uploads_available"] == Settings.submissions_per_student_count_limit - 1
+    assert json["last_submission"]["size_bytes"] == 2000
+
+    # assert that it created a submission record for the uploaded file
+
+    assert s3.file_attributes.call_args[0][0] == file_name
+    assert len(student.submissions) == 1
+    assert student.submissions[0].file_name == file_name
+
+
+def test_fail_post_submissions_upload_completion_given_limit_reached_while_uploading(
+    db_session, build_models_student, build_models_submission, s3
+):
+    student = build_models_student()
+    file_name = f"{student.id}/uploaded_file.pdf"
+
+    def _file_attributes(file_name):
+        # other submissions of the student are completed meanwhile
+        for _ in range(Settings.submissions_per_student_count_limit):
+            build_models_submission({"student_id": student.id})
+        return {"size_bytes": 1000, "md5": "0" * 32, "file_name": file_name}
+
+    s3.file_attributes.side_effect = _file_attributes
+
+    response = client.post(f"/submissions/{student.upload_code}/upload_completion", json={"file_name": file_name})
+
+    assert response.status_code == 422
+    assert "Submissions count limit exceeded" in response.json()["detail"]
+
+    # the uploaded file is queued for removal from S3
+    assert db_session.query(FileDeletion).filter(FileDeletion.file_name == file_name).count() == 1
+
+
+def test_fail_post_submissions_upload_completion_given_file_of_another_student(build_models_student, s3):
+    student = build_models_student()
+    other_student = build_models_student()
+
+    response = client.post(
+        f"/submissions/{student.upload_code}/upload_completion",
+        json={"file_name": f"{other_student.id}/uploaded_file.pdf"},
+    )
+
+    assert response.status_code == 404
+    assert not s3.file_attributes.called
+
+
+def test_fail_post_submissions_upload_completion_given_already_submitted_file(build_models_student, s3):
+    student = build_models_student()
+    file_name = f"{student.id}/uploaded_file.pdf"
+
+    response = client.post(f"/submissions/{student.upload_code}/upload_completion", json={"file_name": file_name})
+    assert response.status_code == 201
+
+    response = client.post(f"/submissions/{student.upload_code}/upload_completion", json={"file_name": file_name})
+    assert response.status_code == 404
+
+
+def test_fail_post_submissions_upload_completion_given_file_submitted_by_concurrent_request(
+    db_session, build_models_student, s3, monkeypatch
+):
+    student = build_models_student()
+    file_name = f"{student.id}/uploaded_file.pdf"
+    # both completions pass the check before either of them adds the submission
+    monkeypatch.setattr(api, "is_file_submitted", lambda session, file_name: False)
+
+    response = client.post(f"/submissions/{student.upload_code}/upload_completion", json={"file_name": file_name})
+    assert response.status_code == 201
+
+    response = client.post(f"/submissions/{student.upload_code}/upload_completion", json={"file_name": file_name})
+    assert response.status_code == 404
+
+    db_session.expire_all()
+    assert [submission.file_name for submission in student.submissions] == [file_name]
+    assert student.submissions_count == 1
+    assert db_session.query(FileDeletion).count() == 0
+
+
+def test_fail_post_submissions_upload_completion_given_submission_failed_to_be_added(
+    db_session, build_models_student, s3, monkeypatch
+):
+    student = build_models_student()
+    file_name = f"{student.id}/uploaded_file.pdf"
+
+    def _add_submission(session, **attrs):
+        raise ConnectionError("connection lost")
+
+    monkeypatch.setattr(api, "add_submission", _add_submission)
+
+    response = client.post(f"/submissions/{student.upload_code}/upload_completion", json={"file_name": file_name})
+
+    assert response.status_code == 500
+    assert [file_deletion.file_name for file_deletion in db_session.query(FileDeletion)] == [file_name]
+
+
+def test_fail_post_submissions_upload_completion_given_file_missing_in_storage(build_models_student, s3):
+    student = build_models_student()
+
+    mock_file_attributes_not_found(s3)
+
+    response = client.post(
+        f"/submissions/{student.upload_code}/upload_completion", json={"file_name": f"{student.id}/missing.pdf"}
+    )
+
+    assert response.status_code == 404
+
+
+def test_fail_post_submissions_upload_completion_given_file_larger_than_3mb(build_models_student, s3):
+    student = build_models_student()
+    file_name = f"{student.id}/uploaded_file.pdf"
+
+    mock_file_attributes_success(s3, {"size_bytes": Settings.submission_max_size_bytes + 1})
+
+    response = client.post(f"/submissions/{student.upload_code}/upload_completion", json={"file_name": file_name})
+
+    assert response.status_code == 413
+    assert s3.remove_file.call_args[0][0] == file_name
+
+
 # Submission route - current state
 
 
@@ -367,6 +882,125 @@ def test_pass_get_verifications_download_url(build_models_student, build_models_
     assert s3.generate_download_url.call_args[0][0] == submission.file_name
 
 
+def test_fail_get_verifications_download_url_given_expired_submission(
+    db_session, build_models_student, build_models_submission
+):
+    student = build_models_student()
+    submission = build_models_submission({"student_id": student.id})
+    submission.expired_at = submission.created_at
+    db_session.commit()
+
+    response = client.get(f"/verifications/{submission.verification_code}/download_url")
+    assert response.status_code == 404
+
+
 def test_fail_get_verifications_download_url_given_nonexistent_verification_code():
     response = client.get("/verifications/nonexistent_code/download_url")
     assert response.status_code == 404
+
+
+def test_fail_get_verifications_download_url_given_rate_limit_exceeded_for_client_ip(monkeypatch):
+    monkeypatch.setattr(Settings, "rate_limit_client_ip_header", "Fly-Client-IP")
+    headers = {"Fly-Client-IP": "10.0.0.1"}
+    route = "/verifications/{verification_code}/download_url"
+    rate_limited_count = http_requests_rate_limited.value("GET", route, "ip")
+
+    for _ in range(Settings.rate_limit_verifications_per_ip_burst):
+        assert client.get("/verifications/nonexistent_code/download_url", headers=headers).status_code == 404
+
+    response = client.get("/verifications/other_code/download_url", headers=headers)
+
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "1"
+    assert http_requests_rate_limited.value("GET", route, "ip") == rate_limited_count + 1
+
+    response = client.get("/verifications/other_code/download_url", headers={"Fly-Client-IP": "10.0.0.2"})
+    assert response.status_code == 404
+
+
+# Routes served by the asynchronous session, as in production
+
+
+def test_pass_post_submissions_given_async_session(async_client, db_session, build_models_student, s3):
+    student = build_models_student()
+    file = BytesIO(b"some file data")
+    file.name = "some_filename.txt"
+
+    mock_upload_file_success_json(s3, {"file_name": "first_uploaded_file.txt"})
+    response = async_client.post(
+        f"/submissions/{student.upload_code}", files={"file": (file.name, file, "application/octet-stream")}
+    )
+    assert response.status_code == 201
+
+    mock_upload_file_success_json(s3, {"file_name": "second_uploaded_file.txt"})
+    response = async_client.post(
+        f"/submissions/{student.upload_code}", files={"file": (file.name, file, "application/octet-stream")}
+    )
+    assert response.status_code == 201
+    assert response.json()["uploads_available"] == Settings.submissions_per_student_count_limit - 2
+
+    db_session.refresh(student)
+    assert [submission.file_name for submission in student.submissions] == [
+        "first_uploaded_file.txt",
+        "second_uploaded_file.txt",
+    ]
+    file_deletions = db_session.query(FileDeletion).all()
+    assert [file_deletion.file_name for file_deletion in file_deletions] == ["first_uploaded_file.txt"]
+
+
+def test_fail_post_submissions_given_more_than_5_submissions_per_student_and_async_session(
+    async_client, build_models_student, s3
+):
+    student = build_models_student()
+
+    for index in range(Settings.submissions_per_student_count_limit):
+        response = async_client.post(
+            f"/submissions/{student.upload_code}/upload_completion", json={"file_name": f"{student.id}/{index}.pdf"}
+        )
+        assert response.status_code == 201
+
+    response = async_client.post(
+        f"/submissions/{student.upload_code}/upload_completion", json={"file_name": f"{student.id}/last.pdf"}
+    )
+
+    assert response.status_code == 422
+    assert "Submissions count limit exceeded" in response.json()["detail"]
+
+    # the session is rolled back, so the next request is served
+    response = async_client.get(f"/submissions/{student.upload_code}")
+    assert response.status_code == 200
+    assert response.json()["uploads_available"] == 0
+
+
+def test_pass_get_students_export_returns_the_connection_after_the_stream(
+    async_client, auth_header, monkeypatch, build_models_student
+):
+    monkeypatch.setattr(Settings, "students_export_batch_size", 2)
+    students = [build_models_student() for _ in range(5)]
+
+    with async_client.stream("GET", "/students/export", headers=auth_header()) as response:
+        lines = [json.loads(line) for line in response.iter_lines()]
+        # the session of the stream returns the connection once the last batch is sent
+        assert repository._async_engine.pool.checkedout() == 0
+
+    assert response.status_code == 200
+    assert [line["nickname"] for line in lines] == [student.nickname for student in students]
+
+
+@pytest.mark.parametrize("backend", ["memory", "postgres"])
+def test_fail_post_submissions_upload_url_given_rate_limit_exceeded_and_async_session(
+    async_client, build_models_student, monkeypatch, backend
+):
+    monkeypatch.setattr(Settings, "rate_limit_backend", backend)
+    student = build_models_student()
+
+    for _ in range(Settings.rate_limit_submissions_per_upload_code_burst):
+        response = async_client.post(
+            f"/submissions/{student.upload_code}/upload_url", params={"filename": "answers.pdf"}
+        )
+        assert response.status_code == 200
+
+    response = async_client.post(f"/submissions/{student.upload_code}/upload_url", params={"filename": "answers.pdf"})
+
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "10"
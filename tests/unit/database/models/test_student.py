@@ -4,3 +4,16 @@ import re
 def test_pass_student_has_upload_key_generated(build_models_student):
     student = build_models_student()
     assert re.match(r"^[A-Z0-9]{8}$", student.upload_code)
+
+
+def test_pass_student_has_last_submission(db_session, build_models_student, build_models_submission):
+    student = build_models_student()
+    assert student.has_submission is False
+    assert student.last_submission is None
+
+    build_models_submission({"student_id": student.id})
+    submission = build_models_submission({"student_id": student.id})
+
+    db_session.expire_all()
+    assert student.has_submission is True
+    assert student.last_submission.id == submission.id
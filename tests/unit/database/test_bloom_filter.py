@@ -0,0 +1,35 @@
+from src.database.bloom_filter import BloomFilter
+
+
+def test_pass_bloom_filter_contains_added_items():
+    bloom_filter = BloomFilter(1000, 0.01)
+    items = [f"CODE{index}" for index in range(1000)]
+
+    for item in items:
+        bloom_filter.add(item)
+
+    assert all(item in bloom_filter for item in items)
+
+
+def test_pass_bloom_filter_false_positive_rate_at_capacity():
+    bloom_filter = BloomFilter(1000, 0.01)
+    for index in range(1000):
+        bloom_filter.add(f"CODE{index}")
+
+    false_positives = sum(f"OTHER{index}" in bloom_filter for index in range(10000))
+
+    assert false_positives < 10000 * 0.02
+
+
+def test_pass_bloom_filter_stats():
+    bloom_filter = BloomFilter(1000, 0.01)
+    for index in range(500):
+        bloom_filter.add(f"CODE{index}")
+
+    stats = bloom_filter.stats()
+
+    assert stats["capacity"] == 1000
+    assert stats["size_bytes"] == 1199
+    assert stats["hash_count"] == 7
+    assert 450 <= stats["estimated_count"] <= 550
+    assert stats["estimated_false_positive_rate"] < 0.01
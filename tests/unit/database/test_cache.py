@@ -0,0 +1,54 @@
+from src.database import cache
+from src.database.cache import TTLCache
+
+
+def test_pass_ttl_cache_get_and_put():
+    ttl_cache = TTLCache(max_size=2, ttl_seconds=10, none_ttl_seconds=1)
+
+    assert ttl_cache.get("key") is TTLCache.MISSING
+
+    ttl_cache.put("key", "value")
+    ttl_cache.put("not_found", None)
+
+    assert ttl_cache.get("key") == "value"
+    assert ttl_cache.get("not_found") is None
+    assert ttl_cache.stats() == {"size": 2, "hits": 2, "misses": 1, "hit_rate": 0.667}
+
+
+def test_pass_ttl_cache_evicts_least_recently_used():
+    ttl_cache = TTLCache(max_size=2, ttl_seconds=10, none_ttl_seconds=1)
+    ttl_cache.put("key1", 1)
+    ttl_cache.put("key2", 2)
+    ttl_cache.get("key1")
+
+    ttl_cache.put("key3", 3)
+
+    assert ttl_cache.get("key2") is TTLCache.MISSING
+    assert ttl_cache.get("key1") == 1
+    assert ttl_cache.get("key3") == 3
+
+
+def test_pass_ttl_cache_expires_entries(monkeypatch):
+    now = 1000.0
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now)
+    ttl_cache = TTLCache(max_size=2, ttl_seconds=10, none_ttl_seconds=1)
+    ttl_cache.put("key", "value")
+    ttl_cache.put("not_found", None)
+
+    now += 5
+    assert ttl_cache.get("key") == "value"
+    assert ttl_cache.get("not_found") is TTLCache.MISSING
+
+    now += 5
+    assert ttl_cache.get("key") is TTLCache.MISSING
+    assert ttl_cache.stats()["size"] == 0
+
+
+def test_pass_ttl_cache_invalidate():
+    ttl_cache = TTLCache(max_size=2, ttl_seconds=10, none_ttl_seconds=1)
+    ttl_cache.put("key", "value")
+
+    ttl_cache.invalidate("key")
+    ttl_cache.invalidate("missing_key")
+
+    assert ttl_cache.get("key") is TTLCache.MISSING
@@ -0,0 +1,23 @@
+from src.database.error_buffer import ErrorBuffer
+
+
+def test_pass_error_buffer_counts_identical_details():
+    error_buffer = ErrorBuffer(max_size=10)
+
+    error_buffer.add("error1")
+    error_buffer.add("error2")
+    error_buffer.add("error1", 2)
+
+    assert error_buffer.drain() == ({"error1": 3, "error2": 1}, 0)
+    assert error_buffer.drain() == ({}, 0)
+
+
+def test_pass_error_buffer_drops_new_details_given_full():
+    error_buffer = ErrorBuffer(max_size=1)
+
+    error_buffer.add("error1")
+    error_buffer.add("error2")
+    error_buffer.add("error1")
+    error_buffer.add("error3")
+
+    assert error_buffer.drain() == ({"error1": 2}, 2)
@@ -0,0 +1,53 @@
+import asyncio
+
+from sqlalchemy import text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from src.database import repository
+from src.database.pool import PoolWaits, TimedNullPool
+from src.settings import Settings
+
+
+def test_pass_pool_waits_stats():
+    waits = PoolWaits()
+    waits.add(0.1)
+    waits.add(0.3)
+
+    assert waits.stats() == {"waits": 2, "wait_seconds_total": 0.4, "wait_seconds_avg": 0.2, "wait_seconds_max": 0.3}
+
+
+def test_pass_pool_status_reports_checkouts():
+    async def _query():
+        async with repository.AsyncSessionLocal() as session:
+            await session.execute(text("SELECT 1"))
+            status = repository.pool_status()
+        await repository._async_engine.dispose()
+        return status
+
+    waits_before = repository.pool_status()["waits"]
+
+    status = asyncio.run(_query())
+
+    assert status["size"] == Settings.database_pool_size
+    assert status["checked_out"] == 1
+    assert status["waits"] == waits_before + 1
+
+
+def test_pass_async_engine_options_given_pgbouncer(monkeypatch):
+    monkeypatch.setattr(Settings, "database_pgbouncer", True)
+    engine = create_async_engine(
+        make_url(Settings.database_url).set(drivername="postgresql+asyncpg"), **repository._async_engine_options()
+    )
+
+    async def _query():
+        async with engine.connect() as connection:
+            # the statements are prepared under unique names on every execution
+            for _ in range(2):
+                assert (await connection.execute(text("SELECT 1"))).scalar() == 1
+        await engine.dispose()
+
+    asyncio.run(_query())
+
+    assert isinstance(engine.pool, TimedNullPool)
+    assert engine.pool.waits.count == 1
@@ -0,0 +1,206 @@
+"""Checks the query plans of the repository functions against a seeded dataset.
+
+Each repository function is called with the statements sent to the database captured,
+then every captured statement is explained, and the test fails if the plan scans a table sequentially.
+The tables are seeded with enough rows for the planner to prefer indexes wherever they exist.
+"""
+
+from contextlib import contextmanager
+from datetime import timedelta
+import inspect
+
+import pytest
+from sqlalchemy import event, text
+
+from src.database import repository
+from src.database.bloom_filter import BloomFilter
+
+# functions that don't query the database, or read all the rows by design
+_NOT_EXPLAINED = {
+    "run",
+    "end_transaction",
+    "clear_caches",
+    "students_cache_stats",
+    "pool_status",
+    "student_summaries_stream",
+    "build_verification_codes_filter",
+    "verification_codes_filter_stats",
+    "report_error",
+}
+
+# statements that count all the rows, or compare a batch of generated codes with all the used ones by design
+_FULL_SCANS = ["count(*)", "INSERT INTO pooled_codes"]
+
+_SEED = [
+    """
+    INSERT INTO students (nickname, first_name, last_name, email, upload_code, created_at, updated_at)
+    SELECT 'student' || g, 'First', 'Last', 'student' || g || '@example.com', 'CODE' || g, now(), now()
+    FROM generate_series(1, 10000) g
+    """,
+    # two submissions per student spread over a month, the ones older than 3 days are expired
+    """
+    INSERT INTO submissions
+        (student_id, file_name, md5, size_bytes, verification_code, expired_at, created_at, updated_at)
+    SELECT students.id, 'file' || g || '_' || students.id, md5(''), 1000, 'v' || g || '_' || students.id,
+           CASE WHEN students.id % 30 > 3 THEN now() END,
+           now() - (students.id % 30) * interval '1 day', now()
+    FROM students, generate_series(1, 2) g
+    """,
+    """
+    UPDATE students SET submissions_count = 2,
+        last_submission_id = (SELECT max(id) FROM submissions WHERE submissions.student_id = students.id)
+    """,
+    """
+    INSERT INTO errors (detail, created_at, updated_at)
+    SELECT 'error ' || g, now() - g * interval '1 minute', now() FROM generate_series(1, 10000) g
+    """,
+    # a few files are due for removal, the rest are postponed after failed attempts
+    """
+    INSERT INTO file_deletions (file_name, attempts, next_attempt_at, created_at, updated_at)
+    SELECT 'deleted' || g, 1, now() + CASE WHEN g % 100 = 0 THEN interval '-1 minute' ELSE interval '1 hour' END,
+           now(), now()
+    FROM generate_series(1, 10000) g
+    """,
+    """
+    INSERT INTO pooled_codes (kind, code, created_at, updated_at)
+    SELECT kind, 'POOLED' || g, now(), now()
+    FROM unnest(ARRAY['upload_code', 'verification_code']) kind, generate_series(1, 10000) g
+    """,
+    # buckets of the rate limits used over the last day
+    """
+    INSERT INTO rate_limit_buckets (key, tokens, created_at, updated_at)
+    SELECT 'POST /submissions/{upload_code} ip=10.0.' || g / 256 || '.' || g % 256, 0,
+           now() - g * interval '10 seconds', now() - g * interval '10 seconds'
+    FROM generate_series(1, 10000) g
+    """,
+    "ANALYZE",
+]
+
+
+@pytest.fixture(scope="function")
+def seeded_db(db_session):
+    for statement in _SEED:
+        db_session.execute(text(statement))
+    db_session.commit()
+
+    return db_session.execute(text("SELECT id FROM students WHERE nickname = 'student5000'")).scalar()
+
+
+@contextmanager
+def _captured_statements():
+    statements = []
+
+    def _capture(conn, cursor, statement, parameters, context, executemany):
+        # statements executed with many parameter sets are explained with the first one
+        statements.append((statement, parameters[0] if isinstance(parameters, (list, tuple)) else parameters))
+
+    event.listen(repository._engine, "before_cursor_execute", _capture)
+    try:
+        yield statements
+    finally:
+        event.remove(repository._engine, "before_cursor_execute", _capture)
+
+
+def _seq_scans(node):
+    if node["Node Type"] == "Seq Scan":
+        yield node["Relation Name"]
+    for child in node.get("Plans", []):
+        yield from _seq_scans(child)
+
+
+def _settle_claimed_file_deletions(session):
+    file_deletions = repository.claim_file_deletions(session, 1000)
+    repository.settle_file_deletions(session, file_deletions, {file_deletions[0].file_name: "InternalError"})
+
+
+def _flush_errors(session):
+    repository.report_error("error")
+    repository.flush_errors(session)
+
+
+def _refresh_verification_codes_filter(session):
+    repository._live_verification_codes = BloomFilter(1000, 0.01)
+    repository.refresh_verification_codes_filter(session)
+
+
+_CASES = {
+    "add_student": lambda session, student_id: repository.add_student(
+        session, nickname="new", first_name="First", last_name="Last", email="new@example.com"
+    ),
+    "add_students": lambda session, student_id: repository.add_students(
+        session,
+        [
+            {"nickname": "student5000", "first_name": "First", "last_name": "Last", "email": "new@example.com"},
+            {"nickname": "new", "first_name": "First", "last_name": "Last", "email": "new@example.com"},
+        ],
+    ),
+    "student_list_summary": lambda session, student_id: repository.student_list_summary(session, 100, student_id),
+    "student_by_nickname": lambda session, student_id: repository.student_by_nickname(session, "student5000"),
+    "student_by_upload_code": lambda session, student_id: repository.student_by_upload_code(session, "CODE5000"),
+    "student_submissions": lambda session, student_id: repository.student_by_nickname(
+        session, "student5000"
+    ).submissions,
+    "add_submission": lambda session, student_id: repository.add_submission(
+        session, student_id=student_id, file_name="new.pdf", md5="0" * 32, size_bytes=1000
+    ),
+    "queue_file_deletion": lambda session, student_id: repository.queue_file_deletion(session, "new.pdf"),
+    "queue_orphaned_files": lambda session, student_id: repository.queue_orphaned_files(
+        session, [f"file1_{student_id}", "deleted1", f"{student_id}/orphaned.pdf"]
+    ),
+    "is_file_submitted": lambda session, student_id: repository.is_file_submitted(session, f"file1_{student_id}"),
+    "submission_by_verification_code": lambda session, student_id: repository.submission_by_verification_code(
+        session, f"v1_{student_id}"
+    ),
+    "refresh_verification_codes_filter": lambda session, student_id: _refresh_verification_codes_filter(session),
+    "submission_file_name_by_verification_code": lambda session, student_id: (
+        repository.submission_file_name_by_verification_code(session, f"v1_{student_id}")
+    ),
+    "expired_submissions": lambda session, student_id: repository.expired_submissions(session, None, 500),
+    "mark_submissions_expired": lambda session, student_id: repository.mark_submissions_expired(
+        session, list(range(student_id, student_id + 100))
+    ),
+    "claim_file_deletions": lambda session, student_id: repository.claim_file_deletions(session, 1000),
+    "settle_file_deletions": lambda session, student_id: _settle_claimed_file_deletions(session),
+    "refill_code_pool": lambda session, student_id: repository.refill_code_pool(session, "upload_code", 1000),
+    "last_errors": lambda session, student_id: repository.last_errors(session, 10, 5000),
+    "flush_errors": lambda session, student_id: _flush_errors(session),
+    "remove_old_errors": lambda session, student_id: repository.remove_old_errors(session, timedelta(days=3), 1000),
+    "take_rate_limit_token": lambda session, student_id: repository.take_rate_limit_token(
+        session, "POST /submissions/{upload_code} ip=10.0.0.1", 10, 0.1
+    ),
+    "remove_idle_rate_limit_buckets": lambda session, student_id: repository.remove_idle_rate_limit_buckets(
+        session, timedelta(hours=12), 1000
+    ),
+}
+
+
+def test_pass_query_plans_cover_repository_functions():
+    functions = {
+        name
+        for name, function in inspect.getmembers(repository, inspect.isfunction)
+        if function.__module__ == repository.__name__ and not name.startswith("_")
+    }
+    assert functions - _NOT_EXPLAINED <= _CASES.keys()
+
+
+def test_pass_query_plans_have_no_seq_scans(db_session, seeded_db):
+    seq_scans = {}
+
+    for case, call in _CASES.items():
+        repository.clear_caches()
+        with _captured_statements() as statements:
+            call(db_session, seeded_db)
+        db_session.rollback()
+        assert statements, f"No statements captured for {case}"
+
+        for statement, parameters in statements:
+            if any(full_scan in statement for full_scan in _FULL_SCANS):
+                continue
+
+            plan = db_session.connection().exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}", parameters).scalar()
+            relations = list(_seq_scans(plan[0]["Plan"]))
+            if relations:
+                seq_scans.setdefault(case, []).append((relations, statement))
+        db_session.rollback()
+
+    assert seq_scans == {}
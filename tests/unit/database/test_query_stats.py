@@ -0,0 +1,29 @@
+import logging
+
+from sqlalchemy import text
+
+from src.database.query_stats import tracked_queries
+from src.settings import Settings
+
+
+def test_pass_tracked_queries_counts_queries(db_session):
+    with tracked_queries() as stats:
+        for _ in range(3):
+            db_session.execute(text("SELECT 1"))
+        db_session.execute(text("SELECT 2"))
+
+    db_session.execute(text("SELECT 1"))
+
+    assert stats.count == 4
+    assert stats.seconds > 0
+    assert stats.repeated_statements(3) == {"SELECT 1": 3}
+
+
+def test_pass_slow_query_is_logged_with_parameters(db_session, monkeypatch, caplog):
+    monkeypatch.setattr(Settings, "slow_query_seconds", 0)
+
+    with caplog.at_level(logging.WARNING):
+        db_session.execute(text("SELECT :value"), {"value": "slow"})
+
+    assert "Slow query took" in caplog.text
+    assert "'value': 'slow'" in caplog.text
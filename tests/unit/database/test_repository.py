@@ -0,0 +1,257 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import update
+
+from src.database import repository
+from src.database.models.file_deletion import FileDeletion
+from src.database.models.rate_limit_bucket import RateLimitBucket
+from src.database.models.student import Student
+from src.database.models.submission import Submission
+from src.settings import Settings
+
+
+def test_pass_add_submission_counts_it_for_the_student(db_session, build_models_student, build_models_submission):
+    student = build_models_student()
+
+    submission = build_models_submission({"student_id": student.id})
+
+    db_session.expire_all()
+    student = db_session.get(Student, student.id)
+    assert student.submissions_count == 1
+    assert student.last_submission_id == submission.id
+    assert student.uploads_available == Settings.submissions_per_student_count_limit - 1
+    assert db_session.query(FileDeletion).count() == 0
+
+
+def test_pass_add_submission_queues_the_previous_file_for_deletion(
+    db_session, build_models_student, build_models_submission
+):
+    student = build_models_student()
+    build_models_submission({"student_id": student.id, "file_name": "file1.pdf"})
+
+    submission = build_models_submission({"student_id": student.id, "file_name": "file2.pdf"})
+
+    assert student.submissions_count == 2
+    assert student.last_submission_id == submission.id
+    assert [file_deletion.file_name for file_deletion in db_session.query(FileDeletion).all()] == ["file1.pdf"]
+
+
+def test_fail_add_submission_given_submissions_count_limit_reached(
+    db_session, build_models_student, build_models_submission
+):
+    student = build_models_student()
+    for _ in range(Settings.submissions_per_student_count_limit):
+        last_submission = build_models_submission({"student_id": student.id})
+
+    with pytest.raises(repository.SubmissionsCountLimitError):
+        build_models_submission({"student_id": student.id})
+
+    db_session.expire_all()
+    student = db_session.get(Student, student.id)
+    assert student.submissions_count == Settings.submissions_per_student_count_limit
+    assert student.last_submission_id == last_submission.id
+    assert db_session.query(Submission).count() == Settings.submissions_per_student_count_limit
+
+
+def test_fail_add_submission_given_file_submitted_already(db_session, build_models_student, build_models_submission):
+    student = build_models_student()
+    submission = build_models_submission({"student_id": student.id, "file_name": f"{student.id}/answers.pdf"})
+
+    with pytest.raises(repository.SubmissionFileExistsError):
+        build_models_submission({"student_id": student.id, "file_name": submission.file_name})
+
+    db_session.expire_all()
+    student = db_session.get(Student, student.id)
+    assert student.submissions_count == 1
+    assert student.last_submission_id == submission.id
+    assert db_session.query(FileDeletion).count() == 0
+
+
+def test_fail_add_submission_given_database_error_rolls_back(
+    db_session, build_models_student, build_models_submission, monkeypatch
+):
+    student = build_models_student()
+
+    def _claim_codes(session, kind, count):
+        raise ConnectionError()
+
+    monkeypatch.setattr(repository, "_claim_codes", _claim_codes)
+    with pytest.raises(ConnectionError):
+        build_models_submission({"student_id": student.id})
+    monkeypatch.undo()
+
+    # the count is undone and the session is usable
+    db_session.expire_all()
+    assert db_session.get(Student, student.id).submissions_count == 0
+
+
+def test_pass_queue_orphaned_files_skips_submitted_and_queued_files(
+    db_session, build_models_student, build_models_submission
+):
+    student = build_models_student()
+    submission = build_models_submission({"student_id": student.id})
+    repository.queue_file_deletion(db_session, "queued.pdf")
+
+    assert repository.queue_orphaned_files(db_session, [submission.file_name, "queued.pdf", "orphaned.pdf"]) == [
+        "orphaned.pdf"
+    ]
+    assert repository.queue_orphaned_files(db_session, ["orphaned.pdf"]) == []
+
+
+def test_pass_student_by_upload_code_is_cached(db_session, build_models_student):
+    student = build_models_student()
+
+    record = repository.student_by_upload_code(db_session, student.upload_code)
+    db_session.execute(update(Student).where(Student.id == student.id).values(submissions_count=3))
+    db_session.commit()
+
+    assert repository.student_by_upload_code(db_session, student.upload_code) is record
+    assert record.id == student.id
+    assert record.uploads_available == Settings.submissions_per_student_count_limit
+    assert record.has_submission is False
+    assert repository.students_cache_stats()["hits"] == 1
+
+
+def test_pass_student_by_upload_code_caches_not_found_until_student_added(
+    db_session, monkeypatch, build_models_student
+):
+    monkeypatch.setattr(repository, "_claim_codes", lambda session, kind, count: ["NEWCODE1"])
+    assert repository.student_by_upload_code(db_session, "NEWCODE1") is None
+    assert repository.student_by_upload_code(db_session, "NEWCODE1") is None
+    assert repository.students_cache_stats()["hits"] == 1
+
+    student = build_models_student()
+
+    assert repository.student_by_upload_code(db_session, "NEWCODE1").id == student.id
+
+
+def test_pass_add_submission_replaces_cached_student(db_session, build_models_student, build_models_submission):
+    student = build_models_student()
+    repository.student_by_upload_code(db_session, student.upload_code)
+
+    submission = build_models_submission({"student_id": student.id})
+
+    record = repository.student_by_upload_code(db_session, student.upload_code)
+    assert record.submissions_count == 1
+    assert record.last_submission.verification_code == submission.verification_code
+    assert repository.students_cache_stats()["hits"] == 1
+
+
+def test_pass_submission_by_verification_code_rejects_code_missing_in_filter(
+    db_session, build_models_student, build_models_submission
+):
+    student = build_models_student()
+    repository.build_verification_codes_filter(db_session)
+
+    submission = build_models_submission({"student_id": student.id})
+
+    assert repository.submission_by_verification_code(db_session, submission.verification_code).id == submission.id
+    assert repository.submission_by_verification_code(db_session, "MISSING") is None
+    stats = repository.verification_codes_filter_stats()
+    assert stats["passed"] == 1
+    assert stats["rejected"] + stats["false_positives"] == 1
+
+
+def test_pass_refresh_verification_codes_filter_adds_recent_codes(
+    db_session, monkeypatch, build_models_student, build_models_submission
+):
+    student = build_models_student()
+    repository.build_verification_codes_filter(db_session)
+    # the submission is added as by another process
+    monkeypatch.setattr(repository, "_live_verification_codes", None)
+    submission = build_models_submission({"student_id": student.id})
+    monkeypatch.undo()
+    assert submission.verification_code not in repository._live_verification_codes
+
+    repository.refresh_verification_codes_filter(db_session)
+
+    assert submission.verification_code in repository._live_verification_codes
+
+
+def test_pass_refresh_verification_codes_filter_adds_codes_created_while_refreshes_failed(
+    db_session, monkeypatch, build_models_student, build_models_submission
+):
+    student = build_models_student()
+    repository.build_verification_codes_filter(db_session)
+    monkeypatch.setattr(repository, "_live_verification_codes", None)
+    submission = build_models_submission({"student_id": student.id})
+    monkeypatch.undo()
+    # the refreshes failed for longer than the window since the submission was created
+    db_session.execute(
+        update(Submission)
+        .where(Submission.id == submission.id)
+        .values(created_at=datetime.now() - timedelta(minutes=5))
+    )
+    db_session.commit()
+    repository._verification_codes_refreshed_at -= timedelta(minutes=10)
+
+    repository.refresh_verification_codes_filter(db_session)
+
+    assert submission.verification_code in repository._live_verification_codes
+
+
+def test_pass_build_verification_codes_filter_prunes_expired_codes(
+    db_session, build_models_student, build_models_submission
+):
+    student = build_models_student()
+    submission = build_models_submission({"student_id": student.id})
+    repository.mark_submissions_expired(db_session, [submission.id])
+
+    repository.build_verification_codes_filter(db_session)
+
+    assert submission.verification_code not in repository._live_verification_codes
+
+
+def test_pass_submission_file_name_by_verification_code_is_cached_until_expired(
+    db_session, build_models_student, build_models_submission
+):
+    student = build_models_student()
+    submission = build_models_submission({"student_id": student.id})
+
+    assert repository.submission_file_name_by_verification_code(db_session, submission.verification_code) == (
+        submission.file_name
+    )
+    assert repository.submission_file_name_by_verification_code(db_session, submission.verification_code) == (
+        submission.file_name
+    )
+    assert repository._file_names_by_verification_code.stats()["hits"] == 1
+
+    repository.mark_submissions_expired(db_session, [submission.id])
+
+    assert repository.submission_file_name_by_verification_code(db_session, submission.verification_code) is None
+
+
+def test_pass_take_rate_limit_token_allows_burst_then_rejects_until_refilled(db_session):
+    key = "POST /submissions/{upload_code} ip=10.0.0.1"
+
+    assert [repository.take_rate_limit_token(db_session, key, 2, 0.5) for _ in range(2)] == [0, 0]
+    assert repository.take_rate_limit_token(db_session, key, 2, 0.5) == pytest.approx(2, abs=0.1)
+
+    db_session.execute(
+        update(RateLimitBucket)
+        .where(RateLimitBucket.key == key)
+        .values(updated_at=RateLimitBucket.updated_at - timedelta(seconds=3))
+    )
+    db_session.commit()
+
+    assert repository.take_rate_limit_token(db_session, key, 2, 0.5) == 0
+    assert repository.take_rate_limit_token(db_session, key, 2, 0.5) == pytest.approx(1, abs=0.1)
+    # the bucket of another key is full
+    assert repository.take_rate_limit_token(db_session, "POST /submissions/{upload_code} ip=10.0.0.2", 2, 0.5) == 0
+
+
+def test_pass_remove_idle_rate_limit_buckets_keeps_recently_used(db_session):
+    for key in ["idle1", "idle2", "used"]:
+        repository.take_rate_limit_token(db_session, key, 2, 1)
+    db_session.execute(
+        update(RateLimitBucket)
+        .where(RateLimitBucket.key.like("idle%"))
+        .values(updated_at=datetime.now() - timedelta(hours=1))
+    )
+    db_session.commit()
+
+    assert repository.remove_idle_rate_limit_buckets(db_session, timedelta(minutes=10), 1) == 1
+    assert repository.remove_idle_rate_limit_buckets(db_session, timedelta(minutes=10), 1000) == 1
+
+    assert [bucket.key for bucket in db_session.query(RateLimitBucket)] == ["used"]
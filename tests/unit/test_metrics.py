@@ -0,0 +1,63 @@
+import asyncio
+
+from src.metrics import Registry, timed
+
+
+def test_pass_registry_renders_counters_and_gauges():
+    registry = Registry()
+    requests = registry.counter("requests_total", "Requests.", ("route",))
+    in_flight = registry.gauge("in_flight", "In flight.")
+    registry.gauge_function("pool", "Pool.", ("state",), lambda: {("size",): 5})
+
+    requests.inc("/a")
+    requests.inc("/a")
+    requests.inc('/"b"')
+    in_flight.inc()
+    in_flight.inc()
+    in_flight.dec()
+
+    assert registry.render() == (
+        "# HELP requests_total Requests.\n"
+        "# TYPE requests_total counter\n"
+        'requests_total{route="/a"} 2\n'
+        'requests_total{route="/\\"b\\""} 1\n'
+        "# HELP in_flight In flight.\n"
+        "# TYPE in_flight gauge\n"
+        "in_flight 1\n"
+        "# HELP pool Pool.\n"
+        "# TYPE pool gauge\n"
+        'pool{state="size"} 5\n'
+    )
+
+
+def test_pass_registry_renders_cumulative_histogram_buckets():
+    registry = Registry()
+    duration = registry.histogram("duration_seconds", "Duration.", ("function",), buckets=(0.1, 1))
+
+    for value in [0.05, 0.1, 0.5, 2.0]:
+        duration.observe("f", value=value)
+
+    assert duration.count("f") == 4
+    assert registry.render().splitlines()[2:] == [
+        'duration_seconds_bucket{function="f",le="0.1"} 2',
+        'duration_seconds_bucket{function="f",le="1"} 3',
+        'duration_seconds_bucket{function="f",le="+Inf"} 4',
+        'duration_seconds_sum{function="f"} 2.65',
+        'duration_seconds_count{function="f"} 4',
+    ]
+
+
+def test_pass_timed_observes_failed_calls():
+    registry = Registry()
+    duration = registry.histogram("duration_seconds", "Duration.", ("method",))
+
+    @timed(duration, "fail")
+    async def _fail():
+        raise ValueError()
+
+    try:
+        asyncio.run(_fail())
+    except ValueError:
+        pass
+
+    assert duration.count("fail") == 1
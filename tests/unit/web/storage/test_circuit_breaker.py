@@ -0,0 +1,82 @@
+import time
+
+import pytest
+
+from src.web.storage.circuit_breaker import CircuitBreaker, CircuitOpenError, RetryBudget
+
+
+@pytest.fixture(scope="function")
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_pass_circuit_breaker_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout_seconds=30)
+
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.before_call()
+
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+    clock[0] += 10
+    with pytest.raises(CircuitOpenError) as error:
+        breaker.before_call()
+    assert error.value.retry_after_seconds == 20
+
+
+def test_pass_circuit_breaker_lets_one_probe_through_when_half_open(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout_seconds=30)
+    breaker.record_failure()
+
+    clock[0] += 30
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    breaker.before_call()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.retry_after_seconds() == 0
+
+
+def test_pass_circuit_breaker_opens_again_given_probe_failed(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout_seconds=30)
+    for _ in range(3):
+        breaker.record_failure()
+
+    clock[0] += 30
+    breaker.before_call()
+    breaker.record_failure()
+
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.retry_after_seconds() == 30
+
+
+def test_pass_circuit_breaker_lets_another_probe_through_given_probe_released(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout_seconds=30)
+    assert breaker.before_call() is False
+    breaker.record_failure()
+
+    clock[0] += 30
+    assert breaker.before_call() is True
+    breaker.release_probe()
+
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.before_call() is True
+
+
+def test_pass_retry_budget_limits_retries_to_share_of_calls():
+    budget = RetryBudget(ratio=0.5, max_tokens=2)
+
+    assert [budget.withdraw() for _ in range(3)] == [True, True, False]
+
+    budget.deposit()
+    assert budget.withdraw() is False
+    budget.deposit()
+    assert budget.withdraw() is True
@@ -0,0 +1,40 @@
+import hashlib
+from io import BytesIO
+
+import pytest
+
+from src.web.storage.measured_stream import MeasuredStream, UploadSizeError
+
+
+def test_pass_measured_stream_computes_md5_and_size():
+    data = b"some file data" * 1000
+    stream = MeasuredStream(BytesIO(data), max_size_bytes=len(data))
+
+    while stream.read(1024):
+        pass
+
+    assert stream.size_bytes == len(data)
+    assert stream.md5 == hashlib.md5(data).hexdigest()
+
+
+def test_pass_measured_stream_given_contents_read_again_after_seek():
+    data = b"some file data" * 1000
+    stream = MeasuredStream(BytesIO(data), max_size_bytes=len(data))
+
+    stream.read(100)
+    stream.seek(0)
+    stream.read()
+    stream.seek(50)
+    stream.read()
+
+    assert stream.size_bytes == len(data)
+    assert stream.md5 == hashlib.md5(data).hexdigest()
+
+
+def test_fail_measured_stream_given_contents_larger_than_max_size():
+    stream = MeasuredStream(BytesIO(b"some file data"), max_size_bytes=10)
+
+    assert stream.read(10) == b"some file "
+
+    with pytest.raises(UploadSizeError):
+        stream.read(10)
@@ -0,0 +1,167 @@
+import asyncio
+import hashlib
+from io import BytesIO
+import threading
+import time
+
+from botocore.exceptions import ClientError, EndpointConnectionError
+import pytest
+
+from src.metrics import s3_operation_duration
+from src.settings import Settings
+from src.web.storage.circuit_breaker import CircuitBreaker, CircuitOpenError, RetryBudget
+from src.web.storage.s3 import S3
+
+
+class _UploadedFile:
+    def __init__(self, content: bytes):
+        self.filename = "answer.pdf"
+        self.file = BytesIO(content)
+
+
+@pytest.fixture(scope="function")
+def storage():
+    storage = S3(endpoint_url="http://localhost:9000")
+    yield storage
+    storage.close()
+
+
+@pytest.fixture(scope="function")
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_pass_generate_download_url_returns_cached_url_with_remaining_time(storage, clock):
+    first = asyncio.run(storage.generate_download_url("file.pdf"))
+
+    clock[0] += 100
+    second = asyncio.run(storage.generate_download_url("file.pdf"))
+
+    assert first["expires_seconds"] == Settings.download_url_expires_seconds
+    assert second == {
+        "download_url": first["download_url"],
+        "expires_seconds": Settings.download_url_expires_seconds - 100,
+    }
+    assert "file.pdf" in first["download_url"]
+
+
+def test_pass_generate_download_url_signs_again_given_cached_url_expiring_soon(storage, clock, monkeypatch):
+    signed = []
+    monkeypatch.setattr(
+        storage._s3_client, "generate_presigned_url", lambda *args, **kwargs: signed.append(kwargs) or len(signed)
+    )
+    asyncio.run(storage.generate_download_url("file.pdf"))
+
+    clock[0] += Settings.download_url_expires_seconds - Settings.download_url_min_expires_seconds
+    second = asyncio.run(storage.generate_download_url("file.pdf"))
+
+    assert second == {"download_url": 2, "expires_seconds": Settings.download_url_expires_seconds}
+
+
+def test_pass_generate_download_url_given_file_removed(storage, monkeypatch):
+    monkeypatch.setattr(storage._s3_client, "delete_object", lambda **kwargs: {})
+    monkeypatch.setattr(storage._s3_client, "delete_objects", lambda **kwargs: {})
+    signed = []
+    monkeypatch.setattr(
+        storage._s3_client, "generate_presigned_url", lambda *args, **kwargs: signed.append(kwargs) or len(signed)
+    )
+
+    asyncio.run(storage.generate_download_url("file1.pdf"))
+    asyncio.run(storage.generate_download_url("file2.pdf"))
+    asyncio.run(storage.remove_file("file1.pdf"))
+    asyncio.run(storage.remove_files(["file2.pdf"]))
+    asyncio.run(storage.generate_download_url("file1.pdf"))
+    asyncio.run(storage.generate_download_url("file2.pdf"))
+
+    assert [kwargs["Params"]["Key"] for kwargs in signed] == ["file1.pdf", "file2.pdf", "file1.pdf", "file2.pdf"]
+
+
+def test_pass_upload_file_retries_transient_failure(storage, monkeypatch):
+    monkeypatch.setattr(Settings, "aws_s3_retry_backoff_seconds", 0)
+    bodies = []
+
+    def _put_object(Body, **kwargs):
+        bodies.append(Body.read())
+        if len(bodies) == 1:
+            raise EndpointConnectionError(endpoint_url="http://localhost:9000")
+        return {}
+
+    monkeypatch.setattr(storage._s3_client, "put_object", _put_object)
+
+    response = asyncio.run(storage.upload_file(_UploadedFile(b"some file data")))
+
+    assert bodies == [b"some file data", b"some file data"]
+    assert response["md5"] == hashlib.md5(b"some file data").hexdigest()
+
+
+def test_fail_remove_file_given_circuit_open(storage, monkeypatch):
+    monkeypatch.setattr(Settings, "aws_s3_retry_backoff_seconds", 0)
+    monkeypatch.setattr(storage, "_retry_budget", RetryBudget(ratio=0.1, max_tokens=2))
+    calls = []
+
+    def _delete_object(**kwargs):
+        calls.append(kwargs)
+        raise EndpointConnectionError(endpoint_url="http://localhost:9000")
+
+    monkeypatch.setattr(storage._s3_client, "delete_object", _delete_object)
+
+    for _ in range(Settings.aws_s3_breaker_failure_threshold):
+        with pytest.raises(EndpointConnectionError):
+            asyncio.run(storage.remove_file("file.pdf"))
+
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(storage.remove_file("file.pdf"))
+    assert storage.retry_after_seconds() > 0
+    # the retries stop when the budget is spent
+    assert len(calls) == Settings.aws_s3_breaker_failure_threshold + 2
+
+
+def test_fail_remove_file_given_client_error_doesnt_open_circuit(storage, monkeypatch):
+    def _delete_object(**kwargs):
+        raise ClientError({"Error": {"Code": "AccessDenied"}, "ResponseMetadata": {"HTTPStatusCode": 403}}, "Delete")
+
+    monkeypatch.setattr(storage._s3_client, "delete_object", _delete_object)
+
+    for _ in range(Settings.aws_s3_breaker_failure_threshold + 1):
+        with pytest.raises(ClientError):
+            asyncio.run(storage.remove_file("file.pdf"))
+
+    assert storage.retry_after_seconds() == 0
+
+
+def test_pass_remove_file_releases_probe_given_cancelled(storage, monkeypatch):
+    monkeypatch.setattr(storage, "_breaker", CircuitBreaker(failure_threshold=1, reset_timeout_seconds=0))
+    storage._breaker.record_failure()
+    responded = threading.Event()
+    monkeypatch.setattr(storage._s3_client, "delete_object", lambda **kwargs: responded.wait(5))
+
+    async def _remove_files():
+        # the probe is cancelled as on a client disconnect
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(storage.remove_file("file1.pdf"), timeout=0.05)
+        responded.set()
+
+        # the next call is the probe instead of being rejected
+        await storage.remove_file("file2.pdf")
+
+    asyncio.run(_remove_files())
+
+    assert storage._breaker.state == CircuitBreaker.CLOSED
+
+
+def test_pass_guarded_calls_are_timed_by_their_method(storage, monkeypatch):
+    monkeypatch.setattr(storage._s3_client, "delete_object", lambda **kwargs: {})
+    monkeypatch.setattr(storage._s3_client, "head_bucket", lambda **kwargs: {})
+    remove_file_count = s3_operation_duration.count("remove_file")
+    warm_up_count = s3_operation_duration.count("warm_up")
+
+    asyncio.run(storage.remove_file("file.pdf"))
+
+    assert s3_operation_duration.count("remove_file") == remove_file_count + 1
+    assert s3_operation_duration.count("warm_up") == warm_up_count
+
+    asyncio.run(storage.warm_up())
+
+    assert s3_operation_duration.count("warm_up") == warm_up_count + 1
@@ -0,0 +1,59 @@
+from collections import Counter
+import os
+import threading
+import time
+
+from fastapi.testclient import TestClient
+
+from src.settings import Settings
+from src.web.api import app
+from src.web.profiler import ProfilingMiddleware, StackSampler, write_profile
+
+client = TestClient(ProfilingMiddleware(app))
+
+
+def _busy_loop(seconds):
+    finish_at = time.monotonic() + seconds
+    while time.monotonic() < finish_at:
+        pass
+
+
+def test_pass_stack_sampler_collects_stacks_of_thread():
+    sampler = StackSampler(threading.get_ident(), 0.001)
+
+    sampler.start()
+    _busy_loop(0.1)
+    stacks = sampler.stop()
+
+    assert sum(stacks.values()) > 10
+    assert any("_busy_loop (test_profiler.py" in stack for stack in stacks)
+    assert all(stack.startswith("MainThread;") for stack in stacks)
+
+
+def test_pass_write_profile_removes_oldest_profiles(tmp_path):
+    for index in range(3):
+        write_profile(tmp_path, f"{index}.collapsed", Counter({"main;f": index + 1}), max_count=2)
+        os.utime(tmp_path / f"{index}.collapsed", (index, index))
+
+    assert sorted(os.listdir(tmp_path)) == ["1.collapsed", "2.collapsed"]
+    assert (tmp_path / "2.collapsed").read_text() == "main;f 3\n"
+
+
+def test_pass_profiling_middleware_writes_profile_of_request(tmp_path, monkeypatch, auth_header):
+    monkeypatch.setattr(Settings, "profiles_dir", str(tmp_path))
+
+    response = client.get("/students", headers={**auth_header(), "X-Profile": Settings.auth_token})
+
+    assert response.status_code == 200
+    assert os.listdir(tmp_path) == [response.headers["X-Profile"]]
+    assert "_GET_students_" in response.headers["X-Profile"]
+
+
+def test_pass_profiling_middleware_given_invalid_token(tmp_path, monkeypatch, auth_header):
+    monkeypatch.setattr(Settings, "profiles_dir", str(tmp_path))
+
+    response = client.get("/students", headers={**auth_header(), "X-Profile": "invalid_token"})
+
+    assert response.status_code == 200
+    assert "X-Profile" not in response.headers
+    assert os.listdir(tmp_path) == []
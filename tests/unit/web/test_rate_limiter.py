@@ -0,0 +1,56 @@
+import time
+
+import pytest
+
+from src.web.rate_limiter import TokenBuckets
+
+
+@pytest.fixture(scope="function")
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_pass_token_buckets_allow_burst_then_reject_until_refilled(clock):
+    buckets = TokenBuckets(max_size=10)
+
+    assert [buckets.take("key", 3, 0.5) for _ in range(3)] == [0, 0, 0]
+    assert buckets.take("key", 3, 0.5) == 2
+
+    clock[0] += 1.5
+    assert buckets.take("key", 3, 0.5) == pytest.approx(0.5)
+
+    clock[0] += 0.5
+    assert buckets.take("key", 3, 0.5) == 0
+    assert buckets.take("key", 3, 0.5) == 2
+
+
+def test_pass_token_buckets_refill_up_to_capacity(clock):
+    buckets = TokenBuckets(max_size=10)
+    buckets.take("key", 2, 1)
+
+    clock[0] += 60
+    assert [buckets.take("key", 2, 1) for _ in range(3)] == [0, 0, 1]
+
+
+def test_pass_token_buckets_are_separate_by_key(clock):
+    buckets = TokenBuckets(max_size=10)
+
+    assert buckets.take("key1", 1, 1) == 0
+    assert buckets.take("key2", 1, 1) == 0
+    assert buckets.take("key1", 1, 1) == 1
+
+
+def test_pass_token_buckets_drop_least_recently_used(clock):
+    buckets = TokenBuckets(max_size=2)
+    buckets.take("key1", 1, 1)
+    buckets.take("key2", 1, 1)
+    buckets.take("key1", 1, 1)
+
+    buckets.take("key3", 1, 1)
+
+    assert len(buckets) == 2
+    # the recently used bucket is still empty, the dropped one starts full
+    assert buckets.take("key1", 1, 1) > 0
+    assert buckets.take("key2", 1, 1) == 0
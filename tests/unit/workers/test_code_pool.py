@@ -0,0 +1,76 @@
+import asyncio
+from itertools import cycle
+
+from src.database import repository
+from src.database.models.pooled_code import PooledCode
+from src.settings import Settings
+from src.workers.code_pool import refill_code_pool_batch
+
+
+def _pooled_codes(db_session, kind):
+    return [
+        code for (code,) in db_session.query(PooledCode.code).filter(PooledCode.kind == kind).order_by(PooledCode.id)
+    ]
+
+
+def test_pass_refill_code_pool_batch(db_session, monkeypatch):
+    monkeypatch.setattr(Settings, "code_pool_batch_size", 3)
+    monkeypatch.setattr(Settings, "code_pool_size", 5)
+
+    assert asyncio.run(refill_code_pool_batch(db_session)) is True
+    assert len(_pooled_codes(db_session, "upload_code")) == 3
+    assert len(_pooled_codes(db_session, "verification_code")) == 3
+
+    assert asyncio.run(refill_code_pool_batch(db_session)) is False
+    assert len(_pooled_codes(db_session, "upload_code")) == 6
+
+    # the pool is full
+    assert asyncio.run(refill_code_pool_batch(db_session)) is False
+    assert len(_pooled_codes(db_session, "upload_code")) == 6
+
+
+def test_pass_refill_code_pool_batch_given_used_and_pooled_codes(db_session, monkeypatch, build_models_student):
+    student = build_models_student()
+    codes = cycle([student.upload_code, "AAAAAAAA", "AAAAAAAA", "BBBBBBBB"])
+    monkeypatch.setitem(
+        repository._POOLED_CODE_KINDS, "upload_code", (lambda: next(codes), repository.Student.upload_code)
+    )
+    monkeypatch.setattr(Settings, "code_pool_batch_size", 4)
+
+    asyncio.run(refill_code_pool_batch(db_session))
+
+    assert _pooled_codes(db_session, "upload_code") == ["AAAAAAAA", "BBBBBBBB"]
+
+
+def test_pass_add_student_claims_pooled_upload_code(db_session, monkeypatch, build_models_student):
+    monkeypatch.setattr(Settings, "code_pool_batch_size", 2)
+    asyncio.run(refill_code_pool_batch(db_session))
+    pooled_codes = _pooled_codes(db_session, "upload_code")
+
+    student1 = build_models_student()
+    student2 = build_models_student()
+    student3 = build_models_student()
+
+    assert [student1.upload_code, student2.upload_code] == pooled_codes
+    # the code is generated when the pool is empty
+    assert student3.upload_code not in pooled_codes
+    assert _pooled_codes(db_session, "upload_code") == []
+
+
+def test_pass_add_student_skips_used_and_pooled_codes_given_empty_pool(db_session, monkeypatch, build_models_student):
+    student = build_models_student()
+    db_session.add(PooledCode(kind="upload_code", code="AAAAAAAA"))
+    db_session.commit()
+    # the pooled code is locked by a concurrent transaction
+    locking_session = repository.SessionLocal()
+    locking_session.query(PooledCode).with_for_update().all()
+    codes = cycle([student.upload_code, "AAAAAAAA", "BBBBBBBB"])
+    monkeypatch.setitem(
+        repository._POOLED_CODE_KINDS, "upload_code", (lambda: next(codes), repository.Student.upload_code)
+    )
+
+    try:
+        assert build_models_student().upload_code == "BBBBBBBB"
+    finally:
+        locking_session.rollback()
+        locking_session.close()
@@ -0,0 +1,50 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from sqlalchemy import update
+
+from src.database import repository
+from src.database.models.error import Error
+from src.settings import Settings
+from src.workers.errors import flush_errors_batch
+
+
+def test_pass_flush_errors_batch_persists_buffered_errors(db_session):
+    repository.report_error("error1")
+    repository.report_error("error1")
+
+    assert asyncio.run(flush_errors_batch(db_session)) is False
+
+    assert [(error.detail, error.occurrences) for error in repository.last_errors(db_session, 10)] == [("error1", 2)]
+    # the buffer is empty after the flush
+    asyncio.run(flush_errors_batch(db_session))
+    assert db_session.query(Error).count() == 1
+
+
+def test_pass_flush_errors_batch_removes_old_errors(db_session, monkeypatch):
+    monkeypatch.setattr(Settings, "errors_retention_batch_size", 2)
+    for detail in ["old1", "old2", "old3", "new"]:
+        repository.report_error(detail)
+    repository.flush_errors(db_session)
+    db_session.execute(
+        update(Error).where(Error.detail.like("old%")).values(created_at=datetime.now() - timedelta(days=31))
+    )
+    db_session.commit()
+
+    assert asyncio.run(flush_errors_batch(db_session)) is True
+    assert asyncio.run(flush_errors_batch(db_session)) is False
+
+    assert [error.detail for error in repository.last_errors(db_session, 10)] == ["new"]
+
+
+def test_pass_flush_errors_puts_errors_back_given_insert_failure(db_session, monkeypatch):
+    repository.report_error("error1")
+    monkeypatch.setattr(db_session, "execute", lambda *args, **kwargs: (_ for _ in ()).throw(ConnectionError()))
+
+    try:
+        repository.flush_errors(db_session)
+    except ConnectionError:
+        pass
+    monkeypatch.undo()
+
+    assert repository.flush_errors(db_session) == 1
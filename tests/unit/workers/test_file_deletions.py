@@ -0,0 +1,58 @@
+import asyncio
+from datetime import datetime
+
+from src.database.models.file_deletion import FileDeletion
+from src.workers.file_deletions import remove_file_deletions_batch
+from tests.conftest import mock_remove_files_failure
+
+
+def _queue_file_deletions(db_session, file_names):
+    db_session.add_all([FileDeletion(file_name=file_name) for file_name in file_names])
+    db_session.commit()
+
+
+def test_pass_remove_file_deletions_batch(db_session, s3):
+    _queue_file_deletions(db_session, ["file1.pdf", "file2.pdf"])
+
+    has_pending_work = asyncio.run(remove_file_deletions_batch(db_session, s3))
+
+    assert has_pending_work is False
+    assert s3.remove_files.call_args[0][0] == ["file1.pdf", "file2.pdf"]
+    assert db_session.query(FileDeletion).count() == 0
+
+
+def test_pass_remove_file_deletions_batch_given_no_queued_files(db_session, s3):
+    assert asyncio.run(remove_file_deletions_batch(db_session, s3)) is False
+    assert not s3.remove_files.called
+
+
+def test_pass_remove_file_deletions_batch_given_failed_file_is_retried_later(db_session, s3):
+    _queue_file_deletions(db_session, ["file1.pdf", "file2.pdf"])
+    s3.remove_files.return_value = {"file2.pdf": "InternalError: We encountered an internal error"}
+
+    asyncio.run(remove_file_deletions_batch(db_session, s3))
+
+    file_deletions = db_session.query(FileDeletion).all()
+    assert len(file_deletions) == 1
+
+    file_deletion = file_deletions[0]
+    assert file_deletion.file_name == "file2.pdf"
+    assert file_deletion.attempts == 1
+    assert file_deletion.last_error == "InternalError: We encountered an internal error"
+    assert file_deletion.next_attempt_at > datetime.now()
+
+    # it's not claimed again before the backoff ends
+    s3.remove_files.reset_mock()
+    asyncio.run(remove_file_deletions_batch(db_session, s3))
+    assert not s3.remove_files.called
+
+
+def test_pass_remove_file_deletions_batch_given_storage_error(db_session, s3):
+    _queue_file_deletions(db_session, ["file1.pdf"])
+    mock_remove_files_failure(s3, ConnectionError("failed to connect to s3"))
+
+    asyncio.run(remove_file_deletions_batch(db_session, s3))
+
+    file_deletion = db_session.query(FileDeletion).one()
+    assert file_deletion.attempts == 1
+    assert file_deletion.last_error == "failed to connect to s3"
@@ -0,0 +1,42 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from src.database import repository
+from src.database.models.file_deletion import FileDeletion
+from src.settings import Settings
+from src.workers.orphaned_files import queue_orphaned_files_batch
+
+
+def _listed(file_name, age_seconds=Settings.orphaned_files_min_age_seconds + 60):
+    return {"file_name": file_name, "modified_at": datetime.now(timezone.utc) - timedelta(seconds=age_seconds)}
+
+
+def test_pass_queue_orphaned_files_batch(db_session, build_models_student, build_models_submission, s3):
+    student = build_models_student()
+    submission = build_models_submission({"student_id": student.id, "file_name": f"{student.id}/submitted.pdf"})
+    repository.queue_file_deletion(db_session, f"{student.id}/queued.pdf")
+    s3.list_files.return_value = [
+        _listed(f"{student.id}/orphaned.pdf"),
+        _listed(f"{student.id}/queued.pdf"),
+        _listed(f"{student.id}/uploading.pdf", age_seconds=60),
+        _listed(submission.file_name),
+        _listed("direct_upload.pdf"),
+    ]
+
+    assert asyncio.run(queue_orphaned_files_batch(db_session, s3)) is None
+
+    assert s3.list_files.call_args[0] == (None, Settings.orphaned_files_batch_size)
+    assert sorted(file_deletion.file_name for file_deletion in db_session.query(FileDeletion)) == [
+        f"{student.id}/orphaned.pdf",
+        f"{student.id}/queued.pdf",
+    ]
+
+
+def test_pass_queue_orphaned_files_batch_returns_last_file_of_full_page(db_session, s3, monkeypatch):
+    monkeypatch.setattr(Settings, "orphaned_files_batch_size", 2)
+    s3.list_files.return_value = [_listed("1/a.pdf"), _listed("1/b.pdf")]
+
+    assert asyncio.run(queue_orphaned_files_batch(db_session, s3, "1/0.pdf")) == "1/b.pdf"
+
+    assert s3.list_files.call_args[0] == ("1/0.pdf", 2)
+    assert db_session.query(FileDeletion).count() == 2
@@ -0,0 +1,49 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from sqlalchemy import update
+
+from src.database import repository
+from src.database.models.rate_limit_bucket import RateLimitBucket
+from src.settings import Settings
+from src.workers.rate_limits import rate_limit_buckets_idle_seconds, remove_idle_rate_limit_buckets_batch
+
+
+def test_pass_remove_idle_rate_limit_buckets_batch_reports_pending_buckets(db_session, monkeypatch):
+    monkeypatch.setattr(Settings, "rate_limit_buckets_cleanup_batch_size", 2)
+    for key in ["idle1", "idle2", "idle3", "used"]:
+        repository.take_rate_limit_token(db_session, key, 2, 1)
+    db_session.execute(
+        update(RateLimitBucket)
+        .where(RateLimitBucket.key.like("idle%"))
+        .values(updated_at=datetime.now() - timedelta(seconds=rate_limit_buckets_idle_seconds() + 60))
+    )
+    db_session.commit()
+
+    assert asyncio.run(remove_idle_rate_limit_buckets_batch(db_session)) is True
+    assert asyncio.run(remove_idle_rate_limit_buckets_batch(db_session)) is False
+
+    assert [bucket.key for bucket in db_session.query(RateLimitBucket)] == ["used"]
+
+
+def test_pass_rate_limit_buckets_idle_seconds_covers_the_configured_limits(monkeypatch):
+    monkeypatch.setattr(Settings, "rate_limit_buckets_idle_margin_seconds", 60)
+    # the default submissions per upload code bucket takes the longest to refill, 10 tokens at 6 per minute
+    assert rate_limit_buckets_idle_seconds() == 100 + 60
+
+    # the per IP limits are configured in the environment
+    monkeypatch.setattr(Settings, "rate_limit_verifications_per_ip_burst", 600)
+    monkeypatch.setattr(Settings, "rate_limit_verifications_per_ip_per_minute", 20)
+    assert rate_limit_buckets_idle_seconds() == 30 * 60 + 60
+
+
+def test_pass_remove_idle_rate_limit_buckets_batch_keeps_buckets_still_refilling(db_session, monkeypatch):
+    monkeypatch.setattr(Settings, "rate_limit_verifications_per_ip_burst", 600)
+    monkeypatch.setattr(Settings, "rate_limit_verifications_per_ip_per_minute", 20)
+    repository.take_rate_limit_token(db_session, "refilling", 600, 20 / 60)
+    db_session.execute(update(RateLimitBucket).values(updated_at=datetime.now() - timedelta(minutes=20)))
+    db_session.commit()
+
+    assert asyncio.run(remove_idle_rate_limit_buckets_batch(db_session)) is False
+
+    assert [bucket.key for bucket in db_session.query(RateLimitBucket)] == ["refilling"]
@@ -0,0 +1,62 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from sqlalchemy import update
+
+from src.database.models.submission import Submission
+from src.settings import Settings
+from src.workers.submissions_expiry import expire_submissions_batch
+
+
+def _make_expired(db_session, submission):
+    created_at = datetime.now() - timedelta(seconds=Settings.submission_expire_seconds + 60)
+    db_session.execute(update(Submission).where(Submission.id == submission.id).values(created_at=created_at))
+    db_session.commit()
+
+
+def test_pass_expire_submissions_batch(db_session, build_models_student, build_models_submission, s3):
+    student = build_models_student()
+    expired_submission = build_models_submission({"student_id": student.id})
+    recent_submission = build_models_submission({"student_id": student.id})
+    _make_expired(db_session, expired_submission)
+
+    after = asyncio.run(expire_submissions_batch(db_session, s3))
+
+    assert after is None
+    assert s3.remove_files.call_args[0][0] == [expired_submission.file_name]
+
+    db_session.expire_all()
+    assert expired_submission.expired_at is not None
+    assert recent_submission.expired_at is None
+
+
+def test_pass_expire_submissions_batch_given_failed_file_removal(
+    db_session, build_models_student, build_models_submission, s3
+):
+    student = build_models_student()
+    submission = build_models_submission({"student_id": student.id})
+    _make_expired(db_session, submission)
+    s3.remove_files.return_value = {submission.file_name: "InternalError: We encountered an internal error"}
+
+    asyncio.run(expire_submissions_batch(db_session, s3))
+
+    db_session.expire_all()
+    assert submission.expired_at is None
+
+
+def test_pass_expire_submissions_batch_paginates_full_batches(
+    db_session, build_models_student, build_models_submission, s3, monkeypatch
+):
+    monkeypatch.setattr(Settings, "submissions_expiry_batch_size", 2)
+    student = build_models_student()
+    submissions = [build_models_submission({"student_id": student.id}) for _ in range(3)]
+    for submission in submissions:
+        _make_expired(db_session, submission)
+
+    after = asyncio.run(expire_submissions_batch(db_session, s3))
+    assert after is not None
+    assert len(s3.remove_files.call_args[0][0]) == 2
+
+    after = asyncio.run(expire_submissions_batch(db_session, s3, after))
+    assert after is None
+    assert s3.remove_files.call_args[0][0] == [submissions[2].file_name]
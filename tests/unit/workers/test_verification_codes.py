@@ -0,0 +1,24 @@
+import asyncio
+
+from src.database import repository
+from src.settings import Settings
+from src.workers.verification_codes import maintain_verification_codes_filter
+
+
+def test_pass_maintain_verification_codes_filter_builds_then_refreshes(
+    db_session, monkeypatch, build_models_student, build_models_submission
+):
+    student = build_models_student()
+    expired_submission = build_models_submission({"student_id": student.id})
+
+    built_at = asyncio.run(maintain_verification_codes_filter(db_session))
+    assert expired_submission.verification_code in repository._live_verification_codes
+
+    repository.mark_submissions_expired(db_session, [expired_submission.id])
+    assert asyncio.run(maintain_verification_codes_filter(db_session, built_at)) == built_at
+    assert expired_submission.verification_code in repository._live_verification_codes
+
+    # the filter is rebuilt after the interval, without the codes of the expired submissions
+    monkeypatch.setattr(Settings, "verification_codes_filter_rebuild_interval_seconds", 0)
+    assert asyncio.run(maintain_verification_codes_filter(db_session, built_at)) > built_at
+    assert expired_submission.verification_code not in repository._live_verification_codes